@@ -1,66 +1,98 @@
-
 #!/usr/bin/env python3
 """
 Cross-platform launcher that doesn't require executable permissions on macOS Finder.
-Double-click me ("Launch App.py").
+Double-click me ("Launch App.py"). Run GUI.command and Run GUI.bat call me too.
 
 - Creates .venv (if missing)
-- Installs requirements.txt
+- Installs requirements.txt only when it or the venv's Python changed since the last install
+  (fingerprint in .venv/requirements.sha256), so a normal launch makes no network calls
+- Keeps a wheel cache in wheelhouse/ and installs from it when PyPI can't be reached
 - Runs gui.py
 """
-import os, sys, subprocess, venv, platform, pathlib, shutil
+import time
+T0 = time.time()
+import os, sys, subprocess, venv, platform, pathlib, hashlib
 
 HERE = pathlib.Path(__file__).resolve().parent
 VENV_DIR = HERE / ".venv"
+REQUIREMENTS = HERE / "requirements.txt"
+WHEELHOUSE = HERE / "wheelhouse"
+STAMP = VENV_DIR / "requirements.sha256"
+# give up on an unreachable PyPI quickly (pip defaults: 15s timeout, 5 retries) and use wheelhouse/
+ONLINE = ["--timeout", "5", "--retries", "1"]
 PY_EXE = None
 
+def venv_python() -> pathlib.Path:
+    if platform.system() == "Windows":
+        return VENV_DIR / "Scripts" / "python.exe"
+    return VENV_DIR / "bin" / "python3"
+
+def fingerprint() -> str:
+    """requirements.txt plus the venv's interpreter (pyvenv.cfg records its version and home)."""
+    h = hashlib.sha256()
+    for f in (REQUIREMENTS, VENV_DIR / "pyvenv.cfg"):
+        h.update(f.read_bytes() if f.exists() else b"-")
+    h.update(platform.machine().encode())
+    return h.hexdigest()
+
+def install_requirements():
+    pip = [str(PY_EXE), "-m", "pip", "install", "--disable-pip-version-check"]
+    cache = ["--find-links", str(WHEELHOUSE)] if WHEELHOUSE.is_dir() else []
+    print("[setup] Installing requirements from", REQUIREMENTS)
+    if subprocess.call(pip + ONLINE + cache + ["-r", str(REQUIREMENTS)]) == 0:
+        # refresh the offline cache while PyPI is reachable; pip serves most of it from its own cache
+        subprocess.call([str(PY_EXE), "-m", "pip", "wheel", "--disable-pip-version-check", "-q"] + ONLINE
+                        + ["-w", str(WHEELHOUSE), "-r", str(REQUIREMENTS)], stderr=subprocess.DEVNULL)
+        return
+    if not cache:
+        print("[error] Installing requirements failed and there is no wheelhouse/ to fall back to.")
+        sys.exit(1)
+    print("[setup] Online install failed; installing from", WHEELHOUSE)
+    subprocess.check_call(pip + ["--no-index"] + cache + ["-r", str(REQUIREMENTS)])
+
 def ensure_venv():
     global PY_EXE
-    if not VENV_DIR.exists():
+    PY_EXE = venv_python()
+    if not PY_EXE.exists():
+        # missing, or left broken by a Python upgrade/removal
         print("[setup] Creating virtualenv at", VENV_DIR)
-        venv.EnvBuilder(with_pip=True, clear=False).create(VENV_DIR)
-    if platform.system() == "Windows":
-        PY_EXE = VENV_DIR / "Scripts" / "python.exe"
-        PIP_EXE = VENV_DIR / "Scripts" / "pip.exe"
-    else:
-        PY_EXE = VENV_DIR / "bin" / "python3"
-        PIP_EXE = VENV_DIR / "bin" / "pip"
-    # Upgrade pip and install requirements
-    print("[setup] Upgrading pip...")
-    subprocess.check_call([str(PY_EXE), "-m", "pip", "install", "--upgrade", "pip", "wheel", "setuptools"])
-    req = HERE / "requirements.txt"
-    if req.exists():
-        print("[setup] Installing requirements from", req)
-        subprocess.check_call([str(PIP_EXE), "install", "-r", str(req)])
-    else:
+        venv.EnvBuilder(with_pip=True, clear=VENV_DIR.exists()).create(VENV_DIR)
+    if not REQUIREMENTS.exists():
         print("[warn] requirements.txt not found; proceeding")
+        return
+    fp = fingerprint()
+    if STAMP.exists() and STAMP.read_text().strip() == fp:
+        return
+    install_requirements()
+    STAMP.write_text(fp)
 
 def maybe_fix_permissions():
     """Best-effort: remove quarantine and set +x on .command if present (optional)."""
-    cmd = HERE / "Run GUI.command"
-    try:
-        if cmd.exists():
-            try:
-                subprocess.run(["xattr", "-d", "com.apple.quarantine", str(cmd)], check=False)
-            except Exception:
-                pass
-            try:
-                os.chmod(str(cmd), 0o755)
-            except Exception:
-                pass
-    except Exception:
-        pass
+    if platform.system() != "Darwin":
+        return
+    for name in ("Run GUI.command", "First Run.command"):
+        cmd = HERE / name
+        if not cmd.exists() or os.access(str(cmd), os.X_OK):
+            continue
+        try:
+            subprocess.run(["xattr", "-d", "com.apple.quarantine", str(cmd)], check=False,
+                           stderr=subprocess.DEVNULL)
+            os.chmod(str(cmd), 0o755)
+        except Exception:
+            pass
 
 def run_gui():
-    print("[run] Launching GUI...")
     gui = HERE / "gui.py"
     if not gui.exists():
         print("[error] gui.py not found")
         sys.exit(1)
-    # Run gui.py within the venv interpreter
-    env = os.environ.copy()
-    # Ensure TZ consistent with system; leave as-is
-    subprocess.check_call([str(PY_EXE), str(gui)])
+    print("[run] Launching GUI (setup took %.2fs)..." % (time.time() - T0))
+    # gui.py logs its own startup timings relative to this
+    env = dict(os.environ, ETRADE_LAUNCH_T0=repr(T0))
+    if platform.system() == "Windows":
+        sys.exit(subprocess.call([str(PY_EXE), str(gui)], env=env))
+    # replace this process with the venv interpreter: one Python fewer in memory
+    os.execve(str(PY_EXE), [str(PY_EXE), str(gui)], env)
 
 if __name__ == "__main__":
     ensure_venv()
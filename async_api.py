@@ -0,0 +1,382 @@
+"""
+asyncio counterpart of ETradeAPI for fanning out hundreds of calls on one event loop: OAuth1
+(HMAC-SHA1) signing in-process, one aiohttp connection pool, and a semaphore bounding requests
+in flight. Sign in with ETradeAPI (PIN flow), then:
+
+    async with AsyncETradeAPI.from_api(api) as aapi:
+        orders = await aapi.list_open_orders(account_id_key)
+
+A client made with `from_api` shares the sync client's rate limiters, server clock and read cache.
+Errors surface as the same requests exceptions (HTTPError, ConnectionError, Timeout) that
+ETradeAPI raises, so rotator.classify_failure applies unchanged. aiohttp is imported on first use.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import random
+import secrets
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+import metrics
+import tracing
+from cache import TTLCache
+from etrade_api import (ACCOUNTS_LIST_URL, DEFAULT_CACHE_TTLS, DEFAULT_RATE_LIMITS, DEFAULT_TRANSPORT,
+                        IDEMPOTENT_METHODS, ORDER_CHANGE_PLACE, ORDER_CHANGE_PREVIEW, ORDERS_URL, SB,
+                        THROTTLE_STATUSES, parse_accounts, parse_orders_page)
+from logsetup import PAYLOAD_LOGGER, LazyJSON
+from orders import Order, normalize_order
+from ratelimit import TokenBucket, parse_retry_after
+from trigger import ServerClock
+
+# Requests in flight at once (and keep-alive connections in the pool)
+DEFAULT_MAX_IN_FLIGHT = 64
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _pct(value: Any) -> str:
+    # RFC 3986 unreserved characters only, as OAuth 1.0a requires
+    return quote(str(value), safe="~")
+
+
+def oauth1_header(method: str, url: str, consumer_key: str, consumer_secret: str, token: str="",
+                  token_secret: str="", params: Optional[Dict[str,Any]]=None, nonce: Optional[str]=None,
+                  timestamp: Optional[int]=None) -> str:
+    """
+    Authorization header for an HMAC-SHA1 signed OAuth 1.0a request (RFC 5849 §3.4). `params` are
+    the query parameters; JSON bodies are not part of the signature base string.
+    """
+    oauth = {
+        "oauth_consumer_key": consumer_key,
+        "oauth_nonce": nonce or secrets.token_hex(16),
+        "oauth_signature_method": "HMAC-SHA1",
+        "oauth_timestamp": str(int(timestamp if timestamp is not None else time.time())),
+        "oauth_version": "1.0",
+    }
+    if token:
+        oauth["oauth_token"] = token
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    if parts.port and parts.port != _DEFAULT_PORTS.get(parts.scheme.lower()):
+        host += f":{parts.port}"
+    base_url = f"{parts.scheme.lower()}://{host}{parts.path or '/'}"
+    pairs = parse_qsl(parts.query, keep_blank_values=True) + list((params or {}).items()) + list(oauth.items())
+    normalized = "&".join(f"{k}={v}" for k, v in sorted((_pct(k), _pct(v)) for k, v in pairs))
+    base = "&".join((method.upper(), _pct(base_url), _pct(normalized)))
+    key = f"{_pct(consumer_secret)}&{_pct(token_secret)}"
+    oauth["oauth_signature"] = base64.b64encode(hmac.new(key.encode(), base.encode(), hashlib.sha1).digest()).decode()
+    return "OAuth " + ", ".join(f'{k}="{_pct(v)}"' for k, v in oauth.items())
+
+
+class AsyncResponse:
+    """The parts of a response the API layer uses, read fully before the connection goes back to the pool."""
+
+    __slots__ = ("status_code", "headers", "text", "url")
+
+    def __init__(self, status_code: int, headers, text: str, url: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self.url = url
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def _as_requests_error(exc: Exception) -> requests.RequestException:
+    import aiohttp
+
+    # connect-phase failures map to what requests raises for them, so a place that never left is retried
+    if isinstance(exc, aiohttp.ConnectionTimeoutError):
+        return requests.ConnectTimeout(str(exc) or "connect timed out")
+    if isinstance(exc, aiohttp.ClientConnectorError):
+        return requests.ConnectionError(NewConnectionError(None, str(exc)))
+    if isinstance(exc, asyncio.TimeoutError):
+        return requests.Timeout(str(exc) or "timed out")
+    if isinstance(exc, aiohttp.ClientConnectionError):
+        return requests.ConnectionError(str(exc))
+    return requests.RequestException(str(exc))
+
+
+class AsyncETradeAPI:
+    def __init__(self, consumer_key: str, consumer_secret: str, access_token: str, access_token_secret: str,
+                 env: str=SB, rate_limits: Optional[Dict[str,tuple]]=None, max_throttle_retries: int=4,
+                 transport: Optional[Dict[str,Any]]=None, cache_ttls: Optional[Dict[str,float]]=None,
+                 max_in_flight: int=DEFAULT_MAX_IN_FLIGHT):
+        self.consumer_key = consumer_key.strip()
+        self.consumer_secret = consumer_secret.strip()
+        self.access_token = access_token
+        self.access_token_secret = access_token_secret
+        self.env = env
+        self.transport = dict(DEFAULT_TRANSPORT)
+        self.transport.update(transport or {})
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.log = logging.getLogger("async_api")
+        self.payload_log = logging.getLogger(PAYLOAD_LOGGER)
+        limits = dict(DEFAULT_RATE_LIMITS)
+        limits.update(rate_limits or {})
+        self.limiters = {name: TokenBucket(rate, burst, name=name) for name, (rate, burst) in limits.items()}
+        self.limiter_key = None  # see ETradeAPI.isolated
+        # from_api() points this at the sync client, so usage state is shared with it (see ETradeAPI._root)
+        self._root = self
+        self.last_used = 0.0
+        self.preview_put_ok = None
+        self.max_throttle_retries = max_throttle_retries
+        self.last_scan: Dict[str,Dict[str,int]] = {}
+        self.clock = ServerClock()
+        self.cache_ttls = dict(DEFAULT_CACHE_TTLS)
+        self.cache_ttls.update(cache_ttls or {})
+        self.cache = TTLCache("async_api")
+        # created on first use, inside the running event loop
+        self._session = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_api(cls, api, max_in_flight: int=DEFAULT_MAX_IN_FLIGHT) -> "AsyncETradeAPI":
+        """An async client on `api`'s access token that shares its rate limiters, clock, cache and scan history."""
+        if api.session is None:
+            raise RuntimeError("ETradeAPI is not signed in; complete the PIN flow first.")
+        aapi = cls(api.consumer_key, api.consumer_secret, api.access_token, api.access_token_secret, env=api.env,
+                   max_throttle_retries=api.max_throttle_retries, transport=api.transport,
+                   cache_ttls=api.cache_ttls, max_in_flight=max_in_flight)
+        aapi.limiters = api.limiters
+        aapi.limiter_key = getattr(api, "limiter_key", None)
+        aapi._root = api._root
+        aapi.clock = api.clock
+        aapi.cache = api.cache
+        aapi.last_scan = api.last_scan
+        return aapi
+
+    # written through to the sync client, so TokenKeeper and the planner see async traffic too
+    @property
+    def last_used(self) -> float:
+        return self._root._last_used
+
+    @last_used.setter
+    def last_used(self, value: float):
+        self._root._last_used = value
+
+    @property
+    def preview_put_ok(self) -> Optional[bool]:
+        return self._root._preview_put_ok
+
+    @preview_put_ok.setter
+    def preview_put_ok(self, value: Optional[bool]):
+        self._root._preview_put_ok = value
+
+    async def __aenter__(self) -> "AsyncETradeAPI":
+        self._open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _open(self):
+        if self._session is None:
+            import aiohttp
+
+            cfg = self.transport
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_in_flight, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(connect=cfg["connect_timeout"], sock_read=cfg["read_timeout"]),
+                headers={"Accept": "application/json"})
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _send(self, method: str, url: str, params: Optional[Dict[str,Any]],
+                    body: Optional[Dict[str,Any]]) -> AsyncResponse:
+        """
+        One signed HTTP exchange. Connection failures and timeouts on idempotent methods are retried
+        with jittered exponential backoff, like the sync transport; POST is never resent.
+        """
+        import aiohttp
+        from yarl import URL
+
+        session = self._open()
+        cfg = self.transport
+        full = url + ("?" + urlencode(params, quote_via=quote) if params else "")
+        data = json.dumps(body) if body is not None else None
+        retries = cfg["retries"] if method in IDEMPOTENT_METHODS else 0
+        for n in range(retries + 1):
+            with tracing.span("oauth sign", "oauth"):
+                headers = {"Authorization": oauth1_header(method, url, self.consumer_key, self.consumer_secret,
+                                                          self.access_token, self.access_token_secret, params)}
+            if data is not None:
+                headers["Content-Type"] = "application/json"
+            try:
+                async with self._in_flight:
+                    async with session.request(method, URL(full, encoded=True), data=data, headers=headers) as resp:
+                        return AsyncResponse(resp.status, resp.headers, await resp.text(), full)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if n >= retries or not isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+                    raise _as_requests_error(e) from e
+                delay = cfg["backoff_factor"] * 2 ** n * (1 + random.uniform(0, cfg["backoff_jitter"]))
+                self.log.debug("%s %s failed (%s); retrying in %.2fs.", method, url, type(e).__name__, delay)
+                await asyncio.sleep(delay)
+
+    async def _request(self, method: str, url: str, endpoint: str, params: Optional[Dict[str,Any]]=None,
+                       body: Optional[Dict[str,Any]]=None) -> AsyncResponse:
+        """Same contract as ETradeAPI._request: rate-limited, 429/503 retried, final response returned unchecked."""
+        limiter = self.limiters[endpoint]
+        attempt = 0
+        while True:
+            await limiter.acquire_async(self.limiter_key)
+            sent = time.time()
+            t0 = time.perf_counter()
+            with tracing.span(f"{method} {endpoint}", "http", path=urlsplit(url).path, attempt=attempt + 1) as span:
+                try:
+                    resp = await self._send(method, url, params, body)
+                except requests.RequestException as e:
+                    metrics.API_LATENCY.observe(time.perf_counter() - t0, endpoint=endpoint)
+                    metrics.API_REQUESTS.inc(endpoint=endpoint, method=method, status="error")
+                    span["error"] = type(e).__name__
+                    raise
+                span["status"] = resp.status_code
+            metrics.API_LATENCY.observe(time.perf_counter() - t0, endpoint=endpoint)
+            metrics.API_REQUESTS.inc(endpoint=endpoint, method=method, status=resp.status_code)
+            self.clock.observe(resp.headers.get("Date"), sent, time.time())
+            if resp.status_code != 401:
+                self.last_used = time.time()
+            if resp.status_code not in THROTTLE_STATUSES:
+                limiter.succeeded()
+                return resp
+            metrics.API_THROTTLED.inc(endpoint=endpoint)
+            tracing.instant("throttled", "ratelimit", endpoint=endpoint, status=resp.status_code,
+                            retry_after=resp.headers.get("Retry-After"))
+            if attempt >= self.max_throttle_retries:
+                return resp
+            attempt += 1
+            metrics.API_RETRIES.inc(endpoint=endpoint)
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            self.log.warning("%s %s → %s (attempt %d/%d, Retry-After=%s)", method, url, resp.status_code,
+                             attempt, self.max_throttle_retries, resp.headers.get("Retry-After"))
+            limiter.throttled(retry_after)
+
+    def rate_limit_stats(self) -> Dict[str,Dict[str,Any]]:
+        return {name: lim.stats() for name, lim in self.limiters.items()}
+
+    def cache_stats(self) -> Dict[str,Any]:
+        return self.cache.stats()
+
+    async def _get(self, url: str, params: Optional[dict]=None, endpoint: str="orders") -> Any:
+        resp = await self._request("GET", url, endpoint, params=params)
+        self.log.debug("GET %s → %s", resp.url, resp.status_code)
+        if resp.status_code == 204:
+            return {}
+        resp.raise_for_status()
+        return resp.json()
+
+    # Accounts
+    async def get_accounts(self, fresh: bool=False) -> List[Dict[str,Any]]:
+        key = ("accounts",)
+        if not fresh:
+            hit, accounts = self.cache.get(key)
+            if hit:
+                return [dict(a) for a in accounts]
+        gen = self.cache.generation()
+        out = parse_accounts(await self._get(ACCOUNTS_LIST_URL[self.env], endpoint="accounts"))
+        self.cache.put(key, [dict(a) for a in out], self.cache_ttls["accounts"], generation=gen)
+        return out
+
+    # Orders (paged)
+    async def iter_open_orders(self, account_id_key: str, symbol: Optional[str]=None, count: int=50,
+                               side_filter: Optional[str]=None, fresh: bool=False) -> AsyncIterator[List[Order]]:
+        """Yields normalized open orders a page at a time; cached like ETradeAPI.iter_open_orders."""
+        key = ("orders", account_id_key, symbol or None, count)
+        if not fresh:
+            hit, raw_pages = self.cache.get(key)
+            if hit:
+                for raw_orders in raw_pages:
+                    yield [od for od in (normalize_order(ro, side_filter) for ro in raw_orders) if od is not None]
+                return
+        gen = self.cache.generation(account_id_key)
+        cached: List[List[Dict[str,Any]]] = []
+        url = ORDERS_URL[self.env].format(accountIdKey=account_id_key)
+        params = {"status": "OPEN", "count": str(count)}
+        if symbol:
+            params["symbol"] = symbol
+        seen = raw_seen = 0
+        marker = None
+        while True:
+            q = dict(params)
+            if marker:
+                q["marker"] = marker
+            with tracing.span("list page", "listing", page=len(cached) + 1, symbol=symbol):
+                data = await self._get(url, q, endpoint="orders")
+            raw_orders, marker = parse_orders_page(data)
+            raw_seen += len(raw_orders)
+            cached.append(raw_orders)
+            page = [od for od in (normalize_order(ro, side_filter) for ro in raw_orders) if od is not None]
+            seen += len(page)
+            yield page
+            if not marker:
+                break
+        metrics.LISTING_PAGES.observe(len(cached))
+        if not symbol:
+            self.last_scan[account_id_key] = {"orders": raw_seen, "pages": len(cached)}
+        self.cache.put(key, cached, self.cache_ttls["orders"], tag=account_id_key, generation=gen)
+        self.log.info("Parsed %d orders across %d raw pages.", seen, len(cached))
+
+    async def list_open_orders(self, account_id_key: str, symbol: Optional[str]=None, count: int=50,
+                               side_filter: Optional[str]=None, fresh: bool=False) -> List[Order]:
+        return [od async for page in self.iter_open_orders(account_id_key, symbol, count, side_filter, fresh)
+                for od in page]
+
+    # --- Order change helpers ---
+    def _log_exchange(self, method: str, url: str, payload: dict, resp: AsyncResponse):
+        self.log.debug("%s %s → %s", method, url, resp.status_code)
+        if self.payload_log.isEnabledFor(logging.DEBUG):
+            self.payload_log.debug("%s %s payload: %s → %s", method, url, LazyJSON(payload), resp.text[:300])
+
+    async def preview_change(self, account_id_key: str, order_id: str, payload: dict) -> dict:
+        """
+        Preview a change to an existing order. Try PUT first, then fall back to POST; once the POST
+        fallback has been needed (preview_put_ok is False), go straight to POST.
+        """
+        url = ORDER_CHANGE_PREVIEW[self.env].format(accountIdKey=account_id_key, orderId=order_id)
+        resp = None
+        if self.preview_put_ok is not False:
+            with tracing.span("preview PUT", "change", orderId=order_id):
+                resp = await self._request("PUT", url, "change", body=payload)
+            self._log_exchange("PUT", url, payload, resp)
+            if resp.ok:
+                self.preview_put_ok = True
+        if resp is None or resp.status_code in (404, 405):
+            with tracing.span("preview POST fallback", "change", orderId=order_id):
+                resp = await self._request("POST", url, "change", body=payload)
+            self._log_exchange("POST", url, payload, resp)
+            if resp.ok:
+                self.preview_put_ok = False
+        resp.raise_for_status()
+        self.cache.invalidate(account_id_key)
+        return resp.json()
+
+    async def place_change(self, account_id_key: str, order_id: str, payload: dict) -> dict:
+        """Place a previously previewed change."""
+        url = ORDER_CHANGE_PLACE[self.env].format(accountIdKey=account_id_key, orderId=order_id)
+        with tracing.span("place", "change", orderId=order_id):
+            resp = await self._request("POST", url, "change", body=payload)
+        self._log_exchange("POST", url, payload, resp)
+        resp.raise_for_status()
+        self.cache.invalidate(account_id_key)
+        return resp.json()
@@ -0,0 +1,92 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class Task:
+    """Handle passed to background work: cancellation flag plus thread-safe progress/callback posting."""
+
+    def __init__(self, runner: "TaskRunner", name: str, on_progress: Optional[Callable]=None):
+        self.runner = runner
+        self.name = name
+        self.cancel_event = threading.Event()
+        self._on_progress = on_progress
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def progress(self, *args):
+        """Reports progress; on_progress(*args) runs on the Tk thread."""
+        if self._on_progress is not None:
+            self.runner.call_soon(self._on_progress, *args)
+
+    def post(self, fn: Callable, *args):
+        """Runs fn(*args) on the Tk thread."""
+        self.runner.call_soon(fn, *args)
+
+
+class TaskRunner:
+    """
+    Runs blocking API work off the Tk main thread and marshals results back to it.
+
+    Worker threads never touch widgets: completions, errors, progress and anything passed to
+    `call_soon` are queued and executed by a `root.after` poll on the Tk thread.
+    """
+
+    def __init__(self, root, max_workers: int=4, poll_ms: int=50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self._calls = queue.SimpleQueue()
+        self.log = logging.getLogger("gui")
+        self.root.after(self.poll_ms, self._drain)
+
+    def call_soon(self, fn: Callable, *args):
+        """Thread-safe: schedules fn(*args) on the Tk thread."""
+        self._calls.put((fn, args))
+
+    def submit(self, name: str, fn: Callable[[Task], Any], on_done: Optional[Callable[[Any], None]]=None,
+               on_error: Optional[Callable[[Exception], None]]=None,
+               on_progress: Optional[Callable]=None) -> Task:
+        """
+        Runs fn(task) on a worker thread. on_done(result) or on_error(exc) then runs on the Tk thread;
+        without on_error the exception is only logged.
+        """
+        task = Task(self, name, on_progress)
+
+        def run():
+            try:
+                result = fn(task)
+            except Exception as e:
+                self.log.exception("%s failed", name)
+                if on_error is not None:
+                    self.call_soon(on_error, e)
+                return
+            if on_done is not None:
+                self.call_soon(on_done, result)
+
+        self.pool.submit(run)
+        return task
+
+    def _drain(self):
+        try:
+            while True:
+                try:
+                    fn, args = self._calls.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    fn(*args)
+                except Exception:
+                    self.log.exception("UI callback failed")
+        finally:
+            self.root.after(self.poll_ms, self._drain)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the rotation hot paths.
+
+Stages (each at 100 / 1k / 10k synthetic orders): page JSON decode, order normalization,
+change-payload construction, payload JSON encode, GUI table fill/sort/filter (only when a
+display is available), plus end-to-end "rotate N orders at concurrency C" scenarios against
+simulated latency — in-process by default, or over HTTP against simulator.py with --sim.
+
+    python bench.py                      # writes bench_results.json
+    python bench.py --quick --compare bench_results.json --out new.json
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from orders import normalize_order
+from rotator import OrderRotator
+from simulator import DEFAULT_CONFIG, raw_order
+
+SIZES = (100, 1_000, 10_000)
+
+
+def make_raw_orders(n: int, seed: int=7) -> List[Dict[str,Any]]:
+    rnd = random.Random(seed)
+    return [raw_order(100_000 + i, rnd, DEFAULT_CONFIG["symbols"]) for i in range(n)]
+
+
+def make_pages(n: int, page_size: int=100) -> List[bytes]:
+    raw = make_raw_orders(n)
+    return [json.dumps({"OrdersResponse": {"Order": raw[i:i + page_size]}}).encode()
+            for i in range(0, n, page_size)]
+
+
+def measure(stage: str, size: int, fn: Callable[[], Any], repeat: int=3) -> Dict[str,Any]:
+    """Best-of-`repeat` wall time, then one traced run for peak and retained memory."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    keep = fn()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keep
+    row = {"stage": stage, "size": size, "seconds": round(best, 6),
+           "ops_per_sec": round(size / best, 1) if best > 0 else None,
+           "peak_kib": round(peak / 1024, 1), "retained_kib": round(retained / 1024, 1)}
+    print(f"{stage:<24} n={size:<6} {row['ops_per_sec'] or 0:>12,.0f} ops/s   "
+          f"peak {row['peak_kib']:>9,.1f} KiB   retained {row['retained_kib']:>9,.1f} KiB")
+    return row
+
+
+def bench_parsing(sizes) -> List[Dict[str,Any]]:
+    rows = []
+    rot = OrderRotator(api=None)
+    for n in sizes:
+        pages = make_pages(n)
+        decoded = [json.loads(p) for p in pages]
+        raws = [ro for d in decoded for ro in d["OrdersResponse"]["Order"]]
+        orders = [normalize_order(ro) for ro in raws]
+        payloads = [rot.build_change_payload(od, "EXTENDED", "GOOD_FOR_DAY") for od in orders]
+        encoded = [json.dumps(p) for p in payloads]
+        rows.append(measure("page_json_decode", n, lambda: [json.loads(p) for p in pages]))
+        rows.append(measure("normalize_order", n, lambda: [normalize_order(ro) for ro in raws]))
+        rows.append(measure("build_change_payload", n,
+                            lambda: [rot.build_change_payload(od, "EXTENDED", "GOOD_FOR_DAY") for od in orders]))
+        rows.append(measure("payload_json_encode", n, lambda: [json.dumps(p) for p in payloads]))
+        rows.append(measure("payload_json_decode", n, lambda: [json.loads(s) for s in encoded]))
+    return rows
+
+
+def bench_gui(sizes) -> List[Dict[str,Any]]:
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        root = tk.Tk()
+    except Exception as e:
+        print(f"gui: skipped ({e})")
+        return []
+    from ordertable import COLUMNS, OrderTableModel
+    rows = []
+    root.withdraw()
+    for n in sizes:
+        orders = [normalize_order(ro) for ro in make_raw_orders(n)]
+        tree = ttk.Treeview(root, columns=COLUMNS, show="headings")
+        table = OrderTableModel()
+
+        def fill():
+            table.clear(tree)
+            for i in range(0, n, 100):
+                table.insert_rows(tree, table.add(orders[i:i + 100]))
+
+        def sort_qty():
+            table.set_sort(None)
+            table.sync(tree)
+            table.set_sort("qty", False)
+            table.sync(tree)
+
+        def column_filter():
+            table.set_filters()
+            table.sync(tree)
+            table.set_filters(symbol="A", qty_min=100)
+            table.sync(tree)
+        rows.append(measure("gui_table_fill", n, fill, repeat=1))
+        rows.append(measure("gui_sort_qty", n, sort_qty, repeat=1))
+        rows.append(measure("gui_column_filter", n, column_filter, repeat=1))
+        tree.destroy()
+    root.destroy()
+    return rows
+
+
+class LatencyAPI:
+    """In-process stand-in for ETradeAPI's change calls with a fixed per-call latency."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def preview_change(self, account_id_key, order_id, payload):
+        time.sleep(self.latency)
+        return {"PreviewOrderResponse": {"previewId": order_id}}
+
+    def place_change(self, account_id_key, order_id, payload):
+        time.sleep(self.latency)
+        return {"PlaceOrderResponse": {"orderId": order_id}}
+
+
+def bench_rotation(n: int, concurrencies, latency_ms: float, sim: bool) -> List[Dict[str,Any]]:
+    rows = []
+    server = None
+    if sim:
+        from etrade_api import ETradeAPI, SIM, use_simulator
+        from simulator import start_in_thread
+        server, base = start_in_thread(accounts=1, orders=n, latency_ms=latency_ms, latency_jitter_ms=0)
+        use_simulator(base)
+        limits = {k: (10_000.0, 10_000) for k in ("accounts", "orders", "change")}
+        api = ETradeAPI("bench", "bench", env=SIM, rate_limits=limits)
+        api.get_access_token(*api.get_request_token()[:2], "0")
+        account = api.get_accounts()[0]["idKey"]
+        orders = api.list_open_orders(account, count=100)
+    else:
+        api = LatencyAPI(latency_ms / 1000)
+        account = "BENCH"
+        orders = [normalize_order(ro) for ro in make_raw_orders(n)]
+    try:
+        for c in concurrencies:
+            rot = OrderRotator(api, dry_run=False, max_workers=c)
+            t0 = time.perf_counter()
+            results = rot.rotate(account, orders, "EXTENDED", "GOOD_FOR_DAY")
+            elapsed = time.perf_counter() - t0
+            ok = sum(1 for r in results if r["ok"])
+            row = {"stage": "rotate_sim" if sim else "rotate_inproc", "size": n, "concurrency": c,
+                   "latency_ms": latency_ms, "seconds": round(elapsed, 4),
+                   "ops_per_sec": round(n / elapsed, 1), "ok": ok}
+            print(f"{row['stage']:<24} n={n:<6} C={c:<4} {row['ops_per_sec']:>10,.1f} orders/s   "
+                  f"{elapsed:8.2f}s   ok={ok}")
+            rows.append(row)
+            if sim:
+                rows.append(_bench_rotate_async(api, account, orders, c, latency_ms))
+    finally:
+        if server is not None:
+            server.shutdown()
+    return rows
+
+
+def _bench_rotate_async(api, account: str, orders, concurrency: int, latency_ms: float) -> Dict[str,Any]:
+    import asyncio
+    from async_api import AsyncETradeAPI
+
+    async def run():
+        async with AsyncETradeAPI.from_api(api, max_in_flight=concurrency) as aapi:
+            rot = OrderRotator(api, dry_run=False)
+            t0 = time.perf_counter()
+            results = await rot.rotate_async(account, orders, "REGULAR", "GOOD_UNTIL_CANCEL", api=aapi)
+            return results, time.perf_counter() - t0
+
+    results, elapsed = asyncio.run(run())
+    n = len(orders)
+    ok = sum(1 for r in results if r["ok"])
+    row = {"stage": "rotate_sim_async", "size": n, "concurrency": concurrency, "latency_ms": latency_ms,
+           "seconds": round(elapsed, 4), "ops_per_sec": round(n / elapsed, 1), "ok": ok}
+    print(f"{row['stage']:<24} n={n:<6} C={concurrency:<4} {row['ops_per_sec']:>10,.1f} orders/s   "
+          f"{elapsed:8.2f}s   ok={ok}")
+    return row
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(previous: Dict[str,Any], current: Dict[str,Any]):
+    def key(r):
+        return (r["stage"], r["size"], r.get("concurrency"))
+    before = {key(r): r for r in previous.get("results", [])}
+    print(f"\nvs {previous.get('meta', {}).get('git', '?')}:")
+    for r in current["results"]:
+        b = before.get(key(r))
+        if not b or not b.get("ops_per_sec") or not r.get("ops_per_sec"):
+            continue
+        delta = (r["ops_per_sec"] / b["ops_per_sec"] - 1) * 100
+        flag = "  <-- regression" if delta < -10 else ""
+        print(f"  {r['stage']:<24} n={r['size']:<6} {delta:+7.1f}% ops/s{flag}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark parsing, payload construction and rotation throughput")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--quick", action="store_true", help="skip the 10k size and the slow serial rotation")
+    ap.add_argument("--no-gui", action="store_true")
+    ap.add_argument("--rotate-orders", type=int, default=200)
+    ap.add_argument("--concurrency", default="1,8,32", help="comma-separated worker counts")
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--sim", action="store_true", help="rotate over HTTP against simulator.py instead of in-process")
+    ap.add_argument("--compare", help="previous results JSON to diff against")
+    args = ap.parse_args()
+
+    sizes = SIZES[:2] if args.quick else SIZES
+    conc = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    if args.quick:
+        conc = [c for c in conc if c > 1] or conc
+    results = bench_parsing(sizes)
+    if not args.no_gui:
+        results += bench_gui(sizes)
+    results += bench_rotation(args.rotate_orders, conc, args.latency_ms, args.sim)
+
+    report = {
+        "meta": {"git": _git_rev(), "python": sys.version.split()[0], "platform": platform.platform(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")},
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe read-through store with per-entry expiry and hit/miss counters.
+
+    Entries carry a tag (e.g. an accountIdKey). `invalidate(tag)` drops the tag's entries and bumps
+    its generation; a `put` made with a generation read before the invalidation is discarded, so a
+    listing that was already in flight when an order changed can't repopulate the cache with stale rows.
+    """
+
+    def __init__(self, name: str=""):
+        self.name = name
+        self._lock = threading.Lock()
+        self._data: Dict[Hashable,Tuple[float,Optional[str],Any]] = {}
+        self._generations: Dict[Optional[str],int] = {}
+        self._epoch = 0  # bumped by a full invalidate
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, tag: Optional[str]=None) -> Tuple[int,int]:
+        with self._lock:
+            return self._epoch, self._generations.get(tag, 0)
+
+    def get(self, key: Hashable) -> Tuple[bool,Any]:
+        """(True, value) for a live entry, else (False, None); counts a hit or a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return True, entry[2]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any, ttl: float, tag: Optional[str]=None,
+            generation: Optional[Tuple[int,int]]=None) -> bool:
+        """Stores value for ttl seconds; skipped (False) if ttl <= 0 or `tag` was invalidated since `generation`."""
+        if ttl <= 0:
+            return False
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(tag, 0)):
+                return False
+            self._data[key] = (time.monotonic() + ttl, tag, value)
+            return True
+
+    def invalidate(self, tag: Optional[str]=None) -> int:
+        """Drops the entries for `tag` (every entry when tag is None); returns how many were dropped."""
+        with self._lock:
+            if tag is None:
+                dropped = len(self._data)
+                self._data.clear()
+                self._epoch += 1
+            else:
+                keys = [k for k, entry in self._data.items() if entry[1] == tag]
+                for k in keys:
+                    del self._data[k]
+                dropped = len(keys)
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            self.invalidations += 1
+            return dropped
+
+    def stats(self) -> Dict[str,Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 3) if total else None,
+                    "invalidations": self.invalidations}
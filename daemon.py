@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""
+Headless rotator: ETradeAPI + OrderRotator + the daily schedule in one long-lived process,
+controlled over a small local HTTP API. Never imports Tk.
+
+    python daemon.py --config daemon.json            # listens on 127.0.0.1:8765
+
+    POST /auth/request          → {"authorize_url"}; open it, log in, then
+    POST /auth/pin              {"verifier": "12345"}
+    GET  /status                signed-in state, schedule, running tasks, last outcome, limiter/cache stats
+    GET  /accounts
+    POST /preview               {"rules": {...}, "session", "duration", "limit"} → plan + orders
+    POST /run-now               {"session", "duration", "rules", "dry_run", "accounts"} → 202, progress in /status
+    POST /cancel | /resume
+    GET  /schedule, PUT /schedule  {"times": {"gtce_1": "04:01:00", ...}, "lead_s", "account", "accounts",
+                                    "rules", "dry_run"}
+    GET  /history/late?days=7&threshold=1&account=…   scheduled changes placed late (orders.db)
+    GET  /metrics               Prometheus text
+
+Every request except GET /metrics needs an X-Control-Token header matching "control_token" in the
+config (generated on first start) or ETRADE_DAEMON_TOKEN, and every POST/PUT needs
+Content-Type: application/json, so a cross-site form post cannot reach the API.
+The config file holds consumer key/secret, env, account(s), rules, schedule and dry-run; edits made
+through the API are written back to it. With "accounts" set (a list of accountIdKeys, or "all"),
+scheduled and run-now rotations cover every one of them in parallel.
+"""
+import argparse
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+
+import metrics
+from etrade_api import ETradeAPI, PROD, SIM, use_simulator
+from journal import RotationJournal
+from logsetup import add_handler, setup_logging
+from orderstore import LATE_AFTER, OrderStore
+from rotator import OrderRotator, SelectionRules, outcome_report, require_selection
+from scheduling import DEFAULT_LEAD_SECONDS, DEFAULT_TIMES, MISFIRE_GRACE_SECONDS, RotationScheduler
+from token_store import TokenExpired, TokenKeeper, TokenKeyMissing, TokenStore
+
+LOGFILE = "rotator.log"
+JOURNALFILE = "rotations.jsonl"
+DEFAULT_PORT = 8765
+DEFAULT_CONFIG = {
+    "consumer_key": "",
+    "consumer_secret": "",
+    "env": PROD,
+    "account": None,           # accountIdKey for previews, and for runs when "accounts" is empty
+    "accounts": [],            # accountIdKeys rotated together, or "all"
+    "rules": {},               # SelectionRules keyword arguments
+    "dry_run": True,
+    "times": dict(DEFAULT_TIMES),
+    "lead_s": DEFAULT_LEAD_SECONDS,
+    "max_workers": 8,
+    "control_token": None,     # X-Control-Token for the control API; generated on first start
+}
+
+
+class ServiceError(Exception):
+    """A request the service refuses; `status` becomes the HTTP status."""
+
+    def __init__(self, message: str, status: int=400):
+        super().__init__(message)
+        self.status = status
+
+
+RULE_TEXT_FIELDS = ("side", "price_type")
+RULE_BOUND_FIELDS = ("qty_min", "qty_max", "price_min", "price_max")
+
+
+def _number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _rules(d: Optional[Dict[str,Any]]) -> SelectionRules:
+    """SelectionRules from a request/config object, type-checked field by field (400 on the first bad one)."""
+    d = d or {}
+    if not isinstance(d, dict):
+        raise ServiceError("rules must be an object of SelectionRules fields")
+    symbols = d.get("symbols")
+    if not (symbols is None or isinstance(symbols, str)
+            or isinstance(symbols, list) and all(isinstance(s, str) for s in symbols)):
+        raise ServiceError("rules.symbols must be a string or a list of strings")
+    for key in RULE_TEXT_FIELDS:
+        if not isinstance(d.get(key) or "", str):
+            raise ServiceError(f"rules.{key} must be a string")
+    for key in RULE_BOUND_FIELDS:
+        if d.get(key) is not None and not _number(d[key]):
+            raise ServiceError(f"rules.{key} must be a number")
+    order_ids = d.get("order_ids")
+    if not (order_ids is None or isinstance(order_ids, list)
+            and all(isinstance(o, str) or _number(o) for o in order_ids)):
+        raise ServiceError("rules.order_ids must be a list of orderIds")
+    if not isinstance(d.get("match_all", False), bool):
+        raise ServiceError("rules.match_all must be true or false")
+    try:
+        return SelectionRules(**d)
+    except TypeError as e:
+        raise ServiceError(f"bad rules: {e}")
+
+
+def _check_accounts(accounts):
+    if not (accounts == "all" or isinstance(accounts, list) and all(isinstance(a, str) for a in accounts)):
+        raise ServiceError('accounts must be a list of accountIdKeys or "all"')
+
+
+def _run_rules(d: Optional[Dict[str,Any]]) -> SelectionRules:
+    """Rules for a run: refused when empty unless they set "match_all": true."""
+    try:
+        return require_selection(_rules(d))
+    except ValueError as e:
+        raise ServiceError(str(e))
+
+
+def _check_schedule(changes: Dict[str,Any]):
+    """Type-checks a PUT /schedule body so nothing malformed is applied or saved."""
+    if not isinstance(changes, dict):
+        raise ServiceError("expected a JSON object")
+    unknown = set(changes) - {"times", "lead_s", "account", "accounts", "rules", "dry_run", "max_workers"}
+    if unknown:
+        raise ServiceError(f"unknown fields: {', '.join(sorted(unknown))}")
+    times = changes.get("times", {})
+    if not isinstance(times, dict) or set(times) - set(DEFAULT_TIMES) \
+            or not all(isinstance(v, str) for v in times.values()):
+        raise ServiceError(f"times must map {', '.join(DEFAULT_TIMES)} to \"HH:MM:SS\" (or \"\" for off)")
+    for key, low in (("lead_s", 0), ("max_workers", 1)):
+        value = changes.get(key, low)
+        # bool is an int subclass; true/false here is a client bug, not a number
+        if not isinstance(value, int) or isinstance(value, bool) or value < low:
+            raise ServiceError(f"{key} must be an integer ≥ {low}")
+    if not isinstance(changes.get("dry_run", True), bool):
+        raise ServiceError("dry_run must be true or false")
+    if not isinstance(changes.get("account") or "", str):
+        raise ServiceError("account must be an accountIdKey")
+    _check_accounts(changes.get("accounts", []))
+    _rules(changes.get("rules"))
+
+
+class RotatorService:
+    """Owns the API session, journal and scheduler; every public method is safe to call from any thread."""
+
+    def __init__(self, config: Dict[str,Any], config_path: Optional[str]=None):
+        self.config = dict(DEFAULT_CONFIG)
+        self.config.update(config)
+        self.config_path = config_path
+        # the env in use; --sim overrides it for this process only, never in the saved config
+        self.env = self.config["env"]
+        self.log = logging.getLogger("daemon")
+        self.api: Optional[ETradeAPI] = None
+        self._pin: Optional[tuple] = None
+        self.journal = RotationJournal(JOURNALFILE)
+        self.store = OrderStore()
+        self.token_store = TokenStore()
+        self.keeper: Optional[TokenKeeper] = None
+        self.scheduler = RotationScheduler(self._scheduled_job)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-now")
+        self.tasks: Dict[str,Dict[str,Any]] = {}
+        self.last_run: Optional[Dict[str,Any]] = None
+        self.started = time.time()
+
+    @classmethod
+    def load(cls, path: str) -> "RotatorService":
+        config = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config, path)
+
+    def save(self):
+        if not self.config_path:
+            return
+        tmp = self.config_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.config, f, indent=2)
+        os.replace(tmp, self.config_path)
+
+    def control_token(self) -> str:
+        """The control API token, generated and saved to the config on first use."""
+        if not self.config.get("control_token"):
+            self.config["control_token"] = secrets.token_urlsafe(24)
+            self.save()
+            self.log.info("Generated a control token; it is in %s under \"control_token\".",
+                          self.config_path or "the config")
+        return self.config["control_token"]
+
+    def start(self):
+        self._restore_login()
+        self.scheduler.apply(self.config["times"], int(self.config["lead_s"]))
+        self.journal.compact()
+        for run in self.journal.incomplete_runs():
+            self.log.warning("Run %s (%s/%s) was interrupted with %d orders not placed; POST /resume to finish it.",
+                             run.run_id, run.session, run.duration, len(run.pending()))
+        self.log.info("Daemon started; schedule %s (staged %ss ahead).", self.config["times"], self.config["lead_s"])
+
+    def shutdown(self):
+        for task in list(self.tasks.values()):
+            task["cancel"].set()
+        if self.keeper is not None:
+            self.keeper.stop()
+        self.scheduler.shutdown()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Auth ---
+    def _restore_login(self):
+        if not self.config["consumer_key"] or not self.config["consumer_secret"]:
+            return
+        api = ETradeAPI(self.config["consumer_key"], self.config["consumer_secret"], env=self.env)
+        try:
+            restored = self.token_store.restore(api)
+        except Exception:
+            self.log.exception("Restoring the saved access token failed")
+            return
+        if restored:
+            self._use_api(api)
+        else:
+            self.log.info("No usable saved access token; POST /auth/request to sign in.")
+
+    def _use_api(self, api: ETradeAPI):
+        with self._lock:
+            self.api, self._pin = api, None
+            if self.keeper is not None:
+                self.keeper.stop()
+            self.keeper = TokenKeeper(api)
+        self.keeper.start()
+
+    def request_pin(self) -> str:
+        if not self.config["consumer_key"] or not self.config["consumer_secret"]:
+            raise ServiceError("consumer_key / consumer_secret missing from the config")
+        api = ETradeAPI(self.config["consumer_key"], self.config["consumer_secret"], env=self.env)
+        token, secret, url = api.get_request_token()
+        with self._lock:
+            # the current session (if any) keeps serving until the PIN is exchanged
+            self._pin = (api, token, secret)
+        return url
+
+    def submit_pin(self, verifier: str):
+        with self._lock:
+            pin = self._pin
+        if pin is None:
+            raise ServiceError("POST /auth/request first", 409)
+        api, token, secret = pin
+        api.get_access_token(token, secret, verifier.strip())
+        self.log.info("Access token obtained.")
+        try:
+            self.token_store.save(api)
+        except TokenKeyMissing as e:
+            self.log.warning("%s", e)
+        except OSError:
+            self.log.exception("Could not save the access token")
+        self._use_api(api)
+        accounts = api.get_accounts()
+        if not self.config["account"] and accounts:
+            self.config["account"] = accounts[0]["idKey"]
+            self.save()
+        return accounts
+
+    def _signed_in(self) -> ETradeAPI:
+        api = self.api
+        if api is None or api.session is None:
+            raise ServiceError("not signed in; POST /auth/request then /auth/pin", 409)
+        return api
+
+    def _account(self, account: Optional[str]=None) -> str:
+        account = account or self.config["account"]
+        if not account:
+            raise ServiceError("no account selected; PUT /schedule with an account", 409)
+        return account
+
+    def _accounts(self, accounts=None) -> List[str]:
+        accounts = self.config["accounts"] if accounts is None else accounts
+        _check_accounts(accounts)
+        if accounts == "all":
+            return [a["idKey"] for a in self._signed_in().get_accounts()]
+        if accounts:
+            return list(accounts)
+        return [self._account()]
+
+    def _rotator(self, dry_run: Optional[bool]=None) -> OrderRotator:
+        rot = OrderRotator(self._signed_in(), dry_run=self.config["dry_run"] if dry_run is None else dry_run,
+                           max_workers=int(self.config["max_workers"]), journal=self.journal,
+                           store=self.store)
+        rot.trigger.misfire_grace = MISFIRE_GRACE_SECONDS
+        return rot
+
+    # --- Reads ---
+    def accounts(self):
+        return self._signed_in().get_accounts()
+
+    def preview(self, rules: Optional[Dict[str,Any]]=None, session: str="EXTENDED", duration: str="GOOD_FOR_DAY",
+                account: Optional[str]=None, limit: int=500) -> Dict[str,Any]:
+        selection = _rules(self.config["rules"] if rules is None else rules)
+        rot = self._rotator()
+        plan = rot.plan(self._account(account), session, duration, selection)
+        return {"summary": plan.summary(), "expected_calls": plan.expected_calls, "to_change": len(plan.orders),
+                "unchanged": plan.unchanged, "excluded": plan.excluded,
+                "orders": [od.as_dict() for od in plan.orders[:limit]]}
+
+    def status(self) -> Dict[str,Any]:
+        api = self.api
+        out = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "signed_in": api is not None and api.session is not None,
+            "env": self.env,
+            "account": self.config["account"],
+            "accounts": self.config["accounts"],
+            "dry_run": self.config["dry_run"],
+            "rules": _rules(self.config["rules"]).as_dict(),
+            "schedule": self.schedule(),
+            "tasks": {name: {k: v for k, v in t.items() if k != "cancel"} for name, t in list(self.tasks.items())},
+            "last_run": self.last_run,
+        }
+        if self.keeper is not None:
+            out["token"] = self.keeper.status()
+        if api is not None:
+            out.update(rate_limits=api.rate_limit_stats(), cache=api.cache_stats(), clock=api.clock.stats())
+        return out
+
+    def late_rotations(self, days: float=7.0, threshold_s: float=LATE_AFTER,
+                       account: Optional[str]=None) -> List[Dict[str,Any]]:
+        return self.store.late_rotations(time.time() - days * 86400, threshold_s=threshold_s, account_id_key=account)
+
+    # --- Runs ---
+    def _begin_task(self, name: str) -> Dict[str,Any]:
+        with self._lock:
+            if name in self.tasks:
+                raise ServiceError(f"{name} is already running", 409)
+            task = {"name": name, "started": time.time(), "done": 0, "total": None, "cancel": threading.Event()}
+            self.tasks[name] = task
+            return task
+
+    def _end_task(self, task: Dict[str,Any], results, outcomes=None):
+        report = outcome_report(results)
+        failed = [r for r in results if not r["ok"]]
+        with self._lock:
+            self.tasks.pop(task["name"], None)
+            self.last_run = {"name": task["name"], "started": task["started"], "finished": time.time(),
+                             "outcome": report, "failures": failed[:50],
+                             "accounts": [out.as_dict() for out in (outcomes or {}).values()]}
+        self.log.info("%s finished: %s", task["name"], report)
+
+    def _progress(self, task):
+        def progress(done, total):
+            task["done"], task["total"] = done, total
+        return progress
+
+    def run_now(self, session: str, duration: str, rules: Optional[Dict[str,Any]]=None,
+                dry_run: Optional[bool]=None, accounts=None) -> Dict[str,Any]:
+        selection = _run_rules(self.config["rules"] if rules is None else rules)
+        rot = self._rotator(dry_run)
+        accounts = self._accounts(accounts)
+        task = self._begin_task("run-now")
+
+        def work():
+            outcomes = {}
+            try:
+                outcomes = rot.rotate_accounts(accounts, selection, session, duration,
+                                               progress=self._progress(task), cancel=task["cancel"])
+            except Exception:
+                self.log.exception("Run-now failed")
+            finally:
+                self._end_task(task, [r for out in outcomes.values() for r in out.results], outcomes)
+
+        self._pool.submit(work)
+        return {"name": task["name"], "session": session, "duration": duration, "dry_run": rot.dry_run,
+                "accounts": accounts}
+
+    def resume(self) -> Dict[str,Any]:
+        rot = self._rotator()
+        task = self._begin_task("resume")
+
+        def work():
+            results = []
+            try:
+                results = rot.resume(progress=self._progress(task), cancel=task["cancel"])
+            except Exception:
+                self.log.exception("Resume failed")
+            finally:
+                self._end_task(task, results)
+
+        self._pool.submit(work)
+        return {"name": task["name"]}
+
+    def cancel(self) -> int:
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task["cancel"].set()
+        return len(tasks)
+
+    def _scheduled_job(self, session: str, duration: str, hms):
+        # runs on an APScheduler thread
+        name = f"scheduled {session}/{duration}"
+        try:
+            rot = self._rotator()
+            selection = _run_rules(self.config["rules"])
+            self.keeper.ensure_valid(self.scheduler.fire_at(hms))
+            accounts = self._accounts()
+            task = self._begin_task(name)
+        except (ServiceError, TokenExpired, requests.RequestException) as e:
+            self.log.warning("Scheduled %s/%s skipped: %s", session, duration, e)
+            metrics.SCHEDULED_JOBS.inc(result="skipped")
+            return
+        outcomes = {}
+        try:
+            outcomes = rot.rotate_accounts(accounts, selection, session, duration,
+                                           fire_at=self.scheduler.fire_at(hms), progress=self._progress(task),
+                                           cancel=task["cancel"])
+            results = [r for out in outcomes.values() for r in out.results]
+            skipped = results and all(r["status"] == "skipped" for r in results)
+            cancelled = task["cancel"].is_set()
+            failed = any(out.error for out in outcomes.values())
+            metrics.SCHEDULED_JOBS.inc(result="failed" if failed else "skipped" if skipped
+                                       else "cancelled" if cancelled else "ok")
+        except Exception:
+            metrics.SCHEDULED_JOBS.inc(result="failed")
+            self.log.exception("Scheduled run failed")
+        finally:
+            self._end_task(task, [r for out in outcomes.values() for r in out.results], outcomes)
+
+    # --- Schedule ---
+    def schedule(self) -> Dict[str,Any]:
+        return {"times": self.config["times"], "lead_s": self.config["lead_s"], "jobs": self.scheduler.jobs()}
+
+    def set_schedule(self, changes: Dict[str,Any]) -> Dict[str,Any]:
+        _check_schedule(changes)
+        config = dict(self.config)
+        if "times" in changes:
+            config["times"] = dict(self.config["times"], **changes["times"])
+        for key in ("lead_s", "account", "accounts", "dry_run", "max_workers"):
+            if key in changes:
+                config[key] = changes[key]
+        if "rules" in changes:
+            config["rules"] = _rules(changes["rules"]).as_dict()
+        try:
+            self.scheduler.apply(config["times"], max(0, int(config["lead_s"])))
+        except ValueError as e:
+            self.scheduler.apply(self.config["times"], int(self.config["lead_s"]))
+            raise ServiceError(str(e))
+        self.config = config
+        self.save()
+        self.log.info("Schedule updated: %s (staged %ss ahead), accounts %s, dry_run=%s.",
+                      config["times"], config["lead_s"], config["accounts"] or config["account"], config["dry_run"])
+        return self.schedule()
+
+
+def create_app(service: RotatorService, control_token: Optional[str]=None):
+    """The control API; `control_token` defaults to the service's (see RotatorService.control_token)."""
+    from flask import Flask, Response, jsonify, request
+
+    app = Flask("etrade_rotator_daemon")
+    control_token = control_token or service.control_token()
+
+    @app.before_request
+    def _check_request():
+        if request.method == "GET" and request.path == "/metrics":
+            return None  # read-only, for scrapers
+        if not hmac.compare_digest(request.headers.get("X-Control-Token", "").encode(), control_token.encode()):
+            return jsonify({"error": "bad or missing X-Control-Token"}), 401
+        # form posts (the only kind a browser sends cross-site without a preflight) are refused
+        if request.method in ("POST", "PUT") and request.mimetype != "application/json":
+            return jsonify({"error": "Content-Type must be application/json"}), 415
+        return None
+
+    @app.errorhandler(ServiceError)
+    def _service_error(e):
+        return jsonify({"error": str(e)}), e.status
+
+    def body() -> Dict[str,Any]:
+        return request.get_json(silent=True) or {}
+
+    @app.route("/status")
+    def status():
+        return jsonify(service.status())
+
+    @app.route("/auth/request", methods=["POST"])
+    def auth_request():
+        return jsonify({"authorize_url": service.request_pin()})
+
+    @app.route("/auth/pin", methods=["POST"])
+    def auth_pin():
+        return jsonify({"accounts": service.submit_pin(str(body().get("verifier", "")))})
+
+    @app.route("/accounts")
+    def accounts():
+        return jsonify({"accounts": service.accounts()})
+
+    @app.route("/preview", methods=["POST"])
+    def preview():
+        b = body()
+        limit = b.get("limit", 500)
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit < 0:
+            raise ServiceError("limit must be an integer ≥ 0")
+        if not isinstance(b.get("account") or "", str):
+            raise ServiceError("account must be an accountIdKey")
+        return jsonify(service.preview(b.get("rules"), b.get("session", "EXTENDED"), b.get("duration", "GOOD_FOR_DAY"),
+                                       b.get("account"), limit))
+
+    @app.route("/run-now", methods=["POST"])
+    def run_now():
+        b = body()
+        if not b.get("session") or not b.get("duration"):
+            raise ServiceError("session and duration are required")
+        accounts = b.get("accounts", [b["account"]] if b.get("account") else None)
+        if accounts is not None:
+            _check_accounts(accounts)
+        if not isinstance(b.get("dry_run", False), (bool, type(None))):
+            raise ServiceError("dry_run must be true or false")
+        return jsonify(service.run_now(b["session"], b["duration"], b.get("rules"), b.get("dry_run"),
+                                       accounts)), 202
+
+    @app.route("/resume", methods=["POST"])
+    def resume():
+        return jsonify(service.resume()), 202
+
+    @app.route("/cancel", methods=["POST"])
+    def cancel():
+        return jsonify({"cancelled": service.cancel()})
+
+    @app.route("/schedule", methods=["GET", "PUT"])
+    def schedule():
+        if request.method == "PUT":
+            return jsonify(service.set_schedule(body()))
+        return jsonify(service.schedule())
+
+    @app.route("/history/late")
+    def late_rotations():
+        try:
+            days = float(request.args.get("days", 7))
+            threshold = float(request.args.get("threshold", LATE_AFTER))
+        except ValueError:
+            raise ServiceError("days and threshold must be numbers")
+        return jsonify({"late": service.late_rotations(days, threshold, request.args.get("account"))})
+
+    @app.route("/metrics")
+    def metrics_text():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Headless E*TRADE order rotator with a local control API")
+    ap.add_argument("--config", default="daemon.json")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--sim", metavar="URL", help="talk to simulator.py at URL instead of E*TRADE")
+    args = ap.parse_args()
+
+    setup_logging(LOGFILE)
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+    add_handler(console)
+
+    service = RotatorService.load(args.config)
+    if args.sim:
+        use_simulator(args.sim)
+        service.env = SIM
+    service.start()
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class _QuietHandler(WSGIRequestHandler):
+        def log_request(self, *a, **kw):
+            pass
+
+    server = make_server(args.host, args.port, create_app(service, os.environ.get("ETRADE_DAEMON_TOKEN")),
+                         threaded=True, request_handler=_QuietHandler)
+    logging.getLogger("daemon").info("Control API on http://%s:%d", args.host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""
+E*TRADE environment names, kept free of imports so the GUI can use them before etrade_api
+(requests, oauthlib) is loaded.
+"""
+
+PROD = "PROD"
+SB = "SB"    # E*TRADE sandbox
+SIM = "SIM"  # local stand-in, see simulator.py and etrade_api.use_simulator
+ENVS = (PROD, SB, SIM)
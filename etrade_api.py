@@ -1,58 +1,24 @@
 
+import copy
 import logging
-import json
 import time
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Any, Optional
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth1Session
+from urllib3.util.retry import Retry
 
+from cache import TTLCache
+from envs import PROD, SB, SIM
+import metrics
+import tracing
+from logsetup import PAYLOAD_LOGGER, LazyJSON
+from orders import Order, normalize_order
+from ratelimit import TokenBucket, parse_retry_after
+from trigger import ServerClock
 
-def _extract_qty_safely(ro, first_ord, inst):
-    """
-    Attempts to extract a numeric quantity from various possible E*TRADE fields.
-    Returns a float or None.
-    """
-    def _pick(*keys):
-        for k in keys:
-            if not k:
-                continue
-            try:
-                v = k
-                # if k is a path-like lookup, skip (we already pass values not keys here)
-            except Exception:
-                v = None
-            if v is not None:
-                return v
-        return None
-
-    # Pull from common locations
-    qty_v = None
-    try:
-        qty_v = (
-            (inst or {}).get("quantity")
-            or (inst or {}).get("orderedQuantity")
-            or (first_ord or {}).get("orderedQuantity")
-            or (first_ord or {}).get("quantity")
-            or (ro or {}).get("orderedQuantity")
-            or (ro or {}).get("quantity")
-        )
-    except Exception:
-        qty_v = None
-
-    # String clean
-    if isinstance(qty_v, str):
-        if qty_v.strip().lower() in ("", "none", "null", "nan"):
-            qty_v = None
-
-    # Convert to float if possible
-    try:
-        return float(qty_v) if qty_v is not None else None
-    except Exception:
-        return None
-
-
-SB = "SB"
-PROD = "PROD"
 
 REQ_TOKEN_URL = {
     SB: "https://apisb.etrade.com/oauth/request_token",
@@ -66,6 +32,10 @@ ACCESS_TOKEN_URL = {
     SB: "https://apisb.etrade.com/oauth/access_token",
     PROD: "https://api.etrade.com/oauth/access_token",
 }
+RENEW_TOKEN_URL = {
+    SB: "https://apisb.etrade.com/oauth/renew_access_token",
+    PROD: "https://api.etrade.com/oauth/renew_access_token",
+}
 ACCOUNTS_LIST_URL = {
     SB: "https://apisb.etrade.com/v1/accounts/list.json",
     PROD: "https://api.etrade.com/v1/accounts/list.json",
@@ -83,43 +53,291 @@ ORDER_CHANGE_PLACE = {
     PROD: "https://api.etrade.com/v1/accounts/{accountIdKey}/orders/{orderId}/change/place.json",
 }
 
+
+def use_simulator(base_url: str="http://127.0.0.1:5055"):
+    """Points the SIM env's URL tables at a local stand-in server (see simulator.py); use ETradeAPI(env=SIM)."""
+    base = base_url.rstrip("/")
+    REQ_TOKEN_URL[SIM] = base + "/oauth/request_token"
+    AUTH_URL[SIM] = base + "/e/t/etws/authorize"
+    ACCESS_TOKEN_URL[SIM] = base + "/oauth/access_token"
+    RENEW_TOKEN_URL[SIM] = base + "/oauth/renew_access_token"
+    ACCOUNTS_LIST_URL[SIM] = base + "/v1/accounts/list.json"
+    ORDERS_URL[SIM] = base + "/v1/accounts/{accountIdKey}/orders.json"
+    ORDER_CHANGE_PREVIEW[SIM] = base + "/v1/accounts/{accountIdKey}/orders/{orderId}/change/preview.json"
+    ORDER_CHANGE_PLACE[SIM] = base + "/v1/accounts/{accountIdKey}/orders/{orderId}/change/place.json"
+
+# Requests per second (sustained rate, burst) per endpoint class. Conservative defaults;
+# override via ETradeAPI(rate_limits=...) to match the limits published for your key.
+DEFAULT_RATE_LIMITS = {
+    "accounts": (2.0, 2),
+    "orders": (4.0, 4),
+    "change": (4.0, 4),
+    "oauth": (1.0, 2),
+}
+THROTTLE_STATUSES = (429, 503)
+
+# Seconds a read stays cached. Accounts rarely change; open-order listings are kept just long
+# enough to absorb repeated previews and are dropped for an account whenever one of its orders
+# is previewed or placed. 0 disables caching for that endpoint.
+DEFAULT_CACHE_TTLS = {
+    "accounts": 600.0,
+    "orders": 15.0,
+}
+
+# HTTP transport shared by the OAuth sessions. Timeouts are (connect, read) seconds; automatic
+# retries cover connection/read failures on idempotent methods only — POST (place, preview
+# fallback) is never resent by the adapter. 429/503 are left to the rate limiter.
+DEFAULT_TRANSPORT = {
+    "pool_connections": 4,
+    "pool_maxsize": 32,
+    "connect_timeout": 5.0,
+    "read_timeout": 30.0,
+    "retries": 3,
+    "backoff_factor": 0.3,
+    "backoff_jitter": 0.3,
+}
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT"})
+
+class _TracedAuth(requests.auth.AuthBase):
+    """Wraps the session's OAuth1 signer so signing shows up as its own span in traces."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __call__(self, r):
+        with tracing.span("oauth sign", "oauth"):
+            return self.inner(r)
+
+def _build_retry(cfg: Dict[str,Any]) -> Retry:
+    kwargs = dict(total=cfg["retries"], connect=cfg["retries"], read=cfg["retries"], status=0,
+                  allowed_methods=IDEMPOTENT_METHODS, backoff_factor=cfg["backoff_factor"],
+                  raise_on_status=False, respect_retry_after_header=False)
+    try:
+        return Retry(backoff_jitter=cfg["backoff_jitter"], **kwargs)
+    except TypeError:
+        # urllib3 < 2 has no jitter support
+        return Retry(**kwargs)
+
+def parse_accounts(data: Dict[str,Any]) -> List[Dict[str,Any]]:
+    """AccountListResponse → [{"idKey", "id", "name", "type"}]."""
+    acct = data.get("AccountListResponse",{}).get("Accounts",{}).get("Account",[])
+    # ensure list
+    if isinstance(acct, dict):
+        acct = [acct]
+    out = []
+    for a in acct:
+        out.append({
+            "idKey": a.get("accountIdKey") or a.get("accountId"),
+            "id": a.get("accountId"),
+            "name": (a.get("accountName") or a.get("accountDesc") or "").strip() or str(a.get("accountId")),
+            "type": a.get("accountType"),
+        })
+    return out
+
+def parse_orders_page(data: Dict[str,Any]):
+    """One OrdersResponse page → (raw orders, marker of the next page or None)."""
+    resp = data.get("OrdersResponse",{})
+    raw_orders = resp.get("Order",[])
+    if isinstance(raw_orders, dict):
+        raw_orders = [raw_orders]
+    return raw_orders, resp.get("marker")
+
 class ETradeAPI:
-    def __init__(self, consumer_key: str, consumer_secret: str, env: str=SB):
+    def __init__(self, consumer_key: str, consumer_secret: str, env: str=SB,
+                 rate_limits: Optional[Dict[str,tuple]]=None, max_throttle_retries: int=4,
+                 transport: Optional[Dict[str,Any]]=None, cache_ttls: Optional[Dict[str,float]]=None):
         self.consumer_key = consumer_key.strip()
         self.consumer_secret = consumer_secret.strip()
         self.env = env
-        self.oauth = OAuth1Session(self.consumer_key, client_secret=self.consumer_secret, callback_uri="oob")
+        self.transport = dict(DEFAULT_TRANSPORT)
+        self.transport.update(transport or {})
+        self.timeout = (self.transport["connect_timeout"], self.transport["read_timeout"])
+        self.oauth = self._mount_transport(
+            OAuth1Session(self.consumer_key, client_secret=self.consumer_secret, callback_uri="oob"))
         self.access_token = None
         self.access_token_secret = None
         self.session = None
+        # isolated() views point this at the client they came from; usage state below lives there
+        self._root = self
+        self.limiter_key = None  # the account an isolated() view's requests are queued under
+        # epoch seconds: when the access token was issued by the PIN flow, and of the last answered request
+        self.token_issued_at: Optional[float] = None
+        self.last_used = 0.0
+        # whether change previews take PUT (True) or need the POST fallback (False); None until the first one
+        self.preview_put_ok = None
         self.log = logging.getLogger("etrade_api")
+        self.payload_log = logging.getLogger(PAYLOAD_LOGGER)
+        limits = dict(DEFAULT_RATE_LIMITS)
+        limits.update(rate_limits or {})
+        self.limiters = {name: TokenBucket(rate, burst, name=name) for name, (rate, burst) in limits.items()}
+        self.max_throttle_retries = max_throttle_retries
+        # accountIdKey → {"orders": raw open-order count, "pages": pages} from the last unfiltered listing
+        self.last_scan: Dict[str,Dict[str,int]] = {}
+        # offset to E*TRADE's clock, learned from response Date headers
+        self.clock = ServerClock()
+        self.cache_ttls = dict(DEFAULT_CACHE_TTLS)
+        self.cache_ttls.update(cache_ttls or {})
+        self.cache = TTLCache("etrade_api")
+
+    # Shared with isolated() views, so TokenKeeper and the planner see every account's traffic
+    @property
+    def last_used(self) -> float:
+        return self._root._last_used
+
+    @last_used.setter
+    def last_used(self, value: float):
+        self._root._last_used = value
+
+    @property
+    def preview_put_ok(self) -> Optional[bool]:
+        return self._root._preview_put_ok
+
+    @preview_put_ok.setter
+    def preview_put_ok(self, value: Optional[bool]):
+        self._root._preview_put_ok = value
+
+    def isolated(self, account_id_key: Optional[str]=None) -> "ETradeAPI":
+        """
+        A view of this client for one account's traffic in a multi-account run: the same tokens,
+        clock, read cache and rate limiters (one budget for all accounts, shared fairly between them
+        by `account_id_key`), but its own signed session and connection pool.
+        """
+        view = copy.copy(self)
+        view._root = self._root
+        view.limiter_key = account_id_key or f"view-{id(view)}"
+        if self.session is not None:
+            view.session = self._signed_session()
+        return view
+
+    def _signed_session(self) -> requests.Session:
+        sess = self._mount_transport(OAuth1Session(self.consumer_key, client_secret=self.consumer_secret,
+                                                   resource_owner_key=self.access_token,
+                                                   resource_owner_secret=self.access_token_secret))
+        sess.auth = _TracedAuth(sess.auth)
+        return sess
+
+    def _mount_transport(self, sess: requests.Session) -> requests.Session:
+        cfg = self.transport
+        adapter = HTTPAdapter(pool_connections=cfg["pool_connections"], pool_maxsize=cfg["pool_maxsize"],
+                              max_retries=_build_retry(cfg))
+        sess.mount("https://", adapter)
+        sess.mount("http://", adapter)
+        return sess
+
+    def warm_up(self, connections: int=4) -> int:
+        """
+        Opens up to `connections` keep-alive connections (TCP + TLS) to the API host ahead of a
+        scheduled run so the first real requests skip connection setup. Returns how many succeeded.
+        """
+        sess = self.session or self.oauth
+        parts = urlsplit(ACCOUNTS_LIST_URL[self.env])
+        url = f"{parts.scheme}://{parts.netloc}/"
+        n = max(1, min(connections, self.transport["pool_maxsize"]))
+
+        def _head(_):
+            try:
+                sess.head(url, timeout=self.timeout, allow_redirects=False)
+                return True
+            except requests.RequestException as e:
+                self.log.debug("Warm-up HEAD %s failed: %s", url, e)
+                return False
+
+        t0 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=n, thread_name_prefix="warmup") as pool:
+            ok = sum(pool.map(tracing.bind(_head), range(n)))
+        self.log.info("Warmed %d/%d connections to %s in %.0f ms.", ok, n, parts.netloc, (time.monotonic() - t0) * 1000)
+        return ok
 
     # --- PIN auth helpers ---
     def get_request_token(self):
         url = REQ_TOKEN_URL[self.env]
         self.log.info("Requesting token at %s", url)
-        resp = self.oauth.fetch_request_token(url)
+        resp = self.oauth.fetch_request_token(url, timeout=self.timeout)
         token = resp["oauth_token"]
         secret = resp["oauth_token_secret"]
         auth_url = AUTH_URL[self.env] + f"?key={self.consumer_key}&token={token}"
         return token, secret, auth_url
 
     def get_access_token(self, request_token: str, request_secret: str, verifier: str):
-        oauth = OAuth1Session(self.consumer_key, client_secret=self.consumer_secret,
-                              resource_owner_key=request_token, resource_owner_secret=request_secret)
+        oauth = self._mount_transport(OAuth1Session(self.consumer_key, client_secret=self.consumer_secret,
+                                                    resource_owner_key=request_token, resource_owner_secret=request_secret))
         url = ACCESS_TOKEN_URL[self.env]
         self.log.info("Exchanging verifier for access token at %s", url)
-        tokens = oauth.fetch_access_token(url, verifier=verifier)
-        self.access_token = tokens["oauth_token"]
-        self.access_token_secret = tokens["oauth_token_secret"]
-        # build signed session
-        self.session = OAuth1Session(self.consumer_key, client_secret=self.consumer_secret,
-                                     resource_owner_key=self.access_token,
-                                     resource_owner_secret=self.access_token_secret)
+        tokens = oauth.fetch_access_token(url, verifier=verifier, timeout=self.timeout)
+        self.restore_access_token(tokens["oauth_token"], tokens["oauth_token_secret"], time.time())
         return self.access_token, self.access_token_secret
 
-    def _get(self, url: str, params: Optional[dict]=None) -> Any:
-        resp = self.session.get(url, params=params, headers={"Accept":"application/json"})
+    def restore_access_token(self, access_token: str, access_token_secret: str, issued_at: float):
+        """Signs in with an access token obtained earlier (e.g. from the token store); makes no request."""
+        self.access_token = access_token
+        self.access_token_secret = access_token_secret
+        self.token_issued_at = issued_at
+        self.last_used = time.time()
+        self.cache.invalidate()
+        self.session = self._signed_session()
+
+    def renew_access_token(self):
+        """
+        Reactivates the access token after E*TRADE's two-hour idle timeout (or keeps it from
+        reaching it). Raises requests.HTTPError if the token is no longer valid, e.g. past midnight ET.
+        """
+        resp = self._request("GET", RENEW_TOKEN_URL[self.env], "oauth")
+        self.log.info("Renew access token → %s", resp.status_code)
+        resp.raise_for_status()
+
+    def _request(self, method: str, url: str, endpoint: str, **kwargs) -> requests.Response:
+        """
+        Sends a signed request through the endpoint class's rate limiter.
+        429/503 responses pause and slow the limiter (honoring Retry-After) and are retried
+        up to max_throttle_retries times; the final response is returned unchecked.
+        Every attempt is counted and timed in metrics (etrade_requests_total / etrade_request_seconds).
+        """
+        limiter = self.limiters[endpoint]
+        attempt = 0
+        while True:
+            with tracing.span("rate-limit wait", "ratelimit", endpoint=endpoint):
+                limiter.acquire(self.limiter_key)
+            sent = time.time()
+            t0 = time.perf_counter()
+            with tracing.span(f"{method} {endpoint}", "http", path=urlsplit(url).path, attempt=attempt + 1) as span:
+                try:
+                    resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                except requests.RequestException as e:
+                    metrics.API_LATENCY.observe(time.perf_counter() - t0, endpoint=endpoint)
+                    metrics.API_REQUESTS.inc(endpoint=endpoint, method=method, status="error")
+                    span["error"] = type(e).__name__
+                    raise
+                span["status"] = resp.status_code
+            metrics.API_LATENCY.observe(time.perf_counter() - t0, endpoint=endpoint)
+            metrics.API_REQUESTS.inc(endpoint=endpoint, method=method, status=resp.status_code)
+            self.clock.observe(resp.headers.get("Date"), sent, time.time())
+            if resp.status_code != 401:
+                self.last_used = time.time()
+            if resp.status_code not in THROTTLE_STATUSES:
+                limiter.succeeded()
+                return resp
+            metrics.API_THROTTLED.inc(endpoint=endpoint)
+            tracing.instant("throttled", "ratelimit", endpoint=endpoint, status=resp.status_code,
+                            retry_after=resp.headers.get("Retry-After"))
+            if attempt >= self.max_throttle_retries:
+                return resp
+            attempt += 1
+            metrics.API_RETRIES.inc(endpoint=endpoint)
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            self.log.warning("%s %s → %s (attempt %d/%d, Retry-After=%s)", method, url, resp.status_code,
+                             attempt, self.max_throttle_retries, resp.headers.get("Retry-After"))
+            limiter.throttled(retry_after)
+
+    def rate_limit_stats(self) -> Dict[str,Dict[str,Any]]:
+        """Current rate, queue depth and throttle count per endpoint class."""
+        return {name: lim.stats() for name, lim in self.limiters.items()}
+
+    def cache_stats(self) -> Dict[str,Any]:
+        """Entries, hits, misses and invalidations of the read cache."""
+        return self.cache.stats()
+
+    def _get(self, url: str, params: Optional[dict]=None, endpoint: str="orders") -> Any:
+        resp = self._request("GET", url, endpoint, params=params, headers={"Accept":"application/json"})
         self.log.debug("GET %s → %s", resp.url, resp.status_code)
         if resp.status_code == 204:
             return {}
@@ -127,115 +345,114 @@ class ETradeAPI:
         return resp.json()
 
     # Accounts
-    def get_accounts(self) -> List[Dict[str,Any]]:
-        data = self._get(ACCOUNTS_LIST_URL[self.env])
-        acct = data.get("AccountListResponse",{}).get("Accounts",{}).get("Account",[])
-        # ensure list
-        if isinstance(acct, dict):
-            acct = [acct]
-        out = []
-        for a in acct:
-            out.append({
-                "idKey": a.get("accountIdKey") or a.get("accountId"),
-                "id": a.get("accountId"),
-                "name": (a.get("accountName") or a.get("accountDesc") or "").strip() or str(a.get("accountId")),
-                "type": a.get("accountType"),
-            })
+    def get_accounts(self, fresh: bool=False) -> List[Dict[str,Any]]:
+        """Accounts list, served from the cache for cache_ttls["accounts"] seconds unless `fresh`."""
+        key = ("accounts",)
+        if not fresh:
+            hit, accounts = self.cache.get(key)
+            if hit:
+                return [dict(a) for a in accounts]
+        gen = self.cache.generation()
+        out = parse_accounts(self._get(ACCOUNTS_LIST_URL[self.env], endpoint="accounts"))
+        self.cache.put(key, [dict(a) for a in out], self.cache_ttls["accounts"], generation=gen)
         return out
 
     # Orders (paged)
-    def list_open_orders(self, account_id_key: str, symbol: Optional[str]=None, count:int=50, side_filter: Optional[str]=None) -> List[Dict[str,Any]]:
+    def iter_open_orders(self, account_id_key: str, symbol: Optional[str]=None, count:int=50, side_filter: Optional[str]=None,
+                         fresh: bool=False, source: Optional[Dict[str,Any]]=None) -> Iterator[List[Order]]:
+        """
+        Yields normalized open orders one page at a time as each page arrives.
+        A complete listing is cached (as raw pages, per account/symbol/count) for cache_ttls["orders"]
+        seconds; `fresh` skips the cache lookup. A `source` dict gets "cached" set before the first page.
+        """
+        key = ("orders", account_id_key, symbol or None, count)
+        if source is not None:
+            source["cached"] = False
+        if not fresh:
+            hit, raw_pages = self.cache.get(key)
+            if hit:
+                if source is not None:
+                    source["cached"] = True
+                seen = 0
+                for raw_orders in raw_pages:
+                    page = [od for od in (normalize_order(ro, side_filter) for ro in raw_orders) if od is not None]
+                    seen += len(page)
+                    yield page
+                self.log.info("Parsed %d orders across %d cached pages.", seen, len(raw_pages))
+                return
+        gen = self.cache.generation(account_id_key)
+        cached: List[List[Dict[str,Any]]] = []
         url = ORDERS_URL[self.env].format(accountIdKey=account_id_key)
         params = {"status":"OPEN","count":str(count)}
         if symbol:
             params["symbol"]=symbol
-        orders: List[Dict[str,Any]] = []
         seen = 0
+        raw_seen = 0
         marker = None
         raw_pages = 0
         while True:
             q = dict(params)
             if marker:
                 q["marker"]=marker
-            data = self._get(url, q)
+            with tracing.span("list page", "listing", page=raw_pages + 1, symbol=symbol):
+                data = self._get(url, q, endpoint="orders")
             raw_pages += 1
-            resp = data.get("OrdersResponse",{})
-            raw_orders = resp.get("Order",[])
-            if isinstance(raw_orders, dict):
-                raw_orders = [raw_orders]
-            # map fields
+            raw_orders, marker = parse_orders_page(data)
+            raw_seen += len(raw_orders)
+            cached.append(raw_orders)
+            page: List[Order] = []
             for ro in raw_orders:
-                # Some payloads nest instruments differently; handle both.
-                first_ord = None
-                if isinstance(ro.get("OrderDetail"), list) and ro["OrderDetail"]:
-                    first_ord = ro["OrderDetail"][0]
-                elif isinstance(ro.get("OrderDetail"), dict):
-                    first_ord = ro["OrderDetail"]
-                inst = None
-                if first_ord:
-                    if isinstance(first_ord.get("Instrument"), list) and first_ord["Instrument"]:
-                        inst = first_ord["Instrument"][0]
-                    elif isinstance(first_ord.get("Instrument"), dict):
-                        inst = first_ord["Instrument"]
-                product = (inst or {}).get("Product",{})
-                symbol_v = product.get("symbol")
-                action_v = (inst or {}).get("orderAction")
-                qty_v = _extract_qty_safely(ro, first_ord, inst)
-                limit_v = (inst or {}).get("limitPrice") or first_ord.get("limitPrice")
-                stop_v = (inst or {}).get("stopPrice") or first_ord.get("stopPrice")
-                side = "BUY" if str(action_v).upper().startswith("BUY") else "SELL" if str(action_v).upper().startswith("SELL") else action_v
-                if side_filter and side and side_filter != "BOTH" and side.upper()!=side_filter.upper():
-                    continue
-                placed = ro.get("orderTime") or ro.get("placedTime") or ro.get("placedTimeUTC") or first_ord.get("orderCreatedTime")
-                session = first_ord.get("marketSession") or ro.get("marketSession")
-                duration = first_ord.get("orderTerm") or ro.get("orderTerm")
-                orders.append({
-                    "orderId": ro.get("orderId"),
-                    "symbol": symbol_v,
-                    "side": side,
-                    "qty": qty_v,
-                    "price": limit_v or stop_v,
-                    "priceType": first_ord.get("priceType"),
-                    "session": session,
-                    "duration": duration,
-                    "placedTime": placed,
-                })
-                seen += 1
-            marker = resp.get("marker")
+                od = normalize_order(ro, side_filter)
+                if od is not None:
+                    page.append(od)
+            seen += len(page)
+            yield page
             if not marker:
                 break
-        self.log.info("Parsed %d orders across %d raw pages.", len(orders), raw_pages)
-        return orders
+        metrics.LISTING_PAGES.observe(raw_pages)
+        if not symbol:
+            self.last_scan[account_id_key] = {"orders": raw_seen, "pages": raw_pages}
+        self.cache.put(key, cached, self.cache_ttls["orders"], tag=account_id_key, generation=gen)
+        self.log.info("Parsed %d orders across %d raw pages.", seen, raw_pages)
+
+    def list_open_orders(self, account_id_key: str, symbol: Optional[str]=None, count:int=50, side_filter: Optional[str]=None,
+                         fresh: bool=False, source: Optional[Dict[str,Any]]=None) -> List[Order]:
+        return [od for page in self.iter_open_orders(account_id_key, symbol, count, side_filter, fresh, source)
+                for od in page]
 
     
     # --- Order change helpers ---
+    def _log_exchange(self, method: str, url: str, payload: dict, resp: requests.Response):
+        self.log.debug("%s %s → %s", method, url, resp.status_code)
+        if self.payload_log.isEnabledFor(logging.DEBUG):
+            self.payload_log.debug("%s %s payload: %s → %s", method, url, LazyJSON(payload), resp.text[:300])
+
     def preview_change(self, account_id_key: str, order_id: str, payload: dict) -> dict:
         """Preview a change to an existing order. Try PUT first, then fall back to POST."""
         url = ORDER_CHANGE_PREVIEW[self.env].format(accountIdKey=account_id_key, orderId=order_id)
         headers = {"Accept": "application/json"}
-        resp = self.session.put(url, json=payload, headers=headers)
-        self.log.debug("PUT %s payload: %s", url, json.dumps(payload))
+        with tracing.span("preview PUT", "change", orderId=order_id):
+            resp = self._request("PUT", url, "change", json=payload, headers=headers)
+        self._log_exchange("PUT", url, payload, resp)
         if resp.status_code in (404, 405):
-            resp = self.session.post(url, json=payload, headers=headers)
-            self.log.debug("POST %s payload: %s", url, json.dumps(payload))
-        self.log.debug("→ %s %s", resp.status_code, resp.text[:300])
+            with tracing.span("preview POST fallback", "change", orderId=order_id):
+                resp = self._request("POST", url, "change", json=payload, headers=headers)
+            self._log_exchange("POST", url, payload, resp)
+            if resp.ok:
+                self.preview_put_ok = False
+        elif resp.ok:
+            self.preview_put_ok = True
         resp.raise_for_status()
+        self.cache.invalidate(account_id_key)
         return resp.json()
 
     def place_change(self, account_id_key: str, order_id: str, payload: dict) -> dict:
         """Place a previously previewed change."""
         url = ORDER_CHANGE_PLACE[self.env].format(accountIdKey=account_id_key, orderId=order_id)
         headers = {"Accept": "application/json"}
-        resp = self.session.post(url, json=payload, headers=headers)
-        self.log.debug("POST %s payload: %s", url, json.dumps(payload))
-        self.log.debug("→ %s %s", resp.status_code, resp.text[:300])
+        with tracing.span("place", "change", orderId=order_id):
+            resp = self._request("POST", url, "change", json=payload, headers=headers)
+        self._log_exchange("POST", url, payload, resp)
         resp.raise_for_status()
+        self.cache.invalidate(account_id_key)
         return resp.json()
-
-    def place_change(self, account_id_key: str, order_id: str, payload: dict) -> dict:
-        url = ORDER_CHANGE_PLACE[self.env].format(accountIdKey=account_id_key, orderId=order_id)
-        resp = self.session.post(url, json=payload, headers={"Accept":"application/json"})
-        self.log.debug("POST %s payload: %s", url, json.dumps(payload))
-        self.log.debug("→ %s %s", resp.status_code, resp.text[:300])
-        resp.raise_for_status()
-        return resp.json()
\ No newline at end of file
@@ -1,15 +1,54 @@
 
+import time
+_STARTED_AT, _IMPORT_T0 = time.time(), time.perf_counter()
+import importlib
 import os
 import sys
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from collections import deque
+from typing import TYPE_CHECKING
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from etrade_api import ETradeAPI, SB, PROD
-from rotator import OrderRotator
+from background import TaskRunner
+from envs import PROD, SB, SIM
+from journal import RotationJournal
+import metrics
+import tracing
+from logsetup import add_handler, setup_logging
+from orderstore import OrderStore
+from ordertable import COLUMNS, OrderTableModel
+from scheduling import DEFAULT_LEAD_SECONDS, DEFAULT_TIMES, MISFIRE_GRACE_SECONDS, RotationScheduler
+if TYPE_CHECKING:
+    from rotator import OrderRotator, SelectionRules
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_T0
 
 LOGFILE = "rotator.log"
+JOURNALFILE = "rotations.jsonl"
+LOG_PANEL_LINES = 2000
+LOG_FLUSH_MS = 100
+# Prometheus-text /metrics on localhost; ETRADE_METRICS_PORT=0 turns it off
+METRICS_PORT = int(os.environ.get("ETRADE_METRICS_PORT", "9464"))
+METRICS_REFRESH_MS = 2000
+# the SIM env is offered when this points at a running simulator.py
+SIM_URL = os.environ.get("ETRADE_SIM_URL", "")
+# Loaded on a worker thread once the window is shown; code using them still imports them locally
+# (a no-op by then, or a short wait on the import lock if the user is quicker than the preload).
+DEFERRED_IMPORTS = ("filelock", "requests", "etrade_api", "rotator", "token_store",
+                    "apscheduler.schedulers.background", "apscheduler.triggers.cron", "pytz", "tzlocal")
+
+def _float_or_none(s: str):
+    try:
+        return float(s.strip())
+    except ValueError:
+        return None
+
+def _preload(modules) -> float:
+    t0 = time.perf_counter()
+    for name in modules:
+        importlib.import_module(name)
+    return time.perf_counter() - t0
 
 class GuiApp:
     def __init__(self, root: tk.Tk):
@@ -24,38 +63,94 @@ class GuiApp:
         self.pin_req_secret = None
         self.pin_verifier = tk.StringVar()
         self.account_map = {}
+        self.table = OrderTableModel()  # backs the orders Treeview: rows, checks, sort/filter state
         self.selected_account = tk.StringVar()
+        self.all_accounts = tk.BooleanVar(value=False)
+        self.match_all = tk.BooleanVar(value=False)
         self.side_filter = tk.StringVar(value="BOTH")
         self.symbol_filter = tk.StringVar()
         self.dry_run = tk.BooleanVar(value=True)
+        self.trace_runs = tk.BooleanVar(value=tracing.enabled())
 
         # schedule with seconds
-        self.s_gtce_1 = tk.StringVar(value="04:01:00")
-        self.s_gtce_2 = tk.StringVar(value="16:00:00")
-        self.s_extgtc = tk.StringVar(value="19:59:00")
+        self.s_gtce_1 = tk.StringVar(value=DEFAULT_TIMES["gtce_1"])
+        self.s_gtce_2 = tk.StringVar(value=DEFAULT_TIMES["gtce_2"])
+        self.s_extgtc = tk.StringVar(value=DEFAULT_TIMES["extgtc"])
+        self.stage_lead = tk.StringVar(value=str(DEFAULT_LEAD_SECONDS))
+        self.scheduler = RotationScheduler(self._run_staged)
 
         self.api = None
+        self.token_store = None  # see _tokens
+        self._auto_login_tried = None  # (key, secret, env) the saved login was last tried with automatically
+        self.keeper = None
+        self.journal = RotationJournal(JOURNALFILE)
+        self.store = OrderStore()  # last known orders + rotation history (orders.db)
+        self.snapshot_account = None
+        self.listed_account = None  # accountIdKey whose live listing the table shows; None for stored rows
+        self.current_task = None
+        self.staged_cancels = set()  # one Event per scheduled run in progress; Cancel sets them all
+        self._job_snapshot = {"api": None, "keeper": None, "accounts": [], "rules": None, "dry_run": True}
+        self.tasks = TaskRunner(self.root)
         self._build_ui()
+        self._show_snapshot()
+        for var in (self.selected_account, self.all_accounts, self.match_all, self.symbol_filter, self.side_filter,
+                    self.dry_run,
+                    self.col_type, self.col_qty, self.col_price):
+            var.trace_add("write", lambda *_: self._snapshot_selection())
+        self.root.after_idle(self._window_shown)
+
+    # Startup: the window goes up with the light modules only; the API stack, APScheduler and the
+    # schedule follow from a worker thread. Launch App.py passes ETRADE_LAUNCH_T0 (epoch seconds).
+    def _window_shown(self):
+        self._shown_at = time.time()
+        self.tasks.submit("Startup", lambda task: _preload(DEFERRED_IMPORTS), on_done=self._deferred_loaded,
+                          on_error=lambda e: messagebox.showerror("Missing dependency",
+                                                                  f"{e}\n\nRun 'Launch App.py' to install requirements."))
+
+    def _deferred_loaded(self, preload_s: float):
+        if not self.ckey.get():
+            self.ckey.set(self._tokens().consumer_key() or "")
         self._apply_schedule()
+        self._restore_login(auto=True)
+        self._check_interrupted()
+        self._start_metrics()
+        now = time.time()
+        launched = float(os.environ.get("ETRADE_LAUNCH_T0") or 0)
+        logging.getLogger().info(
+            "Startup: %swindow in %.2fs (imports %.2fs), ready in %.2fs (deferred imports %.2fs on a worker).",
+            f"launcher {_STARTED_AT - launched:.2f}s, " if launched else "", self._shown_at - _STARTED_AT,
+            _IMPORT_SECONDS, now - _STARTED_AT, preload_s)
 
     def _setup_logging(self):
         os.makedirs("logs", exist_ok=True)
-        fh = RotatingFileHandler(LOGFILE, maxBytes=1_000_000, backupCount=3)
-        fmt = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-        fh.setFormatter(fmt)
-        rootlog = logging.getLogger()
-        rootlog.setLevel(logging.DEBUG)
-        rootlog.addHandler(fh)
-
-        # GUI log panel handler
+        setup_logging(LOGFILE)
+        # per-run traces go next to the log
+        tracing.configure(directory=os.path.dirname(os.path.abspath(LOGFILE)))
+
+        # GUI log panel handler: runs on the log listener thread, so emit only appends to a bounded
+        # buffer; a root.after pump on the Tk thread flushes it in one insert every ~100ms and trims
+        # the widget to the last LOG_PANEL_LINES lines
         class TextHandler(logging.Handler):
-            def __init__(self, widget): super().__init__(); self.widget=widget
+            def __init__(self, widget, root):
+                super().__init__(); self.widget=widget; self.root=root
+                self.pending = deque(maxlen=LOG_PANEL_LINES)
+                self.root.after(LOG_FLUSH_MS, self.pump)
             def emit(self, record):
-                msg = self.format(record)
-                self.widget.configure(state="normal")
-                self.widget.insert("end", msg + "\n")
-                self.widget.configure(state="disabled")
-                self.widget.see("end")
+                self.pending.append(self.format(record))
+            def pump(self):
+                batch = []
+                while self.pending:
+                    batch.append(self.pending.popleft())
+                if batch:
+                    w = self.widget
+                    w.configure(state="normal")
+                    w.insert("end", "\n".join(batch) + "\n")
+                    excess = int(w.index("end-1c").split(".")[0]) - 1 - LOG_PANEL_LINES
+                    if excess > 0:
+                        w.delete("1.0", f"{excess + 1}.0")
+                    w.configure(state="disabled")
+                    w.see("end")
+                self.root.after(LOG_FLUSH_MS, self.pump)
         self.text_handler = TextHandler
         logging.getLogger().info("Logger initialized.")
 
@@ -79,14 +174,21 @@ class GuiApp:
         ttk.Label(auth, text="Env:").grid(row=0, column=0, sticky="w")
         ttk.Radiobutton(auth, text="PROD", variable=self.env, value=PROD).grid(row=0, column=1, sticky="w")
         ttk.Radiobutton(auth, text="SB", variable=self.env, value=SB).grid(row=0, column=2, sticky="w")
+        if SIM_URL:
+            ttk.Radiobutton(auth, text="SIM", variable=self.env, value=SIM).grid(row=0, column=3, sticky="w")
         ttk.Label(auth, text="Consumer Key").grid(row=1, column=0, sticky="w")
         ttk.Entry(auth, textvariable=self.ckey, width=40).grid(row=1, column=1, columnspan=2, sticky="we", padx=4)
         ttk.Label(auth, text="Consumer Secret").grid(row=2, column=0, sticky="w")
-        ttk.Entry(auth, textvariable=self.csec, width=40, show="•").grid(row=2, column=1, columnspan=2, sticky="we", padx=4)
+        secret = ttk.Entry(auth, textvariable=self.csec, width=40, show="•")
+        secret.grid(row=2, column=1, columnspan=2, sticky="we", padx=4)
+        # once key and secret are both in, the saved login (if any) is tried without pressing the button
+        for event in ("<FocusOut>", "<Return>"):
+            secret.bind(event, lambda _: self._restore_login(auto=True))
 
         btns = ttk.Frame(auth)
         btns.grid(row=3, column=0, columnspan=3, sticky="we", pady=4)
-        ttk.Button(btns, text="Get PIN Link", command=self._get_pin_link).pack(side="left")
+        ttk.Button(btns, text="Use Saved Login", command=self._restore_login).pack(side="left")
+        ttk.Button(btns, text="Get PIN Link", command=self._get_pin_link).pack(side="left", padx=6)
         ttk.Label(btns, text="PIN:").pack(side="left", padx=(12,4))
         ttk.Entry(btns, textvariable=self.pin_verifier, width=10).pack(side="left")
         ttk.Button(btns, text="Submit PIN", command=self._submit_pin).pack(side="left", padx=6)
@@ -95,6 +197,8 @@ class GuiApp:
         ttk.Label(auth, text="Account").grid(row=4, column=0, sticky="w")
         self.account_combo = ttk.Combobox(auth, textvariable=self.selected_account, state="readonly", width=40)
         self.account_combo.grid(row=4, column=1, columnspan=2, sticky="we", padx=4)
+        ttk.Checkbutton(auth, text="Scheduled runs rotate all accounts (in parallel)",
+                        variable=self.all_accounts).grid(row=5, column=1, columnspan=2, sticky="w", padx=4)
 
         # Filters
         flt = ttk.LabelFrame(scroll_frame, text="Filters & Options")
@@ -104,6 +208,10 @@ class GuiApp:
         ttk.Label(flt, text="Symbols (comma):").grid(row=1, column=0, sticky="w")
         ttk.Entry(flt, textvariable=self.symbol_filter, width=40).grid(row=1, column=1, columnspan=2, sticky="we", padx=4)
         ttk.Checkbutton(flt, text="Dry-run (no submit)", variable=self.dry_run).grid(row=0, column=3, padx=10)
+        ttk.Checkbutton(flt, text="Trace runs", variable=self.trace_runs,
+                        command=lambda: tracing.configure(enabled=self.trace_runs.get())).grid(row=0, column=4)
+        ttk.Checkbutton(flt, text="Scheduled runs may rotate every order (no filter set)",
+                        variable=self.match_all).grid(row=1, column=3, columnspan=2, sticky="w", padx=10)
 
         # Column filter row
         cf = ttk.Frame(flt)
@@ -123,12 +231,15 @@ class GuiApp:
         ttk.Label(cf, text="Limit ≥").grid(row=0, column=8)
         self.col_price = tk.StringVar()
         ttk.Entry(cf, textvariable=self.col_price, width=6).grid(row=0, column=9)
-        ttk.Button(cf, text="Apply Filters", command=self._apply_column_filters).grid(row=0, column=10, padx=6)
+        ttk.Label(cf, text="Show max").grid(row=0, column=10)
+        self.col_limit = tk.StringVar()
+        ttk.Entry(cf, textvariable=self.col_limit, width=6).grid(row=0, column=11)
+        ttk.Button(cf, text="Apply Filters", command=self._apply_column_filters).grid(row=0, column=12, padx=6)
 
         # Orders table
         tbl = ttk.LabelFrame(scroll_frame, text="Open Orders")
         tbl.pack(fill="both", expand=True, padx=8, pady=6)
-        cols = ("chk","orderId","symbol","side","qty","price","priceType","session","duration","placedTime")
+        cols = COLUMNS
         self.tree = ttk.Treeview(tbl, columns=cols, show="headings", selectmode="extended")
         headings = {
             "chk":"✔", "orderId":"Order ID","symbol":"Symbol","side":"Side","qty":"Qty",
@@ -149,7 +260,8 @@ class GuiApp:
         tb.pack(fill="x", pady=4)
         ttk.Button(tb, text="Select All", command=lambda:self._set_all_checks(True)).pack(side="left")
         ttk.Button(tb, text="Select None", command=lambda:self._set_all_checks(False)).pack(side="left", padx=6)
-        ttk.Button(tb, text="Preview Open Orders", command=self._preview_orders).pack(side="left", padx=8)
+        self.preview_btn = ttk.Button(tb, text="Preview Open Orders", command=self._preview_orders)
+        self.preview_btn.pack(side="left", padx=8)
 
         # Scheduling
         sch = ttk.LabelFrame(scroll_frame, text="Scheduling (HH:MM:SS, America/Phoenix)")
@@ -157,36 +269,47 @@ class GuiApp:
         ttk.Label(sch, text="GTC→EXT #1").grid(row=0,column=0,sticky="w"); ttk.Entry(sch,textvariable=self.s_gtce_1,width=10).grid(row=0,column=1)
         ttk.Label(sch, text="GTC→EXT #2").grid(row=0,column=2,sticky="w"); ttk.Entry(sch,textvariable=self.s_gtce_2,width=10).grid(row=0,column=3)
         ttk.Label(sch, text="EXT→GTC").grid(row=0,column=4,sticky="w"); ttk.Entry(sch,textvariable=self.s_extgtc,width=10).grid(row=0,column=5)
-        ttk.Button(sch, text="Apply Schedule", command=self._apply_schedule).grid(row=0,column=6,padx=8)
+        ttk.Label(sch, text="Stage lead (s)").grid(row=0,column=6,sticky="w"); ttk.Entry(sch,textvariable=self.stage_lead,width=5).grid(row=0,column=7)
+        ttk.Button(sch, text="Apply Schedule", command=self._apply_schedule).grid(row=0,column=8,padx=8)
 
         # Actions
         act = ttk.LabelFrame(scroll_frame, text="Actions")
         act.pack(fill="x", padx=8, pady=6)
-        ttk.Button(act, text="Run Now: GTC→EXT", command=lambda:self._run_now("EXTENDED","GOOD_FOR_DAY")).pack(side="left")
-        ttk.Button(act, text="Run Now: EXT→GTC", command=lambda:self._run_now("REGULAR","GOOD_UNTIL_CANCEL")).pack(side="left", padx=6)
+        run_ext = ttk.Button(act, text="Run Now: GTC→EXT", command=lambda:self._run_now("EXTENDED","GOOD_FOR_DAY"))
+        run_ext.pack(side="left")
+        run_gtc = ttk.Button(act, text="Run Now: EXT→GTC", command=lambda:self._run_now("REGULAR","GOOD_UNTIL_CANCEL"))
+        run_gtc.pack(side="left", padx=6)
+        resume = ttk.Button(act, text="Resume Interrupted", command=self._resume_run)
+        resume.pack(side="left")
+        # one listing/rotation at a time: these are disabled while current_task runs
+        self.task_buttons = (self.preview_btn, run_ext, run_gtc, resume)
+        self.progress = ttk.Progressbar(act, length=200, mode="determinate")
+        self.progress.pack(side="left", padx=(12,4))
+        self.progress_label = ttk.Label(act, text="", width=12)
+        self.progress_label.pack(side="left")
+        self.cancel_btn = ttk.Button(act, text="Cancel", command=self._cancel_task, state="disabled")
+        self.cancel_btn.pack(side="left", padx=6)
+
+        # Metrics summary
+        mf = ttk.LabelFrame(scroll_frame, text="Metrics")
+        mf.pack(fill="x", padx=8, pady=6)
+        self.metrics_label = ttk.Label(mf, text="", font="TkFixedFont", justify="left", anchor="w")
+        self.metrics_label.pack(fill="x")
 
         # Logs panel
         logf = ttk.LabelFrame(scroll_frame, text="Logs")
         logf.pack(fill="both", expand=True, padx=8, pady=6)
         self.log_text = tk.Text(logf, height=12, state="disabled")
         self.log_text.pack(fill="both", expand=True)
-        th = self.text_handler(self.log_text); th.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-        logging.getLogger().addHandler(th)
+        th = self.text_handler(self.log_text, self.root); th.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        th.setLevel(logging.INFO)
+        add_handler(th)
 
     # --- Helpers ---
     def _sort_by(self, col, desc):
-        # get data to sort
-        data = [(self.tree.set(k, col), k) for k in self.tree.get_children("")]
-        # cast numeric columns
-        if col in ("qty","price"):
-            def cast(v):
-                try: return float(v)
-                except: return float("-inf")
-            data.sort(key=lambda t: cast(t[0]), reverse=desc)
-        else:
-            data.sort(key=lambda t: t[0], reverse=desc)
-        for i, (_, k) in enumerate(data):
-            self.tree.move(k, "", i)
+        # sort orders come from the model (cached per column); the widget is reordered in one call
+        self.table.set_sort(col, desc)
+        self.table.sync(self.tree)
         # toggle next
         self.tree.heading(col, command=lambda c=col: self._sort_by(c, not desc))
 
@@ -195,185 +318,457 @@ class GuiApp:
         if region != "heading":
             rowid = self.tree.identify_row(event.y)
             col = self.tree.identify_column(event.x)
-            if col == "#1":  # chk column
-                cur = self.tree.set(rowid, "chk")
-                self.tree.set(rowid, "chk", "" if cur=="✓" else "✓")
+            if col == "#1" and rowid:  # chk column
+                self.table.set_checked(self.tree, [rowid], rowid not in self.table.checked)
+                self._snapshot_selection()
 
     def _set_all_checks(self, val: bool):
-        for iid in self.tree.get_children(""):
-            self.tree.set(iid, "chk", "✓" if val else "")
+        self.table.set_checked(self.tree, self.tree.get_children(""), val)
+        self._snapshot_selection()
 
     def _apply_column_filters(self):
-        symf = self.col_sym.get().strip().upper()
-        typef = self.col_type.get().strip().upper()
-        sessf = self.col_sess.get().strip().upper()
-        qtymin = self.col_qty.get().strip()
-        pmin = self.col_price.get().strip()
-        for iid in self.tree.get_children(""):
-            vals = self.tree.item(iid, "values")
-            mapping = dict(zip(("chk","orderId","symbol","side","qty","price","priceType","session","duration","placedTime"), vals))
-            show = True
-            if symf and symf not in str(mapping["symbol"]).upper(): show=False
-            if typef and typef not in str(mapping["priceType"]).upper(): show=False
-            if sessf and sessf not in str(mapping["session"]).upper(): show=False
-            try:
-                if qtymin: show = show and (float(mapping["qty"])>=float(qtymin))
-                if pmin: show = show and (float(mapping["price"])>=float(pmin))
-            except: pass
-            if show:
-                self.tree.reattach(iid, "", "end")
-            else:
-                self.tree.detach(iid)
+        num = lambda var: _float_or_none(var.get())
+        self.table.set_filters(self.col_sym.get(), self.col_type.get(), self.col_sess.get(),
+                               num(self.col_qty), num(self.col_price))
+        limit = num(self.col_limit)
+        self.table.render_limit = int(limit) if limit and limit > 0 else None
+        self.table.sync(self.tree)
+        self._snapshot_selection()
+
+    def _new_api(self):
+        from etrade_api import ETradeAPI, use_simulator
+
+        if self.env.get() == SIM:
+            use_simulator(SIM_URL)
+        return ETradeAPI(self.ckey.get(), self.csec.get(), env=self.env.get())
 
     def _get_pin_link(self):
         try:
-            self.api = ETradeAPI(self.ckey.get(), self.csec.get(), env=self.env.get())
-            tok, sec, url = self.api.get_request_token()
+            self.api = self._new_api()
+        except Exception as e:
+            logging.getLogger().exception("Auth init failed")
+            messagebox.showerror("Error", f"Auth init failed: {e}")
+            return
+        api = self.api
+
+        def done(res):
+            tok, sec, url = res
             self.pin_req_token, self.pin_req_secret = tok, sec
             messagebox.showinfo("Authorize", f"Open this URL, log in, then paste the PIN:\n\n{url}")
+
+        self.tasks.submit("Auth init", lambda task: api.get_request_token(), on_done=done,
+                          on_error=lambda e: messagebox.showerror("Error", f"Auth init failed: {e}"))
+
+    def _tokens(self):
+        if self.token_store is None:
+            from token_store import TokenStore
+            self.token_store = TokenStore()
+        return self.token_store
+
+    def _restore_login(self, auto: bool=False):
+        """
+        Signs in with the saved token. `auto` (at startup and when the secret has been entered) tries
+        once per key/secret/env, only when a token and its passphrase/key file/keyring key are at
+        hand, and logs instead of showing dialogs; the Use Saved Login button remains the fallback.
+        """
+        if auto:
+            attempt = (self.ckey.get().strip(), self.csec.get().strip(), self.env.get())
+            signed_in = self.api is not None and self.api.session is not None
+            if not all(attempt) or signed_in or attempt == self._auto_login_tried:
+                return
+            self._auto_login_tried = attempt
+        try:
+            api = self._new_api()
         except Exception as e:
             logging.getLogger().exception("Auth init failed")
-            messagebox.showerror("Error", f"Auth init failed: {e}")
+            if not auto:
+                messagebox.showerror("Error", f"Auth init failed: {e}")
+            return
+        store = self._tokens()
+
+        def work(task):
+            if auto and not store.ready(api.consumer_key, api.env):
+                return None
+            return api.get_accounts() if store.restore(api) else None
+
+        def done(accts):
+            if accts is None:
+                if auto:
+                    logging.getLogger().info("No saved sign-in to use; press Get PIN Link to sign in.")
+                else:
+                    messagebox.showinfo("No saved login", "There is no valid saved sign-in for this key; use Get PIN Link.")
+                return
+            if self.api is not None and self.api.session is not None and self.api is not api:
+                return  # signed in another way meanwhile
+            self._signed_in(api)
+            self._accounts_loaded(accts)
+
+        def fail(e):
+            if auto:
+                logging.getLogger().warning("Saved login failed: %s", e)
+            else:
+                messagebox.showerror("Error", f"Saved login failed: {e}")
+
+        self.tasks.submit("Saved login", work, on_done=done, on_error=fail)
+
+    def _signed_in(self, api):
+        from token_store import TokenKeeper
+
+        self.api = api
+        if self.keeper is not None:
+            self.keeper.stop()
+        self.keeper = TokenKeeper(api, on_expired=lambda _: self.tasks.call_soon(
+            messagebox.showwarning, "Sign-in expired",
+            "The E*TRADE access token expired at midnight ET. Scheduled runs need a new PIN."))
+        self.keeper.start()
 
     def _submit_pin(self):
-        try:
-            self.api.get_access_token(self.pin_req_token, self.pin_req_secret, self.pin_verifier.get().strip())
+        if self.api is None:
+            messagebox.showwarning("No PIN link", "Click Get PIN Link first.")
+            return
+        api = self.api
+        req_token, req_secret, verifier = self.pin_req_token, self.pin_req_secret, self.pin_verifier.get().strip()
+        store = self._tokens()
+
+        def work(task):
+            from token_store import TokenKeyMissing
+
+            api.get_access_token(req_token, req_secret, verifier)
             logging.getLogger().info("Access token obtained.")
-            self._refresh_accounts()
-        except Exception as e:
-            logging.getLogger().exception("PIN exchange failed")
-            messagebox.showerror("Error", f"PIN exchange failed: {e}")
+            try:
+                store.save(api)
+            except TokenKeyMissing as e:
+                logging.getLogger().warning("%s", e)
+            except OSError:
+                logging.getLogger().exception("Could not save the access token")
+            return api.get_accounts()
+
+        def done(accts):
+            self._signed_in(api)
+            self._accounts_loaded(accts)
+
+        self.tasks.submit("PIN exchange", work, on_done=done,
+                          on_error=lambda e: messagebox.showerror("Error", f"PIN exchange failed: {e}"))
 
     def _refresh_accounts(self):
+        if self.api is None or self.api.session is None:
+            messagebox.showwarning("Not signed in", "Submit the PIN first.")
+            return
+        api = self.api
+        self.tasks.submit("Account load", lambda task: api.get_accounts(), on_done=self._accounts_loaded,
+                          on_error=lambda e: messagebox.showerror("Error", f"Account load failed: {e}"))
+
+    def _accounts_loaded(self, accts):
+        self.account_map = {f"{a['name']} ({a['id']})": a["idKey"] for a in accts}
+        self.account_combo["values"] = list(self.account_map.keys())
+        keys = list(self.account_map.values())
+        if accts:
+            self.account_combo.current(keys.index(self.snapshot_account) if self.snapshot_account in keys else 0)
+        self._snapshot_selection()
+        logging.getLogger().info("Accounts loaded: %d", len(accts))
+        if self.snapshot_account is not None and self.snapshot_account != self.account_map.get(self.selected_account.get()):
+            # stored rows of an account that is not selected must not be picked for it
+            self.table.clear(self.tree)
+            self.snapshot_account = None
+        if self.snapshot_account in keys and self.current_task is None:
+            # the table still shows the stored snapshot; replace it with a live listing in the background
+            self.snapshot_account = None
+            self._preview_orders()
+
+    def _show_snapshot(self):
+        """Fills the table with the last stored listing so there is something to look at before sign-in."""
         try:
-            accts = self.api.get_accounts()
-            self.account_map = {f"{a['name']} ({a['id']})": a["idKey"] for a in accts}
-            self.account_combo["values"] = list(self.account_map.keys())
-            if accts:
-                self.account_combo.current(0)
-            logging.getLogger().info("Accounts loaded: %d", len(accts))
-        except Exception as e:
-            logging.getLogger().exception("Account load failed")
-            messagebox.showerror("Error", f"Account load failed: {e}")
+            snap = self.store.load_snapshot()
+        except Exception:
+            logging.getLogger().exception("Could not read the order store")
+            return
+        if snap is None:
+            return
+        self.snapshot_account, taken_at, orders = snap
+        self.table.insert_rows(self.tree, self.table.add(orders))
+        logging.getLogger().info("Showing %d orders of account %s as last listed %s; sign in to refresh.",
+                                 len(orders), self.snapshot_account,
+                                 time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(taken_at)))
 
     def _preview_orders(self):
-        try:
-            acct_label = self.selected_account.get()
-            if not acct_label:
-                messagebox.showwarning("Pick account","Please select an account first.")
-                return
-            acct_id_key = self.account_map[acct_label]
-            rot = OrderRotator(self.api, dry_run=self.dry_run.get())
-            orders = rot.preview_open_orders(acct_id_key, self.symbol_filter.get().strip(), self.side_filter.get())
-            # fill table
-            for i in self.tree.get_children(""):
-                self.tree.delete(i)
-            for od in orders:
-                vals = ["", od.get("orderId"), od.get("symbol"), od.get("side"), od.get("qty"),
-                        od.get("price"), od.get("priceType"), od.get("session"), od.get("duration"), od.get("placedTime")]
-                self.tree.insert("", "end", values=vals)
-            logging.getLogger().info("Preview loaded: %d open orders.", len(orders))
-        except Exception as e:
-            logging.getLogger().exception("Preview failed")
+        if self._busy():
+            return
+        acct_label = self.selected_account.get()
+        if not acct_label:
+            messagebox.showwarning("Pick account","Please select an account first.")
+            return
+        acct_id_key = self.account_map[acct_label]
+        rot = self._rotator(self.dry_run.get())
+        symbols, side = self.symbol_filter.get().strip(), self.side_filter.get()
+        stale = True
+
+        def replace_stale():
+            # the old rows stay on screen until the first fresh page replaces them
+            nonlocal stale
+            if stale:
+                stale = False
+                self.table.clear(self.tree)
+                self.listed_account = acct_id_key
+
+        def add_page(page):
+            replace_stale()
+            self.table.insert_rows(self.tree, self.table.add(page))
+
+        def work(task):
+            # pages are handed to the Tk thread as they arrive so the first rows show after one round-trip
+            count = 0
+            for page in rot.iter_open_order_pages(acct_id_key, symbols, side):
+                if task.cancelled:
+                    break
+                task.post(add_page, page)
+                count += len(page)
+            return count
+
+        def done(count):
+            self._set_busy()
+            replace_stale()
+            self._snapshot_selection()
+            logging.getLogger().info("Preview loaded: %d open orders.", count)
+
+        def fail(e):
+            self._set_busy()
             messagebox.showerror("Error", f"Preview failed: {e}")
 
-    # Scheduling (simple cron via APScheduler)
+        task = self.tasks.submit("Preview", work, on_done=done, on_error=fail)
+        self._set_busy(task, "listing")
+
+    # Scheduling (simple cron via APScheduler, see scheduling.py)
     def _apply_schedule(self):
-        import pytz
-        from tzlocal import get_localzone
-        from apscheduler.schedulers.background import BackgroundScheduler
-        from apscheduler.triggers.cron import CronTrigger
-
-        tz = get_localzone().key if hasattr(get_localzone(), "key") else "America/Phoenix"
-        if not hasattr(self, "scheduler"):
-            self.scheduler = BackgroundScheduler(timezone=pytz.timezone(tz))
-            self.scheduler.start()
-
-        self.scheduler.remove_all_jobs()
-
-        def parse_hms(s):
-            h,m,sec = s.split(":")
-            return int(h), int(m), int(sec)
-
-        h,m,s = parse_hms(self.s_gtce_1.get())
-        self.scheduler.add_job(lambda:self._run_now("EXTENDED","GOOD_FOR_DAY"),
-                               CronTrigger(hour=h, minute=m, second=s, timezone=self.scheduler.timezone))
-        h,m,s = parse_hms(self.s_gtce_2.get())
-        self.scheduler.add_job(lambda:self._run_now("EXTENDED","GOOD_FOR_DAY"),
-                               CronTrigger(hour=h, minute=m, second=s, timezone=self.scheduler.timezone))
-        h,m,s = parse_hms(self.s_extgtc.get())
-        self.scheduler.add_job(lambda:self._run_now("REGULAR","GOOD_UNTIL_CANCEL"),
-                               CronTrigger(hour=h, minute=m, second=s, timezone=self.scheduler.timezone))
-        logging.getLogger().info("Scheduler updated. GTCE: %s & %s; EXTGTC: %s", self.s_gtce_1.get(), self.s_gtce_2.get(), self.s_extgtc.get())
+        try:
+            lead_s = max(0, int(float(self.stage_lead.get() or 0)))
+        except (ValueError, OverflowError):
+            messagebox.showerror("Bad schedule", f"Stage lead must be a number of seconds, not {self.stage_lead.get()!r}.")
+            return
+        times = {"gtce_1": self.s_gtce_1.get(), "gtce_2": self.s_gtce_2.get(), "extgtc": self.s_extgtc.get()}
+        try:
+            self.scheduler.apply(times, lead_s)
+        except ValueError as e:
+            messagebox.showerror("Bad schedule", f"Times must be HH:MM:SS: {e}")
+            return
+        self._snapshot_selection()
+        logging.getLogger().info("Scheduler updated. GTCE: %s & %s; EXTGTC: %s (staged %ss ahead)",
+                                 self.s_gtce_1.get(), self.s_gtce_2.get(), self.s_extgtc.get(), lead_s)
+
+    def _rotator(self, dry_run: bool) -> "OrderRotator":
+        from rotator import OrderRotator
+
+        rot = OrderRotator(self.api, dry_run=dry_run, journal=self.journal, store=self.store)
+        rot.trigger.misfire_grace = MISFIRE_GRACE_SECONDS
+        return rot
 
     def _selected_orders(self):
-        sel = []
-        for iid in self.tree.get_children(""):
-            if self.tree.set(iid, "chk") == "✓":
-                od = {k:self.tree.set(iid,k) for k in ("orderId","symbol","side","qty","price","priceType","session","duration")}
-                # normalize numbers
-                try: od["qty"] = float(od["qty"])
-                except: pass
-                try: od["price"] = float(od["price"])
-                except: pass
-                sel.append(od)
-        return sel
+        return self.table.selected()
+
+    def _selection_rules(self) -> "SelectionRules":
+        """Rules for scheduled runs: the symbol/side filters plus the Type / Qty ≥ / Limit ≥ column filters."""
+        from rotator import SelectionRules
+
+        return SelectionRules(self.symbol_filter.get(), self.side_filter.get(), self.col_type.get(),
+                              qty_min=_float_or_none(self.col_qty.get()),
+                              price_min=_float_or_none(self.col_price.get()), match_all=self.match_all.get())
+
+    def _snapshot_selection(self):
+        """
+        Captures (on the Tk thread) everything a scheduled job needs, so scheduler threads never
+        read widgets or Tk variables. Called whenever the selection rules or their inputs change.
+        """
+        if self.all_accounts.get():
+            accounts = list(self.account_map.values())
+        else:
+            selected = self.account_map.get(self.selected_account.get())
+            accounts = [selected] if selected else []
+        self._job_snapshot = {
+            "api": self.api,
+            "keeper": self.keeper,
+            "accounts": accounts,
+            "rules": self._selection_rules(),
+            "dry_run": self.dry_run.get(),
+        }
+
+    def _set_busy(self, task=None, label=""):
+        self.current_task = task
+        self.progress["value"] = 0
+        self.progress_label.configure(text=label)
+        self._update_cancel_btn()
+        for btn in self.task_buttons:
+            btn.configure(state="disabled" if task is not None else "normal")
+
+    def _busy(self) -> bool:
+        """True (and says so) while a preview/rotation runs; its progress, table updates and Cancel are exclusive."""
+        if self.current_task is None:
+            return False
+        messagebox.showinfo("Busy", f"{self.current_task.name} is still running; wait for it or Cancel it first.")
+        return True
+
+    def _on_progress(self, done, total):
+        self.progress["maximum"] = max(total, 1)
+        self.progress["value"] = done
+        self.progress_label.configure(text=f"{done}/{total}")
+
+    def _update_cancel_btn(self):
+        busy = self.current_task is not None or self.staged_cancels
+        self.cancel_btn.configure(state="normal" if busy else "disabled")
+
+    def _cancel_task(self):
+        if self.current_task is not None:
+            self.current_task.cancel()
+            logging.getLogger().warning("Cancelling %s…", self.current_task.name)
+        for cancel in list(self.staged_cancels):
+            cancel.set()
+            logging.getLogger().warning("Cancelling the scheduled run…")
 
     def _run_now(self, session, duration):
+        if self._busy():
+            return
+        acct_label = self.selected_account.get()
+        if not acct_label:
+            messagebox.showwarning("Pick account","Please select an account first.")
+            return
+        acct_id_key = self.account_map[acct_label]
+        if self.listed_account != acct_id_key:
+            messagebox.showinfo("No live listing", "The table does not show a live listing of this account yet; "
+                                                   "press Preview (or wait for the refresh) first.")
+            return
+        rot = self._rotator(self.dry_run.get())
+        selected = self._selected_orders()
+        if not selected:
+            messagebox.showinfo("No orders selected", "Use the ✓ column to pick orders first.")
+            return
+        orders = rot.plan(acct_id_key, session, duration, orders=selected).orders
+        if not orders:
+            messagebox.showinfo("Nothing to change", f"All selected orders are already {session}/{duration}.")
+            return
+
+        def finish(results):
+            self._set_busy()
+            self._report_results(results)
+
+        def fail(e):
+            self._set_busy()
+            messagebox.showerror("Error", f"Run-now failed: {e}")
+
+        task = self.tasks.submit("Run-now", lambda t: rot.rotate(acct_id_key, orders, session, duration,
+                                                                 progress=t.progress, cancel=t.cancel_event),
+                                 on_done=finish, on_error=fail, on_progress=self._on_progress)
+        self._set_busy(task, f"0/{len(orders)}")
+
+    def _check_interrupted(self):
+        try:
+            self.journal.compact()
+            runs = self.journal.incomplete_runs()
+        except Exception:
+            logging.getLogger().exception("Could not read %s", JOURNALFILE)
+            return
+        for run in runs:
+            logging.getLogger().warning("Run %s (%s/%s%s) was interrupted with %d orders not placed; "
+                                        "sign in and use Resume Interrupted to finish it.", run.run_id, run.session,
+                                        run.duration, ", dry run" if run.dry_run else "", len(run.pending()))
+
+    def _resume_run(self):
+        if self._busy():
+            return
+        if self.api is None or self.api.session is None:
+            messagebox.showwarning("Not signed in", "Submit the PIN first.")
+            return
+        rot = self._rotator(self.dry_run.get())
+
+        def finish(results):
+            self._set_busy()
+            if results:
+                self._report_results(results)
+            else:
+                messagebox.showinfo("Nothing to resume", "No interrupted run has orders left to change.")
+
+        def fail(e):
+            self._set_busy()
+            messagebox.showerror("Error", f"Resume failed: {e}")
+
+        task = self.tasks.submit("Resume", lambda t: rot.resume(progress=t.progress, cancel=t.cancel_event),
+                                 on_done=finish, on_error=fail, on_progress=self._on_progress)
+        self._set_busy(task, "resuming")
+
+    def _run_staged(self, session, duration, hms):
+        # runs on an APScheduler thread: only the snapshot is read, UI work goes through self.tasks
+        snap = self._job_snapshot
+        cancel = threading.Event()
         try:
-            acct_label = self.selected_account.get()
-            if not acct_label:
-                messagebox.showwarning("Pick account","Please select an account first.")
+            if snap["api"] is None or not snap["accounts"]:
+                logging.getLogger().warning("Scheduled %s/%s skipped: no account selected.", session, duration)
+                metrics.SCHEDULED_JOBS.inc(result="skipped")
                 return
-            acct_id_key = self.account_map[acct_label]
-            rot = OrderRotator(self.api, dry_run=self.dry_run.get())
-            orders = self._selected_orders()
-            if not orders:
-                messagebox.showinfo("No orders selected", "Use the ✓ column to pick orders first.")
+            from rotator import OrderRotator, require_selection
+
+            try:
+                require_selection(snap["rules"])
+            except ValueError as e:
+                logging.getLogger().warning("Scheduled %s/%s skipped: %s.", session, duration, e)
+                metrics.SCHEDULED_JOBS.inc(result="skipped")
                 return
-            import time as _t
-            import json as _j
-            cnt_ok = 0
-            for od in orders:
-                if self.dry_run.get():
-                    logging.getLogger().info("DRY-RUN %s %s qty=%s (%s → %s) id=%s",
-                                             od["side"], od["symbol"], od["qty"], od.get("session"), session, od["orderId"])
-                    cnt_ok += 1
-                    continue
-                # Preview & place
-                payload = {"PreviewOrderRequest": {
-                    "orderType":"EQ",
-                    "clientOrderId": int(_t.time()*1000),
-                    "Order":[{
-                        "allOrNone": False,
-                        "priceType": od.get("priceType","LIMIT"),
-                        "orderTerm": duration,
-                        "marketSession": session,
-                        "Instrument":[{
-                            "Product":{"securityType":"EQ","symbol":od["symbol"]},
-                            "orderAction": od["side"],
-                            "quantityType":"QUANTITY",
-                            "quantity": (float(od.get("qty")) if (od.get("qty") not in (None, "", "None")) else (_raise_qty_missing(od))),
-                            **({"limitPrice": float(od["price"])} if od.get("price") not in (None,"") else {}),
-                        }]
-                    }]
-                }}
-                prev = self.api.preview_change(acct_id_key, od["orderId"], payload)
-                # Try to get order-id or previewId if needed; place using same body or include previewId if present
-                place_body = {"PlaceOrderRequest": {"orderType":"EQ"}}
-                # Some APIs prefer echoing the same 'Order' structure + previewId when returned
-                if "PreviewOrderResponse" in prev and "previewId" in prev["PreviewOrderResponse"]:
-                    place_body["PlaceOrderRequest"]["previewId"] = prev["PreviewOrderResponse"]["previewId"]
-                if "PreviewOrderRequest" in payload:
-                    place_body["PlaceOrderRequest"]["Order"] = payload["PreviewOrderRequest"]["Order"]
-                plc = self.api.place_change(acct_id_key, od["orderId"], place_body)
-                logging.getLogger().info("Changed order %s → %s/%s (resp keys: %s)",
-                                         od["orderId"], session, duration, list(plc.keys()))
-                cnt_ok += 1
-            logging.getLogger().info("Done. Changed %d orders.", cnt_ok)
+
+            rot = OrderRotator(snap["api"], dry_run=snap["dry_run"], journal=self.journal, store=self.store)
+            rot.trigger.misfire_grace = MISFIRE_GRACE_SECONDS
+            fire_at = self.scheduler.fire_at(hms)
+            if snap["keeper"] is not None:
+                # fails fast when the token dies at midnight ET before fire_at; renews it if idle
+                snap["keeper"].ensure_valid(fire_at)
+            self.staged_cancels.add(cancel)
+            self.tasks.call_soon(self._update_cancel_btn)
+            outcomes = rot.rotate_accounts(snap["accounts"], snap["rules"], session, duration, fire_at=fire_at,
+                                           cancel=cancel)
+            results = [r for out in outcomes.values() for r in out.results]
+            errors = [out for out in outcomes.values() if out.error]
+            skipped = results and all(r["status"] == "skipped" for r in results)
+            metrics.SCHEDULED_JOBS.inc(result="failed" if errors else "skipped" if skipped
+                                       else "cancelled" if cancel.is_set() else "ok")
+            self.tasks.call_soon(self._report_results, results)
+            if errors:
+                self.tasks.call_soon(messagebox.showerror, "Error", "Scheduled run failed for "
+                                     + "; ".join(f"{out.account_id_key}: {out.error}" for out in errors))
         except Exception as e:
-            logging.getLogger().exception("Run-now failed")
-            messagebox.showerror("Error", f"Run-now failed: {e}")
+            metrics.SCHEDULED_JOBS.inc(result="failed")
+            logging.getLogger().exception("Scheduled run failed")
+            self.tasks.call_soon(messagebox.showerror, "Error", f"Scheduled run failed: {e}")
+        finally:
+            self.staged_cancels.discard(cancel)
+            self.tasks.call_soon(self._update_cancel_btn)
+
+    def _start_metrics(self):
+        if METRICS_PORT:
+            try:
+                metrics.start_metrics_server(port=METRICS_PORT)
+            except OSError as e:
+                logging.getLogger().warning("Metrics endpoint not started on port %d: %s", METRICS_PORT, e)
+        self._refresh_metrics()
+
+    def _refresh_metrics(self):
+        self.metrics_label.configure(text="\n".join(metrics.summary_lines()))
+        self.root.after(METRICS_REFRESH_MS, self._refresh_metrics)
+
+    def _report_results(self, results):
+        from rotator import outcome_report
+
+        failed = [r for r in results if not r["ok"]]
+        report = outcome_report(results)
+        logging.getLogger().info("Done. Changed %d orders.", len(results) - len(failed))
+        logging.getLogger().info("Outcome: %s", report)
+        if self.api is not None:
+            logging.getLogger().info("Rate limits: %s", self.api.rate_limit_stats())
+            logging.getLogger().info("Server clock: %s", self.api.clock.stats())
+            logging.getLogger().info("Read cache: %s", self.api.cache_stats())
+        if failed:
+            kinds = dict(report["by_failure"])
+            kinds.update((s, n) for s, n in report["by_status"].items() if s in ("cancelled", "skipped"))
+            kinds = ", ".join(f"{n} {kind}" for kind, n in sorted(kinds.items()))
+            lines = "\n".join(f"{r['orderId']} ({r['symbol']}) [{r.get('failure') or r['status']}]: {r['error']}"
+                              for r in failed[:10])
+            messagebox.showwarning("Some orders failed",
+                                   f"{len(failed)} of {len(results)} orders failed ({kinds}; "
+                                   f"{report['recovered']} recovered on retry):\n\n{lines}")
 
 def main():
     root = tk.Tk()
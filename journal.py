@@ -0,0 +1,309 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Order states in the journal, in the order a change moves through them
+PLANNED = "planned"
+PREVIEWED = "previewed"
+PLACED = "placed"
+FAILED = "failed"
+# states that mean "done, don't touch again on resume"
+COMPLETED_STATES = (PLACED, "dry-run")
+# compact(): how long finished runs are kept, and how long an unfinished run stays resumable
+KEEP_FINISHED = 7 * 86400
+STALE_AFTER = 86400
+
+
+class ClientIdGenerator:
+    """
+    Unique, strictly increasing clientOrderIds: epoch milliseconds, bumped by one whenever two
+    changes land in the same millisecond (or the clock steps back). Thread-safe.
+    """
+
+    def __init__(self, floor: int=0):
+        self._last = floor
+        self._lock = threading.Lock()
+
+    def advance_to(self, floor: int):
+        with self._lock:
+            self._last = max(self._last, floor)
+
+    def next(self) -> int:
+        with self._lock:
+            self._last = max(self._last + 1, int(time.time() * 1000))
+            return self._last
+
+
+class RunState:
+    """One journaled run replayed from disk: its header, per-order latest state and whether it finished."""
+
+    def __init__(self, run_id: str, header: Dict[str,Any]):
+        self.run_id = run_id
+        self.header = header
+        self.orders: Dict[Any,Dict[str,Any]] = {}  # orderId → {"state", "clientOrderId", ...}
+        self.finished = False
+        self.updated = header.get("ts") or 0  # time of the run's latest event
+        self.outcome: Optional[Dict[str,Any]] = None
+
+    @property
+    def account_id_key(self) -> str:
+        return self.header.get("account")
+
+    @property
+    def session(self) -> str:
+        return self.header.get("session")
+
+    @property
+    def duration(self) -> str:
+        return self.header.get("duration")
+
+    @property
+    def dry_run(self) -> bool:
+        return bool(self.header.get("dry_run"))
+
+    def pending(self) -> List[Any]:
+        """orderIds planned in this run but not yet placed."""
+        return [oid for oid, st in self.orders.items() if st["state"] not in COMPLETED_STATES]
+
+    def client_ids(self) -> Dict[Any,int]:
+        return {oid: st["clientOrderId"] for oid, st in self.orders.items() if st.get("clientOrderId") is not None}
+
+
+class RotationJournal:
+    """
+    Append-only JSON Lines record of rotation runs, safe across threads and processes.
+
+    Every line is one event — "run" (header), "planned" / "previewed" / "placed" / "failed" for an
+    order, "done" — written under a FileLock and fsynced, so after a crash the file holds every
+    step that completed. `load()` replays it (ignoring a torn last line) so an interrupted run can
+    be resumed without redoing orders that were already placed.
+
+    Writes are group-committed: events recorded with sync=False wait in memory for the next synced
+    one, and threads syncing at the same time share one write and fsync. `compact()` drops old
+    finished runs and gives up on unfinished ones past STALE_AFTER.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.log = logging.getLogger("journal")
+        self._lock = None
+        self._run_seq = 0
+        self._seq_lock = threading.Lock()
+        self._pending: List[Dict[str,Any]] = []
+        self._queued = 0    # events ever handed to _append
+        self._written = 0   # of those, how many are on disk
+        self._buf_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # clientOrderId high-water mark and how far into the file (which inode) it has been scanned
+        self._client_id_hw = 0
+        self._scanned = (None, 0)
+        self._client_ids: Optional[ClientIdGenerator] = None  # shared by every rotator on this journal
+
+    @property
+    def lock(self):
+        # filelock pulls in asyncio; created on first use so constructing a journal stays cheap
+        with self._seq_lock:
+            if self._lock is None:
+                from filelock import FileLock
+                self._lock = FileLock(self.path + ".lock")
+            return self._lock
+
+    def _append(self, events: Iterable[Dict[str,Any]], sync: bool=True):
+        events = list(events)
+        with self._buf_lock:
+            self._pending.extend(events)
+            self._queued += len(events)
+            target = self._queued
+            for ev in events:
+                self._note_client_id(ev)
+        if sync:
+            self._flush_to(target)
+
+    def _flush_to(self, target: int):
+        with self._write_lock:
+            with self._buf_lock:
+                if self._written >= target:
+                    return  # another thread's write already carried these events
+                batch, self._pending = self._pending, []
+                upto = self._queued
+            lines = "".join(json.dumps(ev, default=str, separators=(",", ":")) + "\n" for ev in batch)
+            with self.lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._written = upto
+
+    def flush(self):
+        """Writes any events recorded with sync=False."""
+        with self._buf_lock:
+            target = self._queued
+        self._flush_to(target)
+
+    def start_run(self, account_id_key: str, session: str, duration: str, dry_run: bool,
+                  planned: Dict[Any,int]) -> str:
+        """Writes the run header plus one "planned" line per orderId (→ its clientOrderId); returns the run id."""
+        with self._seq_lock:
+            self._run_seq += 1
+            run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._run_seq}"
+        ts = round(time.time(), 3)
+        header = {"ts": ts, "run": run_id, "event": "run", "account": account_id_key,
+                  "session": session, "duration": duration, "dry_run": dry_run}
+        self._append([header] + [{"ts": ts, "run": run_id, "event": PLANNED, "orderId": oid, "clientOrderId": cid}
+                                 for oid, cid in planned.items()])
+        return run_id
+
+    def plan_more(self, run_id: str, planned: Dict[Any,int]):
+        ts = round(time.time(), 3)
+        self._append({"ts": ts, "run": run_id, "event": PLANNED, "orderId": oid, "clientOrderId": cid}
+                     for oid, cid in planned.items())
+
+    def record(self, run_id: str, event: str, order_id=None, sync: bool=True, **fields):
+        """Appends one event; with sync=False it is only buffered until the next synced write or flush()."""
+        ev = {"ts": round(time.time(), 3), "run": run_id, "event": event}
+        if order_id is not None:
+            ev["orderId"] = order_id
+        ev.update(fields)
+        self._append([ev], sync)
+
+    def finish_run(self, run_id: str, outcome: Optional[Dict[str,Any]]=None):
+        self.record(run_id, "done", outcome=outcome)
+
+    def _read_lines(self) -> List[str]:
+        self.flush()
+        try:
+            with self.lock, open(self.path, encoding="utf-8") as f:
+                return f.readlines()
+        except FileNotFoundError:
+            return []
+
+    def _events(self, lines: Iterable[str]) -> Iterator[Dict[str,Any]]:
+        """Parsed events, one per line; an unreadable line (a torn write) comes back as {}."""
+        for n, line in enumerate(lines, 1):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                self.log.warning("Skipping unreadable journal line %d in %s.", n, self.path)
+                yield {}
+
+    def load(self) -> Dict[str,RunState]:
+        """Replays the journal into run id → RunState (in the order runs started)."""
+        runs: Dict[str,RunState] = {}
+        for ev in self._events(self._read_lines()):
+            run_id, event = ev.get("run"), ev.get("event")
+            if event is None:
+                continue
+            if event == "run":
+                runs[run_id] = RunState(run_id, ev)
+                continue
+            run = runs.get(run_id)
+            if run is None:
+                continue
+            run.updated = max(run.updated, ev.get("ts") or 0)
+            if event == "done":
+                run.finished, run.outcome = True, ev.get("outcome")
+            elif "orderId" in ev:
+                st = run.orders.setdefault(ev["orderId"], {})
+                st.update({k: v for k, v in ev.items() if k not in ("run", "event", "orderId")})
+                st["state"] = event
+        return runs
+
+    def incomplete_runs(self, dry_run: Optional[bool]=None) -> List[RunState]:
+        """Runs with no "done" line (oldest first), optionally only dry or only live ones."""
+        return [r for r in self.load().values()
+                if not r.finished and (dry_run is None or r.dry_run == dry_run)]
+
+    def _note_client_id(self, ev: Dict[str,Any]):
+        try:
+            self._client_id_hw = max(self._client_id_hw, int(ev.get("clientOrderId") or 0))
+        except (TypeError, ValueError):
+            pass
+
+    def last_client_id(self) -> int:
+        """
+        Highest clientOrderId ever journaled. The file is read once; later calls only scan what
+        other processes appended since (or everything again after another process compacted it).
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return self._client_id_hw
+        with self._buf_lock:
+            ino, offset = self._scanned
+            if ino != st.st_ino or st.st_size < offset:
+                offset = 0
+            if st.st_size > offset:
+                with open(self.path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read()
+                end = chunk.rfind(b"\n") + 1  # leave a torn (still being written) last line for next time
+                for line in chunk[:end].splitlines():
+                    try:
+                        self._note_client_id(json.loads(line))
+                    except (ValueError, AttributeError):
+                        pass
+                offset += end
+            self._scanned = (st.st_ino, offset)
+            return self._client_id_hw
+
+    @property
+    def client_ids(self) -> ClientIdGenerator:
+        """The one clientOrderId sequence for this journal, starting above every id already in the file."""
+        with self._seq_lock:
+            if self._client_ids is None:
+                self._client_ids = ClientIdGenerator(self.last_client_id())
+            return self._client_ids
+
+    def next_client_id(self) -> int:
+        return self.client_ids.next()
+
+    def compact(self, keep_finished: float=KEEP_FINISHED, stale_after: float=STALE_AFTER) -> int:
+        """
+        Rewrites the journal without runs that finished more than `keep_finished` seconds ago, and
+        gives up on unfinished runs idle for more than `stale_after` (by then their orders have
+        long moved on; history lives in the order store). The clientOrderId high-water mark is kept
+        as a "mark" line. Returns the number of runs dropped.
+        """
+        now = time.time()
+        # flush before taking the file lock: _flush_to takes _write_lock, then the file lock
+        self.flush()
+        with self.lock:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                return 0
+            events = list(self._events(lines))
+            runs = {}
+            for ev in events:
+                if ev.get("event") == "run":
+                    runs[ev.get("run")] = RunState(ev.get("run"), ev)
+                elif ev.get("run") in runs:
+                    run = runs[ev["run"]]
+                    run.updated = max(run.updated, ev.get("ts") or 0)
+                    run.finished = run.finished or ev.get("event") == "done"
+            drop = set()
+            for run in runs.values():
+                if run.finished and now - run.updated > keep_finished:
+                    drop.add(run.run_id)
+                elif not run.finished and now - run.updated > stale_after:
+                    self.log.warning("Giving up on interrupted run %s (%s/%s): idle for %.0fh.", run.run_id,
+                                     run.session, run.duration, (now - run.updated) / 3600)
+                    drop.add(run.run_id)
+            if not drop:
+                return 0
+            mark = {"ts": round(now, 3), "event": "mark", "clientOrderId": self.last_client_id()}
+            kept = [ln for ln, ev in zip(lines, events)
+                    if ev and ev.get("run") not in drop and ev.get("event") != "mark"]
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps(mark, separators=(",", ":")) + "\n")
+                f.writelines(kept)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        self.log.info("Compacted %s: dropped %d runs, kept %d lines.", self.path, len(drop), len(kept))
+        return len(drop)
@@ -0,0 +1,92 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+# Request/response payload dumps go to this logger; it stays at INFO (dumps off) unless
+# ETRADE_LOG_PAYLOADS=1, so DEBUG elsewhere doesn't pay for json.dumps on every call.
+PAYLOAD_LOGGER = "etrade_api.payload"
+
+_listener: Optional[QueueListener] = None
+
+
+class LazyJSON:
+    """Defers json.dumps(obj) until a handler actually formats the record."""
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        try:
+            return json.dumps(self.obj, default=str)
+        except Exception:
+            return repr(self.obj)
+
+
+_plain = logging.Formatter()
+
+
+class _QueueHandler(QueueHandler):
+    # Unlike the stock prepare(), msg/args are queued unformatted: the listener thread calls
+    # getMessage(), so %-formatting and LazyJSON dumps happen off the caller's thread. Logged
+    # args must therefore not be mutated afterwards. The traceback goes into exc_text rather than
+    # msg so each sink can format it its own way.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, thread, msg (+ exc)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def setup_logging(logfile: str, level: int=logging.DEBUG, max_bytes: int=1_000_000, backups: int=3) -> QueueListener:
+    """
+    Routes the root logger through a QueueHandler so callers only enqueue records; a QueueListener
+    thread does the formatting and the (JSONL) file writes. Idempotent; returns the listener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    fh = RotatingFileHandler(logfile, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    fh.setFormatter(JsonLinesFormatter())
+    q = queue.SimpleQueue()
+    rootlog = logging.getLogger()
+    rootlog.setLevel(level)
+    rootlog.addHandler(_QueueHandler(q))
+    logging.getLogger(PAYLOAD_LOGGER).setLevel(
+        logging.DEBUG if os.environ.get("ETRADE_LOG_PAYLOADS") == "1" else logging.INFO)
+    _listener = QueueListener(q, fh, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def add_handler(handler: logging.Handler):
+    """Attaches another sink behind the queue (e.g. the GUI log panel)."""
+    if _listener is None:
+        logging.getLogger().addHandler(handler)
+        return
+    _listener.handlers = _listener.handlers + (handler,)
@@ -0,0 +1,250 @@
+"""
+In-process metrics for the API client, the rotator and the scheduler, rendered in the Prometheus
+text exposition format.
+
+    from metrics import start_metrics_server
+    server, url = start_metrics_server(port=9464)   # GET {url}/metrics
+
+The GUI shows `summary_lines()` in its Metrics panel.
+"""
+import bisect
+import logging
+import math
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+JITTER_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 60.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str]=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str,str]) -> Tuple[str,...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: Tuple[str,...], extra: Optional[Tuple[str,str]]=None) -> str:
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[Tuple[str,...],float] = {}
+
+    def inc(self, amount: float=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str,...],float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        return super().render() + [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in sorted(self.values().items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets: Sequence[float]=LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key → [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str,...],list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str,...],Tuple[List[int],float,int]]:
+        with self._lock:
+            return {k: (list(s[0]), s[1], s[2]) for k, s in self._series.items()}
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Bucket-interpolated quantile (like PromQL histogram_quantile); None without observations."""
+        s = self.snapshot().get(self._key(labels))
+        if not s or not s[2]:
+            return None
+        counts, _, total = s
+        rank = q * total
+        cum = 0
+        for i, c in enumerate(counts):
+            if cum + c >= rank and c:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                if i >= len(self.buckets):
+                    return lo
+                return lo + (self.buckets[i] - lo) * (rank - cum) / c
+            cum += c
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for key, (counts, total, n) in sorted(self.snapshot().items()):
+            cum = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                cum += c
+                out.append(f"{self.name}_bucket{self._labels(key, ('le', _fmt(bound)))} {cum}")
+            out.append(f"{self.name}_sum{self._labels(key)} {_fmt(round(total, 6))}")
+            out.append(f"{self.name}_count{self._labels(key)} {n}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str,_Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics.values():
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- API client ---
+API_REQUESTS = REGISTRY.register(Counter(
+    "etrade_requests_total", "E*TRADE API responses by endpoint class, method and HTTP status.",
+    ("endpoint", "method", "status")))
+API_LATENCY = REGISTRY.register(Histogram(
+    "etrade_request_seconds", "E*TRADE API request latency by endpoint class (one observation per attempt).",
+    ("endpoint",), LATENCY_BUCKETS))
+API_THROTTLED = REGISTRY.register(Counter(
+    "etrade_throttled_total", "429/503 responses by endpoint class.", ("endpoint",)))
+API_RETRIES = REGISTRY.register(Counter(
+    "etrade_throttle_retries_total", "Requests re-sent after a 429/503, by endpoint class.", ("endpoint",)))
+LISTING_PAGES = REGISTRY.register(Histogram(
+    "etrade_listing_pages", "Pages fetched per open-order listing (cache misses only).", (), PAGE_BUCKETS))
+
+# --- Rotator ---
+ROTATED_ORDERS = REGISTRY.register(Counter(
+    "rotator_orders_total", "Orders processed by rotation batches, by batch kind and final status.", ("kind", "status")))
+ORDER_RETRIES = REGISTRY.register(Counter(
+    "rotator_order_retries_total", "Orders re-queued after a throttle/transient failure, by failure class.",
+    ("failure",)))
+BATCH_SECONDS = REGISTRY.register(Histogram(
+    "rotator_batch_seconds", "Wall time of a rotation batch (rotate / fire).", ("kind",), BATCH_BUCKETS))
+ORDERS_PER_SECOND = REGISTRY.register(Gauge(
+    "rotator_orders_per_second", "Throughput of the most recent rotation batch.", ("kind",)))
+ACCOUNT_SECONDS = REGISTRY.register(Histogram(
+    "rotator_account_seconds", "Wall time of one account's part of a multi-account rotation.", ("account",),
+    BATCH_BUCKETS))
+TRIGGER_TO_FIRST_PLACE = REGISTRY.register(Histogram(
+    "rotator_trigger_to_first_place_seconds", "From the scheduled trigger to the first successful place.",
+    (), BATCH_BUCKETS))
+TRIGGER_TO_LAST_PLACE = REGISTRY.register(Histogram(
+    "rotator_trigger_to_last_place_seconds", "From the scheduled trigger to the last successful place.",
+    (), BATCH_BUCKETS))
+TRIGGER_JITTER = REGISTRY.register(Histogram(
+    "rotator_trigger_jitter_seconds", "How late the precision trigger fired relative to its target.",
+    (), JITTER_BUCKETS))
+
+# --- Scheduler ---
+SCHEDULED_JOBS = REGISTRY.register(Counter(
+    "scheduler_jobs_total", "Scheduled rotation jobs by outcome (ok / failed / skipped / cancelled).", ("result",)))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def _ms(v: Optional[float]) -> str:
+    return "-" if v is None else f"{v * 1000:.0f}ms"
+
+
+def summary_lines() -> List[str]:
+    """Short human-readable digest of the key series for the GUI panel."""
+    lines = []
+    reqs = API_REQUESTS.values()
+    throttled = API_THROTTLED.values()
+    for (endpoint,), (_, _, n) in sorted(API_LATENCY.snapshot().items()):
+        errors = sum(v for (ep, _, status), v in reqs.items() if ep == endpoint and not status.startswith("2"))
+        lines.append(f"{endpoint:<9} {n:>6} req  p50 {_ms(API_LATENCY.quantile(0.5, endpoint=endpoint)):>7}"
+                     f"  p95 {_ms(API_LATENCY.quantile(0.95, endpoint=endpoint)):>7}"
+                     f"  non-2xx {int(errors)}  throttled {int(throttled.get((endpoint,), 0))}")
+    pages = LISTING_PAGES.snapshot().get(())
+    if pages and pages[2]:
+        lines.append(f"listings  {pages[2]:>6}      avg {pages[1] / pages[2]:.1f} pages")
+    for (kind,), rate in sorted(ORDERS_PER_SECOND.values().items()):
+        lines.append(f"{kind:<9} last batch {rate:.1f} orders/s")
+    first, last = TRIGGER_TO_FIRST_PLACE.snapshot().get(()), TRIGGER_TO_LAST_PLACE.snapshot().get(())
+    if first and last:
+        lines.append(f"trigger→place  first p50 {_ms(TRIGGER_TO_FIRST_PLACE.quantile(0.5))}"
+                     f"  last p50 {_ms(TRIGGER_TO_LAST_PLACE.quantile(0.5))}  ({last[2]} fires)")
+    retries = sum(ORDER_RETRIES.values().values())
+    if retries:
+        lines.append(f"order retries {int(retries)}")
+    return lines or ["no requests yet"]
+
+
+def create_app():
+    from flask import Flask, Response
+
+    app = Flask("etrade_metrics")
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
+
+
+def start_metrics_server(host: str="127.0.0.1", port: int=9464):
+    """Serves /metrics on a background thread; returns (server, base_url). Call server.shutdown() to stop."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class _QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server(host, port, create_app(), threaded=True, request_handler=_QuietHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.getLogger("metrics").info("Metrics at http://%s:%d/metrics", host, server.server_port)
+    return server, f"http://{host}:{server.server_port}"
@@ -0,0 +1,79 @@
+from typing import Any, Dict, Optional
+
+# Attribute order doubles as the column order of the GUI table (minus the ✓ column).
+FIELDS = ("order_id", "symbol", "side", "qty", "price", "price_type", "session", "duration", "placed_time")
+# E*TRADE-style keys used in logs, JSON dumps and older dict-based callers.
+API_KEYS = ("orderId", "symbol", "side", "qty", "price", "priceType", "session", "duration", "placedTime")
+
+
+class Order:
+    """One normalized open order. Slotted: thousands of these are held per account listing."""
+    __slots__ = FIELDS
+
+    def __init__(self, order_id, symbol: Optional[str], side: Optional[str], qty: Optional[float]=None,
+                 price: Optional[float]=None, price_type: Optional[str]=None, session: Optional[str]=None,
+                 duration: Optional[str]=None, placed_time=None):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.qty = qty
+        self.price = price
+        self.price_type = price_type
+        self.session = session
+        self.duration = duration
+        self.placed_time = placed_time
+
+    def as_dict(self) -> Dict[str,Any]:
+        return {k: getattr(self, f) for k, f in zip(API_KEYS, FIELDS)}
+
+    def __repr__(self):
+        return (f"Order({self.order_id!r}, {self.symbol!r}, {self.side!r}, qty={self.qty!r}, price={self.price!r}, "
+                f"{self.price_type!r}, {self.session!r}/{self.duration!r})")
+
+
+def _first(v):
+    # E*TRADE returns either a single object or a list of them for OrderDetail / Instrument
+    if isinstance(v, list):
+        return v[0] if v else None
+    return v
+
+
+def _num(v) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return None if f != f else f  # NaN
+
+
+def normalize_order(ro: Dict[str,Any], side_filter: Optional[str]=None) -> Optional[Order]:
+    """
+    Maps one raw OrdersResponse.Order entry to an Order in a single pass.
+    Returns None when the order's side does not match `side_filter` ("BUY"/"SELL"; "BOTH" or None keeps all).
+    """
+    detail = _first(ro.get("OrderDetail")) or {}
+    inst = _first(detail.get("Instrument")) or {}
+    action = inst.get("orderAction")
+    act = str(action).upper()
+    side = "BUY" if act.startswith("BUY") else "SELL" if act.startswith("SELL") else action
+    if side_filter and side and side_filter != "BOTH" and side.upper() != side_filter.upper():
+        return None
+    qty = _num(inst.get("quantity") or inst.get("orderedQuantity")
+               or detail.get("orderedQuantity") or detail.get("quantity")
+               or ro.get("orderedQuantity") or ro.get("quantity"))
+    price = _num(inst.get("limitPrice") or detail.get("limitPrice")
+                 or inst.get("stopPrice") or detail.get("stopPrice"))
+    return Order(
+        ro.get("orderId"),
+        (inst.get("Product") or {}).get("symbol"),
+        side,
+        qty,
+        price,
+        detail.get("priceType"),
+        detail.get("marketSession") or ro.get("marketSession"),
+        detail.get("orderTerm") or ro.get("orderTerm"),
+        ro.get("orderTime") or ro.get("placedTime") or ro.get("placedTimeUTC")
+        or detail.get("placedTime") or detail.get("orderCreatedTime"),
+    )
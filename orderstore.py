@@ -0,0 +1,212 @@
+"""
+Local SQLite history of open-order listings and rotation outcomes.
+
+`orders` holds the last known open orders per account (what the GUI shows at startup before the
+first fresh listing arrives), `snapshots` when each account was last listed, and `rotations` one
+row per order per rotation run, indexed by account, symbol, session and time so questions such as
+"which orders rotated late last week" are one query.
+
+Times are epoch seconds on the local clock, the one queries use. Rotation results carry E*TRADE
+server-clock times, which record_rotation shifts by the clock offset it is given. A scheduled
+rotation also records its trigger time (`fire_at`) and `late_s`, how long after the trigger the
+order's change was placed.
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from orders import FIELDS, Order
+
+STORE_FILE = "orders.db"
+LATE_AFTER = 1.0  # seconds after the trigger beyond which a scheduled change counts as late
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    account TEXT NOT NULL,
+    order_id NOT NULL,
+    symbol TEXT, side TEXT, qty REAL, price REAL, price_type TEXT,
+    session TEXT, duration TEXT, placed_time,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (account, order_id)
+);
+CREATE INDEX IF NOT EXISTS orders_symbol ON orders (symbol);
+CREATE INDEX IF NOT EXISTS orders_session ON orders (account, session, duration);
+CREATE TABLE IF NOT EXISTS snapshots (
+    account TEXT PRIMARY KEY,
+    taken_at REAL NOT NULL,
+    orders INTEGER NOT NULL,
+    complete INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rotations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT,
+    account TEXT NOT NULL,
+    order_id NOT NULL,
+    symbol TEXT,
+    session TEXT NOT NULL,
+    duration TEXT NOT NULL,
+    status TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    failure TEXT,
+    error TEXT,
+    attempts INTEGER,
+    elapsed REAL,
+    finished REAL NOT NULL,
+    fire_at REAL,
+    late_s REAL
+);
+CREATE INDEX IF NOT EXISTS rotations_account ON rotations (account, finished);
+CREATE INDEX IF NOT EXISTS rotations_symbol ON rotations (symbol, finished);
+CREATE INDEX IF NOT EXISTS rotations_session ON rotations (session, duration, finished);
+CREATE INDEX IF NOT EXISTS rotations_late ON rotations (finished, late_s);
+"""
+
+ROTATION_COLUMNS = ("run_id", "account", "order_id", "symbol", "session", "duration", "status", "ok", "failure",
+                    "error", "attempts", "elapsed", "finished", "fire_at", "late_s")
+
+
+def _row_order(row) -> Order:
+    return Order(*row)
+
+
+class OrderStore:
+    """
+    Thread-safe wrapper around one SQLite file (WAL mode, so a reader never waits for a writer).
+    Every method opens its own short transaction; callers treat failures as non-fatal.
+    """
+
+    def __init__(self, path: str=STORE_FILE):
+        self.path = path
+        self.log = logging.getLogger("orderstore")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- Listings ---
+    def save_snapshot(self, account_id_key: str, orders: List[Order], complete: bool=True,
+                      taken_at: Optional[float]=None):
+        """
+        Records a listing. A `complete` listing (no symbol/side filter) replaces the account's known
+        orders, so orders gone from it are forgotten; a filtered one only adds or updates its orders.
+        """
+        taken_at = taken_at or time.time()
+        rows = [(account_id_key, od.order_id, od.symbol, od.side, od.qty, od.price, od.price_type,
+                 od.session, od.duration, od.placed_time, taken_at)
+                for od in orders]
+        with self._lock, self._db:
+            if complete:
+                self._db.execute("DELETE FROM orders WHERE account = ?", (account_id_key,))
+            self._db.executemany("INSERT OR REPLACE INTO orders VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows)
+            if complete or self._db.execute("SELECT 1 FROM snapshots WHERE account = ?",
+                                            (account_id_key,)).fetchone() is None:
+                self._db.execute("INSERT OR REPLACE INTO snapshots VALUES (?,?,?,?)",
+                                 (account_id_key, taken_at, len(rows), int(complete)))
+
+    def load_snapshot(self, account_id_key: Optional[str]=None) -> Optional[Tuple[str,float,List[Order]]]:
+        """(account, taken_at, orders) for the given account, else the most recently listed one; None if never listed."""
+        with self._lock:
+            if account_id_key is None:
+                snap = self._db.execute("SELECT account, taken_at FROM snapshots ORDER BY taken_at DESC LIMIT 1").fetchone()
+            else:
+                snap = self._db.execute("SELECT account, taken_at FROM snapshots WHERE account = ?",
+                                        (account_id_key,)).fetchone()
+            if snap is None:
+                return None
+            rows = self._db.execute("SELECT %s FROM orders WHERE account = ? ORDER BY symbol, order_id"
+                                    % ", ".join(FIELDS), (snap[0],)).fetchall()
+        return snap[0], snap[1], [_row_order(r) for r in rows]
+
+    # --- Rotation outcomes ---
+    def record_rotation(self, account_id_key: str, session: str, duration: str, results: List[Dict[str,Any]],
+                        run_id: Optional[str]=None, fire_at: Optional[float]=None, clock_offset: float=0.0):
+        """
+        Stores one row per result dict (see OrderRotator._place_one) and moves the known orders that
+        were placed to the target session/duration. `finished` and `fire_at` are on the server clock,
+        `clock_offset` seconds ahead of the local one.
+        """
+        now = time.time()
+        local_fire_at = fire_at - clock_offset if fire_at is not None else None
+        rows = []
+        for r in results:
+            finished = r["finished"] - clock_offset if r.get("finished") else now
+            late = round(finished - local_fire_at, 3) if fire_at is not None and r.get("status") == "placed" else None
+            rows.append((run_id, r.get("account") or account_id_key, r["orderId"], r.get("symbol"), session,
+                         duration, r.get("status"), int(bool(r.get("ok"))), r.get("failure"), r.get("error"),
+                         r.get("attempts"), r.get("elapsed"), finished, local_fire_at, late))
+        placed = [(session, duration, now, account_id_key, r["orderId"]) for r in results
+                  if r.get("status") == "placed"]
+        with self._lock, self._db:
+            self._db.executemany("INSERT INTO rotations (%s) VALUES (%s)"
+                                 % (", ".join(ROTATION_COLUMNS), ",".join("?" * len(ROTATION_COLUMNS))), rows)
+            self._db.executemany("UPDATE orders SET session = ?, duration = ?, seen_at = ? "
+                                 "WHERE account = ? AND order_id = ?", placed)
+
+    def _query(self, sql: str, args) -> List[Dict[str,Any]]:
+        with self._lock:
+            cur = self._db.execute(sql, args)
+            cols = [c[0] for c in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+    def rotations(self, since: float, until: Optional[float]=None, account_id_key: Optional[str]=None,
+                  symbol: Optional[str]=None, session: Optional[str]=None) -> List[Dict[str,Any]]:
+        """Rotation rows finished in [since, until), oldest first, optionally for one account/symbol/session."""
+        where, args = ["finished >= ?", "finished < ?"], [since, until or time.time() + 1]
+        for col, val in (("account", account_id_key), ("symbol", symbol), ("session", session)):
+            if val:
+                where.append(f"{col} = ?")
+                args.append(val.upper() if col != "account" else val)
+        return self._query("SELECT %s FROM rotations WHERE %s ORDER BY finished"
+                           % (", ".join(ROTATION_COLUMNS), " AND ".join(where)), args)
+
+    def late_rotations(self, since: float, until: Optional[float]=None, threshold_s: float=LATE_AFTER,
+                       account_id_key: Optional[str]=None) -> List[Dict[str,Any]]:
+        """Scheduled changes placed more than `threshold_s` after their trigger, latest first."""
+        where, args = ["finished >= ?", "finished < ?", "late_s > ?"], [since, until or time.time() + 1, threshold_s]
+        if account_id_key:
+            where.append("account = ?")
+            args.append(account_id_key)
+        return self._query("SELECT %s FROM rotations WHERE %s ORDER BY late_s DESC"
+                           % (", ".join(ROTATION_COLUMNS), " AND ".join(where)), args)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query the local order/rotation history.")
+    ap.add_argument("--db", default=STORE_FILE)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    late = sub.add_parser("late", help="scheduled changes placed late")
+    late.add_argument("--days", type=float, default=7.0, help="look back this many days (default: last week)")
+    late.add_argument("--threshold", type=float, default=LATE_AFTER, help="seconds after the trigger")
+    late.add_argument("--account")
+    hist = sub.add_parser("rotations", help="every recorded rotation outcome")
+    hist.add_argument("--days", type=float, default=7.0)
+    hist.add_argument("--account")
+    hist.add_argument("--symbol")
+    hist.add_argument("--session")
+    sub.add_parser("snapshot", help="last known open orders")
+    args = ap.parse_args()
+
+    store = OrderStore(args.db)
+    since = time.time() - getattr(args, "days", 0) * 86400
+    if args.cmd == "late":
+        rows = store.late_rotations(since, threshold_s=args.threshold, account_id_key=args.account)
+    elif args.cmd == "rotations":
+        rows = store.rotations(since, account_id_key=args.account, symbol=args.symbol, session=args.session)
+    else:
+        snap = store.load_snapshot()
+        rows = [] if snap is None else [dict(od.as_dict(), account=snap[0], listedAt=snap[1]) for od in snap[2]]
+    for row in rows:
+        print(json.dumps(row, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+from orders import FIELDS, Order
+
+# Treeview column id → Order attribute ("chk" is the ✓ column and lives in `checked`)
+COLUMNS = ("chk", "orderId", "symbol", "side", "qty", "price", "priceType", "session", "duration", "placedTime")
+COLUMN_FIELD = dict(zip(COLUMNS[1:], FIELDS))
+NUMERIC_COLUMNS = ("qty", "price")
+# Columns with few distinct values get a value → iids index so substring filters scan values, not rows
+INDEXED_COLUMNS = ("symbol", "session", "priceType")
+CHECK = "✓"
+
+
+def row_values(od: Order, checked: bool=False) -> list:
+    return [CHECK if checked else ""] + ["" if getattr(od, f) is None else getattr(od, f) for f in FIELDS]
+
+
+class OrderTableModel:
+    """
+    In-memory backing store for the open-orders Treeview.
+
+    Holds the typed Order per row, check state, per-column sort orders (computed once per column
+    and reused until rows change) and value indexes for the filterable text columns. `visible()`
+    computes the filtered, sorted row list from the model alone; `sync()` pushes it to the widget
+    in a single set_children call, and only when it differs from what is shown.
+    """
+
+    def __init__(self):
+        self.orders: Dict[str,Order] = {}
+        self.checked: Set[str] = set()
+        self.filters: Dict[str,object] = {}
+        self.sort_col: Optional[str] = None
+        self.sort_desc = False
+        self.render_limit: Optional[int] = None
+        self._index: Dict[str,Dict[str,Set[str]]] = {c: {} for c in INDEXED_COLUMNS}
+        self._sorted: Dict[str,List[str]] = {}
+        self._shown: Optional[List[str]] = None
+
+    # --- rows ---
+    def clear(self, tree=None):
+        """Drops every row; with `tree`, also deletes them (attached or detached) from the widget."""
+        if tree is not None:
+            existing = [iid for iid in self.orders if tree.exists(iid)]
+            if existing:
+                tree.delete(*existing)
+        self.orders.clear()
+        self.checked.clear()
+        for idx in self._index.values():
+            idx.clear()
+        self._sorted.clear()
+        self._shown = None
+
+    def add(self, orders: Iterable[Order]) -> List[str]:
+        """Adds orders (replacing rows with the same orderId); returns their iids."""
+        iids = []
+        for od in orders:
+            iid = str(od.order_id)
+            if iid in self.orders:
+                self._unindex(iid)
+            self.orders[iid] = od
+            for col in INDEXED_COLUMNS:
+                self._index[col].setdefault(self._text(od, col), set()).add(iid)
+            iids.append(iid)
+        if iids:
+            self._sorted.clear()
+        return iids
+
+    def _unindex(self, iid: str):
+        od = self.orders[iid]
+        for col in INDEXED_COLUMNS:
+            self._index[col].get(self._text(od, col), set()).discard(iid)
+
+    @staticmethod
+    def _text(od: Order, col: str) -> str:
+        v = getattr(od, COLUMN_FIELD[col])
+        return "" if v is None else str(v).upper()
+
+    # --- filtering / sorting ---
+    def set_filters(self, symbol: str="", price_type: str="", session: str="",
+                    qty_min: Optional[float]=None, price_min: Optional[float]=None):
+        self.filters = {"symbol": symbol.strip().upper(), "priceType": price_type.strip().upper(),
+                        "session": session.strip().upper(), "qty": qty_min, "price": price_min}
+
+    def set_sort(self, col: Optional[str], desc: bool=False):
+        self.sort_col, self.sort_desc = col, desc
+
+    @property
+    def active(self) -> bool:
+        """True when filters or sorting make the visible order differ from insertion order."""
+        return self.sort_col is not None or any(v not in (None, "") for v in self.filters.values())
+
+    def _matching(self) -> Optional[Set[str]]:
+        """iids passing the filters, or None when nothing filters."""
+        result: Optional[Set[str]] = None
+        for col in INDEXED_COLUMNS:
+            needle = self.filters.get(col)
+            if not needle:
+                continue
+            hits = set()
+            for value, iids in self._index[col].items():
+                if needle in value:
+                    hits |= iids
+            result = hits if result is None else result & hits
+        for col in NUMERIC_COLUMNS:
+            bound = self.filters.get(col)
+            if bound is None:
+                continue
+            attr = COLUMN_FIELD[col]
+            pool = self.orders.keys() if result is None else result
+            result = {iid for iid in pool
+                      if getattr(self.orders[iid], attr) is not None and getattr(self.orders[iid], attr) >= bound}
+        return result
+
+    def _sort_order(self, col: str) -> List[str]:
+        order = self._sorted.get(col)
+        if order is None:
+            attr = COLUMN_FIELD.get(col)
+            if col == "chk":
+                key = lambda iid: iid in self.checked
+            elif col in NUMERIC_COLUMNS:
+                key = lambda iid: (lambda v: float("-inf") if v is None else v)(getattr(self.orders[iid], attr))
+            else:
+                key = lambda iid: (lambda v: "" if v is None else str(v))(getattr(self.orders[iid], attr))
+            order = sorted(self.orders, key=key)
+            if col != "chk":  # check state changes without invalidating the cache
+                self._sorted[col] = order
+        return order
+
+    def visible(self) -> List[str]:
+        base = self._sort_order(self.sort_col) if self.sort_col else list(self.orders)
+        if self.sort_col and self.sort_desc:
+            base = base[::-1]
+        keep = self._matching()
+        rows = base if keep is None else [iid for iid in base if iid in keep]
+        if self.render_limit is not None:
+            rows = rows[:self.render_limit]
+        return rows
+
+    def selected(self) -> List[Order]:
+        """Checked orders among the visible rows, in display order."""
+        return [self.orders[iid] for iid in (self._shown if self._shown is not None else self.visible())
+                if iid in self.checked]
+
+    # --- widget ---
+    def insert_rows(self, tree, iids: List[str]):
+        """Appends freshly added rows to the widget, re-syncing only if a filter/sort must place them."""
+        replaced = False
+        for iid in iids:
+            vals = row_values(self.orders[iid], iid in self.checked)
+            if tree.exists(iid):
+                tree.item(iid, values=vals)
+                replaced = True
+            else:
+                tree.insert("", "end", iid=iid, values=vals)
+        if replaced or self.active or self.render_limit is not None:
+            self.sync(tree, force=True)
+        else:
+            self._shown = (self._shown or []) + iids
+
+    def sync(self, tree, force: bool=False) -> bool:
+        """Shows exactly visible() in the widget; returns False when nothing had to change."""
+        rows = self.visible()
+        if not force and rows == self._shown:
+            return False
+        tree.set_children("", *rows)
+        self._shown = rows
+        return True
+
+    def set_checked(self, tree, iids: Iterable[str], value: bool):
+        for iid in iids:
+            if (iid in self.checked) == value:
+                continue
+            if value:
+                self.checked.add(iid)
+            else:
+                self.checked.discard(iid)
+            tree.set(iid, "chk", CHECK if value else "")
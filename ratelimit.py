@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Converts a Retry-After header (delta-seconds or HTTP-date) into seconds from now.
+    Returns None when the header is missing or unparseable.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with AIMD adaptation.
+
+    `acquire()` blocks until a token is available; `acquire_async()` awaits one from the same budget.
+    Callers sharing one bucket can pass a `key` (e.g. an accountIdKey): while several keys wait, a
+    token goes to the key served least recently, so a key with many workers can't starve the rest.
+    `throttled()` halves the current rate (never below `min_rate`) and pauses the bucket for the
+    server's Retry-After; each `succeeded()` after a quiet period creeps the rate back up towards
+    `max_rate`.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float]=None, min_rate: Optional[float]=None,
+                 name: str="", recover_step: float=0.1, recover_after: float=5.0):
+        self.name = name
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.min_rate = float(min_rate if min_rate is not None else max(0.1, rate / 8))
+        self.recover_step = recover_step
+        self.recover_after = recover_after
+        self.throttle_events = 0
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._last_throttle = 0.0
+        self._waiting = 0
+        self._waiting_keys: Dict[Any,int] = {}  # key → callers waiting
+        self._served: Dict[Any,int] = {}        # key → grant number of its last token
+        self._grants = 0
+        self._lock = threading.Lock()
+        self.log = logging.getLogger("ratelimit")
+
+    def _refill(self, now: float):
+        # _last may sit in the future while paused so no tokens accrue during the pause
+        self._tokens = min(self.burst, self._tokens + max(0.0, now - self._last) * self.rate)
+        self._last = max(self._last, now)
+
+    def _behind(self, key) -> bool:
+        # another waiting key was served less recently than `key`; it gets the next token
+        mine = self._served.get(key, 0)
+        return any(n and k != key and self._served.get(k, 0) < mine for k, n in self._waiting_keys.items())
+
+    def _take(self, key=None) -> float:
+        """Takes a token and returns 0.0, or returns the seconds to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._tokens >= 1.0:
+                if key is not None and self._behind(key):
+                    return 1.0 / self.rate
+                self._tokens -= 1.0
+                self._grants += 1
+                if key is not None:
+                    self._served[key] = self._grants
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def _queued(self, delta: int, key=None):
+        with self._lock:
+            self._waiting += delta
+            if key is None:
+                return
+            n = self._waiting_keys.get(key, 0) + delta
+            if n:
+                self._waiting_keys[key] = n
+            else:
+                self._waiting_keys.pop(key, None)
+            if len(self._served) > 256:
+                # forget keys that have gone quiet; one coming back is simply served first
+                self._served = {k: v for k, v in self._served.items() if k in self._waiting_keys}
+
+    def acquire(self, key=None) -> float:
+        """Blocks until a token is available; returns the seconds spent waiting."""
+        t0 = time.monotonic()
+        self._queued(1, key)
+        try:
+            while True:
+                wait = self._take(key)
+                if not wait:
+                    return time.monotonic() - t0
+                time.sleep(wait)
+        finally:
+            self._queued(-1, key)
+
+    async def acquire_async(self, key=None) -> float:
+        """`acquire` for asyncio callers: waits on the event loop instead of blocking the thread."""
+        t0 = time.monotonic()
+        self._queued(1, key)
+        try:
+            while True:
+                wait = self._take(key)
+                if not wait:
+                    return time.monotonic() - t0
+                await asyncio.sleep(wait)
+        finally:
+            self._queued(-1, key)
+
+    def throttled(self, retry_after: Optional[float]=None):
+        with self._lock:
+            now = time.monotonic()
+            self.throttle_events += 1
+            self._last_throttle = now
+            # concurrent requests rejected by the same throttle episode only lower the rate once
+            if now >= self._paused_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._paused_until = max(self._paused_until, now + pause)
+            self._last = self._paused_until
+            rate = self.rate
+        self.log.warning("%s throttled; rate lowered to %.2f/s, pausing %.2fs.", self.name, rate, pause)
+
+    def succeeded(self):
+        with self._lock:
+            if self.rate >= self.max_rate:
+                return
+            if time.monotonic() - self._last_throttle < self.recover_after:
+                return
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recover_step)
+
+    def stats(self) -> Dict[str,Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": round(self.rate, 3),
+                "max_rate": self.max_rate,
+                "tokens": round(self._tokens, 3),
+                "queue_depth": self._waiting,
+                "throttle_events": self.throttle_events,
+            }
@@ -1,37 +1,231 @@
-
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+import metrics
+import tracing
+from async_api import DEFAULT_MAX_IN_FLIGHT, AsyncETradeAPI
+from journal import FAILED, PLACED, PREVIEWED, ClientIdGenerator, RotationJournal
+from orders import Order
+from orderstore import OrderStore
+from trigger import PrecisionTrigger
+
+PAGE_SIZE = 50
+# Seconds kept between the end of the pre-trigger re-check listing and the trigger itself
+RECHECK_MARGIN = 2.0
+# A staged run can be cancelled until this many seconds before its trigger; after that it fires
+CANCEL_CUTOFF = 1.0
+
+# Per-order failure classes (result["failure"]). Throttled and transient failures are re-queued
+# at the tail of the batch; validation failures and anything unrecognised are final. A place that
+# may have reached E*TRADE without an answer is "unknown": it is never re-sent, only verified
+# (see classify_failure).
+FAILURE_THROTTLE = "throttle"
+FAILURE_TRANSIENT = "transient"
+FAILURE_VALIDATION = "validation"
+FAILURE_UNKNOWN = "unknown"
+FAILURE_ERROR = "error"
+RETRYABLE_FAILURES = (FAILURE_THROTTLE, FAILURE_TRANSIENT)
+MAX_RETRIES = 2
+RETRY_BACKOFF = 1.0  # seconds before the first retry round; doubles each round
+
+# Which call of an order's preview → place failed (result["phase"])
+PHASE_PREVIEW = "preview"
+PHASE_PLACE = "place"
+
+def _nothing_sent(exc: Exception) -> bool:
+    """True when the connection failed before the request could be written (refused, DNS, connect timeout)."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = exc.args[0] if exc.args else None
+    reason = getattr(reason, "reason", reason)  # requests wraps urllib3's MaxRetryError
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+def classify_failure(exc: Exception, phase: str=PHASE_PREVIEW) -> str:
+    """
+    Maps a per-order exception to one of the FAILURE_* classes. Previews change nothing, so any
+    timeout, connection error or 5xx is transient. A place is a non-idempotent POST: only 429/503
+    (refused before processing) and connect-phase errors are retryable; a read timeout, dropped
+    connection or other 5xx may have gone through, so it is FAILURE_UNKNOWN.
+    """
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        code = exc.response.status_code
+        if code == 429:
+            return FAILURE_THROTTLE
+        if code == 503 or (code >= 500 and phase != PHASE_PLACE):
+            return FAILURE_TRANSIENT
+        if code >= 500:
+            return FAILURE_UNKNOWN
+        return FAILURE_VALIDATION
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        if phase != PHASE_PLACE or _nothing_sent(exc):
+            return FAILURE_TRANSIENT
+        return FAILURE_UNKNOWN
+    if isinstance(exc, (ValueError, KeyError)):
+        return FAILURE_VALIDATION
+    return FAILURE_ERROR
+
+def _fail(result: Dict[str,Any], exc: Exception, phase: str) -> Dict[str,Any]:
+    """Fills in a failed result; an unknown place outcome gets its own status so it is verified, not re-sent."""
+    result.update(phase=phase, failure=classify_failure(exc, phase), error=str(exc))
+    if result["failure"] == FAILURE_UNKNOWN:
+        result["status"] = FAILURE_UNKNOWN
+        result["error"] += " — outcome unknown, verify before re-sending"
+    return result
+
+def outcome_report(results: List[Dict[str,Any]]) -> Dict[str,Any]:
+    """Totals for a batch's per-order results: by status, by failure class, and how many needed retries."""
+    by_status: Dict[str,int] = {}
+    by_failure: Dict[str,int] = {}
+    for r in results:
+        by_status[r["status"]] = by_status.get(r["status"], 0) + 1
+        if r.get("failure"):
+            by_failure[r["failure"]] = by_failure.get(r["failure"], 0) + 1
+    return {
+        "total": len(results),
+        "ok": sum(1 for r in results if r["ok"]),
+        "by_status": by_status,
+        "by_failure": by_failure,
+        "retried": sum(1 for r in results if r.get("attempts", 1) > 1),
+        "recovered": sum(1 for r in results if r["ok"] and r.get("attempts", 1) > 1),
+    }
+
+def parse_symbols(symbols: Optional[str]) -> List[str]:
+    """'aapl, MSFT,,aapl' → ['AAPL', 'MSFT'] (order kept, duplicates dropped)."""
+    out: List[str] = []
+    for s in (symbols or "").split(","):
+        s = s.strip().upper()
+        if s and s not in out:
+            out.append(s)
+    return out
 
 class OrderRotator:
-    def __init__(self, api, dry_run: bool=True):
+    def __init__(self, api, dry_run: bool=True, max_workers: int=8, max_retries: int=MAX_RETRIES,
+                 retry_backoff: float=RETRY_BACKOFF, journal: Optional[RotationJournal]=None,
+                 store: Optional[OrderStore]=None):
         self.api = api
         self.dry_run = dry_run
+        # Upper bound on orders in flight at once; each worker runs preview → place for one order,
+        # so the preview of one order overlaps the place of another.
+        self.max_workers = max(1, int(max_workers))
+        self.max_retries = max(0, int(max_retries))
+        self.retry_backoff = retry_backoff
+        # with a journal, every run's planned/previewed/placed steps are recorded so it can be resumed
+        self.journal = journal
+        # rotators sharing a journal draw from its one sequence, so their clientOrderIds never collide
+        self.client_ids = journal.client_ids if journal is not None else ClientIdGenerator()
+        # with a store, every complete listing and every rotation outcome is kept for history queries
+        self.store = store
+        self.trigger = PrecisionTrigger(getattr(api, "clock", None))
         self.log = logging.getLogger("rotator")
 
-    def preview_open_orders(self, account_id_key: str, symbols: Optional[str], side_filter: str) -> List[Dict[str,Any]]:
-        sym = None
-        if symbols:
-            # If multiple, API supports single symbol per call; choose first for preview convenience
-            sym = symbols.split(",")[0].strip()
-        return self.api.list_open_orders(account_id_key, symbol=sym, count=50, side_filter=side_filter)
+    def _prefer_full_scan(self, account_id_key: str, n_symbols: int) -> bool:
+        """
+        Per-symbol queries run in parallel (ceil(n / workers) round-trips) while a full scan pages
+        sequentially (one round-trip per page). Pick whichever needs fewer round-trips, judged by the
+        account's last unfiltered listing; with no history, fan out.
+        """
+        last = getattr(self.api, "last_scan", {}).get(account_id_key)
+        if not last:
+            return False
+        fanout_rounds = math.ceil(n_symbols / self.max_workers)
+        return max(1, last["pages"]) < fanout_rounds
+
+    def iter_open_order_pages(self, account_id_key: str, symbols: Optional[str], side_filter: str,
+                              fresh: bool=False) -> Iterator[List[Order]]:
+        """
+        Yields pages of open orders matching the symbol filter as they arrive, de-duplicated by orderId.
+        Unfiltered and full-scan listings stream page by page; parallel symbol queries yield each
+        symbol's orders as that query completes. `fresh` bypasses the API's listing cache.
+        With a store, a listing read to the end is saved as the account's snapshot; pages served from
+        the API's cache are not, as they were already saved when fetched.
+        """
+        if self.store is None:
+            for page, _ in self._iter_pages(account_id_key, symbols, side_filter, fresh):
+                yield page
+            return
+        listed: List[Order] = []
+        fetched = False
+        started = time.time()
+        for page, cached in self._iter_pages(account_id_key, symbols, side_filter, fresh):
+            if not cached:
+                fetched = True
+                listed.extend(page)
+            yield page
+        if fetched:
+            complete = not parse_symbols(symbols) and (side_filter or "BOTH").upper() == "BOTH"
+            self._store("snapshot", self.store.save_snapshot, account_id_key, listed, complete, taken_at=started)
 
-    def build_change_payload(self, order: Dict[str,Any], session: str, duration: str) -> Dict[str,Any]:
+    def _iter_pages(self, account_id_key: str, symbols: Optional[str], side_filter: str,
+                    fresh: bool) -> Iterator[Tuple[List[Order],bool]]:
+        """(page, served from the API cache) pairs; see iter_open_order_pages."""
+        syms = parse_symbols(symbols)
+        seen = set()
+
+        def unseen(page):
+            out = []
+            for od in page:
+                if od.order_id not in seen:
+                    seen.add(od.order_id)
+                    out.append(od)
+            return out
+
+        source: Dict[str,Any] = {}
+        if len(syms) <= 1:
+            for page in self.api.iter_open_orders(account_id_key, symbol=syms[0] if syms else None,
+                                                  count=PAGE_SIZE, side_filter=side_filter, fresh=fresh, source=source):
+                yield unseen(page), source["cached"]
+            return
+        if self._prefer_full_scan(account_id_key, len(syms)):
+            self.log.info("Listing %d symbols via one full scan.", len(syms))
+            wanted = set(syms)
+            for page in self.api.iter_open_orders(account_id_key, count=PAGE_SIZE, side_filter=side_filter,
+                                                  fresh=fresh, source=source):
+                yield unseen(od for od in page if (od.symbol or "").upper() in wanted), source["cached"]
+            return
+        self.log.info("Listing %d symbols via parallel symbol queries.", len(syms))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(syms)), thread_name_prefix="list") as pool:
+            list_orders = tracing.bind(self.api.list_open_orders)
+            futures = {}
+            for s in syms:
+                src = {}
+                futures[pool.submit(list_orders, account_id_key, symbol=s, count=PAGE_SIZE, side_filter=side_filter,
+                                    fresh=fresh, source=src)] = src
+            for f in as_completed(futures):
+                yield unseen(f.result()), futures[f]["cached"]
+
+    def preview_open_orders(self, account_id_key: str, symbols: Optional[str], side_filter: str,
+                            fresh: bool=False) -> List[Order]:
+        return [od for page in self.iter_open_order_pages(account_id_key, symbols, side_filter, fresh) for od in page]
+
+    def build_change_payload(self, order: Order, session: str, duration: str,
+                             client_id: Optional[int]=None) -> Dict[str,Any]:
         # Minimal, correct shape; GUI chooses which fields
+        if order.qty is None:
+            raise ValueError(f"Order {order.order_id} has no quantity; preview again or reselect it.")
         instr = {
-            "Product": {"securityType":"EQ", "symbol": order["symbol"]},
-            "orderAction": order["side"],
+            "Product": {"securityType":"EQ", "symbol": order.symbol},
+            "orderAction": order.side,
             "quantityType": "QUANTITY",
-            "quantity": order["qty"],
+            "quantity": order.qty,
         }
-        if order.get("priceType","LIMIT").upper()=="LIMIT" and order.get("price") is not None:
-            instr["limitPrice"] = float(order["price"])
+        if (order.price_type or "LIMIT").upper()=="LIMIT" and order.price is not None:
+            instr["limitPrice"] = order.price
         req = {
             "PreviewOrderRequest": {
                 "orderType": "EQ",
-                "clientOrderId": int(time.time()*1000),
+                "clientOrderId": client_id if client_id is not None else self.client_ids.next(),
                 "Order": [{
                     "allOrNone": False,
-                    "priceType": order.get("priceType","LIMIT"),
+                    "priceType": order.price_type or "LIMIT",
                     "orderTerm": duration,
                     "marketSession": session,
                     "Instrument": [instr],
@@ -39,3 +233,786 @@ class OrderRotator:
             }
         }
         return req
+
+    def build_place_payload(self, preview: Dict[str,Any], payload: Dict[str,Any]) -> Dict[str,Any]:
+        # Echo the previewed 'Order' structure and include previewId when the preview returned one
+        place_body = {"PlaceOrderRequest": {"orderType":"EQ"}}
+        prev = (preview or {}).get("PreviewOrderResponse") or {}
+        if "previewId" in prev:
+            place_body["PlaceOrderRequest"]["previewId"] = prev["previewId"]
+        place_body["PlaceOrderRequest"]["Order"] = payload["PreviewOrderRequest"]["Order"]
+        return place_body
+
+    # --- Planning ---
+    def plan(self, account_id_key: str, session: str, duration: str, rules: Optional["SelectionRules"]=None,
+             orders: Optional[List[Order]]=None, fresh: bool=False) -> "RotationPlan":
+        """
+        Works out the minimal change set for rotating to session/duration: orders matching `rules`
+        whose session or duration differs from the target. Without `orders`, lists the account's
+        open orders (from the API's read cache unless `fresh`; rule symbols and side narrow the listing itself).
+        """
+        rules = rules or SelectionRules()
+        if orders is None:
+            with tracing.span("list", "phase", fresh=fresh):
+                orders = self.preview_open_orders(account_id_key, ",".join(rules.symbols), rules.side, fresh)
+        matched = [od for od in orders if rules.matches(od)]
+        changes = [od for od in matched if _needs_change(od, session, duration)]
+        plan = RotationPlan(account_id_key, session, duration, changes,
+                            unchanged=len(matched) - len(changes), excluded=len(orders) - len(matched),
+                            dry_run=self.dry_run,
+                            preview_requests=1 if getattr(self.api, "preview_put_ok", None) else 2)
+        self.log.info("Plan %s", plan.summary())
+        return plan
+
+    # --- Batch engine ---
+    def _run_pool(self, fn, items, prefix: str, progress: Optional[Callable[[int,int],None]]=None) -> list:
+        """Maps fn over items on the worker pool, keeping input order; progress(done, total) after each item."""
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items)), thread_name_prefix=prefix) as pool:
+            fn = tracing.bind(fn)
+            futures = [pool.submit(fn, it) for it in items]
+            if progress is not None:
+                for done, _ in enumerate(as_completed(futures), 1):
+                    progress(done, len(items))
+            return [f.result() for f in futures]
+
+    def _run_batch(self, fn, items, prefix: str, progress: Optional[Callable[[int,int],None]]=None,
+                   cancel: Optional[threading.Event]=None) -> List[Dict[str,Any]]:
+        """
+        Runs fn(item) → result dict for every item, isolating failures per item. Items whose failure
+        is retryable are re-queued at the tail: after the whole pass, up to max_retries further rounds
+        run just those, with exponential backoff (jittered) in between, so a throttled or 5xx order
+        never holds up the rest. progress(done, total) counts items as they reach a final outcome.
+        """
+        if not items:
+            return []
+        total = len(items)
+        done = [0]
+        lock = threading.Lock()
+
+        def final(result, attempt):
+            return result.get("failure") not in RETRYABLE_FAILURES or attempt >= self.max_retries
+
+        def run(idx_attempt):
+            idx, attempt = idx_attempt
+            result = fn(items[idx])
+            result["attempts"] = attempt + 1
+            if progress is not None and final(result, attempt):
+                with lock:
+                    done[0] += 1
+                    n = done[0]
+                progress(n, total)
+            return result
+
+        results = self._run_pool(run, [(i, 0) for i in range(total)], prefix)
+        for attempt in range(1, self.max_retries + 1):
+            retry = [i for i, r in enumerate(results) if r.get("failure") in RETRYABLE_FAILURES]
+            if not retry:
+                break
+            delay = self._retry_delay(attempt)
+            self.log.warning("Retrying %d orders (%s) in %.1fs, round %d/%d.", len(retry),
+                             ", ".join(sorted({results[i]["failure"] for i in retry})), delay, attempt, self.max_retries)
+            with tracing.span("retry backoff", "phase", orders=len(retry), round=attempt):
+                if cancel is not None:
+                    if cancel.wait(delay):
+                        break
+                else:
+                    time.sleep(delay)
+            for i in retry:
+                metrics.ORDER_RETRIES.inc(failure=results[i]["failure"])
+            for i, r in zip(retry, self._run_pool(run, [(i, attempt) for i in retry], prefix + "-retry")):
+                results[i] = r
+        return results
+
+    def _retry_delay(self, attempt: int) -> float:
+        return self.retry_backoff * 2 ** (attempt - 1) * (1 + random.uniform(0, 0.25))
+
+    def _observe_batch(self, kind: str, results: List[Dict[str,Any]], elapsed: float):
+        for r in results:
+            metrics.ROTATED_ORDERS.inc(kind=kind, status=r["status"])
+        if self.dry_run:
+            # a dry run makes no change calls; its time says nothing about place throughput
+            return
+        metrics.BATCH_SECONDS.observe(elapsed, kind=kind)
+        if elapsed > 0:
+            metrics.ORDERS_PER_SECOND.set(len(results) / elapsed, kind=kind)
+
+    @staticmethod
+    def _cancelled_result(order: Order) -> Dict[str,Any]:
+        return {"orderId": order.order_id, "symbol": order.symbol, "ok": False, "status": "cancelled",
+                "error": "cancelled", "failure": None, "elapsed": 0.0}
+
+    # --- Journal ---
+    def _begin_run(self, account_id_key: str, session: str, duration: str, orders: List[Order],
+                   run_id: Optional[str]=None, client_ids: Optional[Dict[Any,int]]=None):
+        """
+        Assigns each order its clientOrderId (keeping ids already in `client_ids`) and, with a journal,
+        records the run as planned — or, given the `run_id` of a run being continued, only the orders
+        new to it. Returns (run_id, orderId → clientOrderId).
+        """
+        ids = dict(client_ids or {})
+        new = {od.order_id: self.client_ids.next() for od in orders if od.order_id not in ids}
+        ids.update(new)
+        if self.journal is not None:
+            if run_id is None:
+                run_id = self.journal.start_run(account_id_key, session, duration, self.dry_run,
+                                                {od.order_id: ids[od.order_id] for od in orders})
+            elif new:
+                self.journal.plan_more(run_id, new)
+        return run_id, ids
+
+    def _record(self, run_id: Optional[str], event: str, order_id, sync: bool=True, **fields):
+        # previews are recorded unsynced: they reach disk with the order's placed/failed line
+        if self.journal is None or run_id is None:
+            return
+        try:
+            self.journal.record(run_id, event, order_id, sync, **fields)
+        except Exception:
+            # a journal write failing must not fail the order itself
+            self.log.exception("Journal write for order %s failed", order_id)
+
+    def _flush_journal(self):
+        # staged previews are buffered; one write covers the whole stage round
+        if self.journal is None:
+            return
+        try:
+            self.journal.flush()
+        except Exception:
+            self.log.exception("Journal write failed")
+
+    def _finish_run(self, run_id: Optional[str], results: List[Dict[str,Any]]):
+        if self.journal is not None and run_id is not None:
+            self.journal.finish_run(run_id, outcome_report(results))
+
+    def _store(self, what: str, fn, *args, **kwargs):
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            # the history store is a convenience; a failed write must never fail a listing or a run
+            self.log.exception("Order store %s write failed", what)
+
+    def _store_outcomes(self, account_id_key: str, session: str, duration: str, results: List[Dict[str,Any]],
+                        run_id: Optional[str]=None, fire_at: Optional[float]=None):
+        if self.store is not None and results:
+            self._store("rotation", self.store.record_rotation, account_id_key, session, duration, results,
+                        run_id=run_id, fire_at=fire_at, clock_offset=self.trigger.now() - time.time())
+
+    def _stage_one(self, account_id_key: str, order: Order, session: str, duration: str,
+                   run_id: Optional[str]=None, client_id: Optional[int]=None) -> "StagedChange":
+        change = StagedChange(order, client_id=client_id)
+        try:
+            with tracing.span("stage order", "order", orderId=order.order_id):
+                change.payload = self.build_change_payload(order, session, duration, client_id)
+                change.client_id = change.payload["PreviewOrderRequest"]["clientOrderId"]
+                if not self.dry_run:
+                    change.preview = self.api.preview_change(account_id_key, order.order_id, change.payload)
+                    self._record(run_id, PREVIEWED, order.order_id, False, clientOrderId=change.client_id,
+                                 previewId=(change.preview.get("PreviewOrderResponse") or {}).get("previewId"))
+        except Exception as e:
+            self.log.error("Preview of order %s failed: %s", order.order_id, e)
+            change.error = e
+        return change
+
+    def _place_one(self, account_id_key: str, change: "StagedChange", session: str, duration: str,
+                   restage: bool=False, run_id: Optional[str]=None) -> Dict[str,Any]:
+        order = change.order
+        result = {"orderId": order.order_id, "symbol": order.symbol,
+                  "ok": False, "status": "failed", "error": None, "failure": None, "elapsed": 0.0}
+        t0 = time.monotonic()
+        phase = PHASE_PREVIEW
+        try:
+            if change.error is not None and restage:
+                change = self._stage_one(account_id_key, order, session, duration, run_id, change.client_id)
+            if change.error is not None:
+                raise change.error
+            if self.dry_run:
+                self.log.info("DRY-RUN %s %s qty=%s (%s → %s) id=%s",
+                              order.side, order.symbol, order.qty, order.session, session, order.order_id)
+                result.update(ok=True, status="dry-run")
+                self._record(run_id, "dry-run", order.order_id)
+                return result
+            phase = PHASE_PLACE
+            with tracing.span("place order", "order", orderId=order.order_id):
+                plc = self.api.place_change(account_id_key, order.order_id,
+                                            self.build_place_payload(change.preview, change.payload))
+            self.log.info("Changed order %s → %s/%s (resp keys: %s)",
+                          order.order_id, session, duration, list(plc.keys()))
+            result.update(ok=True, status="placed")
+            self._record(run_id, PLACED, order.order_id)
+        except Exception as e:
+            _fail(result, e, phase)
+            self.log.error("Order %s %s failed (%s): %s", order.order_id, phase, result["failure"], e)
+            self._record(run_id, FAILED, order.order_id, failure=result["failure"], phase=phase,
+                         error=result["error"])
+        finally:
+            result["elapsed"] = time.monotonic() - t0
+            result["finished"] = self.trigger.now()
+        return result
+
+    def _rotate_one(self, account_id_key: str, order: Order, session: str, duration: str,
+                    run_id: Optional[str]=None, client_id: Optional[int]=None) -> Dict[str,Any]:
+        change = self._stage_one(account_id_key, order, session, duration, run_id, client_id)
+        return self._place_one(account_id_key, change, session, duration, run_id=run_id)
+
+    @tracing.traced_run("rotate {session}/{duration}")
+    def rotate(self, account_id_key: str, orders: List[Order], session: str, duration: str,
+               progress: Optional[Callable[[int,int],None]]=None, cancel: Optional[threading.Event]=None,
+               run_id: Optional[str]=None, client_ids: Optional[Dict[Any,int]]=None) -> List[Dict[str,Any]]:
+        """
+        Preview and place a session/duration change for every order on a bounded worker pool.
+        Returns one result dict per order, in input order; a failing order does not stop the others,
+        and throttled/transient failures are retried at the end of the batch (see _run_batch).
+        Orders not yet started when `cancel` is set come back with status "cancelled" and the
+        journaled run stays open for `resume`. `run_id`/`client_ids` continue an existing run.
+        """
+        if not orders:
+            return []
+        t0 = time.monotonic()
+        run_id, ids = self._begin_run(account_id_key, session, duration, orders, run_id, client_ids)
+
+        def one(od):
+            if cancel is not None and cancel.is_set():
+                return self._cancelled_result(od)
+            return self._rotate_one(account_id_key, od, session, duration, run_id, ids[od.order_id])
+
+        with tracing.span("rotate", "phase", orders=len(orders)):
+            results = self._run_batch(one, orders, "rotate", progress, cancel)
+        if cancel is None or not cancel.is_set():
+            self._finish_run(run_id, results)
+        self._store_outcomes(account_id_key, session, duration, results, run_id)
+        self._observe_batch("rotate", results, time.monotonic() - t0)
+        report = outcome_report(results)
+        self.log.info("Rotation %s/%s: %d/%d ok in %.2fs (workers=%d, retried %d, recovered %d, failures %s).",
+                      session, duration, report["ok"], report["total"], time.monotonic() - t0,
+                      min(self.max_workers, len(orders)), report["retried"], report["recovered"], report["by_failure"])
+        return results
+
+    # --- asyncio path ---
+    async def _record_async(self, run_id: Optional[str], event: str, order_id, sync: bool=True, **fields):
+        # synced journal appends fsync, so they run off the event loop
+        if self.journal is not None and run_id is not None:
+            if sync:
+                await asyncio.to_thread(self._record, run_id, event, order_id, **fields)
+            else:
+                self._record(run_id, event, order_id, False, **fields)
+
+    async def _rotate_one_async(self, api: Optional[AsyncETradeAPI], account_id_key: str, order: Order,
+                                session: str, duration: str, run_id: Optional[str]=None,
+                                client_id: Optional[int]=None) -> Dict[str,Any]:
+        """`_stage_one` + `_place_one` for one order as a coroutine; same result dict and journal events."""
+        result = {"orderId": order.order_id, "symbol": order.symbol,
+                  "ok": False, "status": "failed", "error": None, "failure": None, "elapsed": 0.0}
+        t0 = time.monotonic()
+        phase = PHASE_PREVIEW
+        try:
+            payload = self.build_change_payload(order, session, duration, client_id)
+            if self.dry_run:
+                self.log.info("DRY-RUN %s %s qty=%s (%s → %s) id=%s",
+                              order.side, order.symbol, order.qty, order.session, session, order.order_id)
+                result.update(ok=True, status="dry-run")
+                await self._record_async(run_id, "dry-run", order.order_id)
+                return result
+            preview = await api.preview_change(account_id_key, order.order_id, payload)
+            await self._record_async(run_id, PREVIEWED, order.order_id, False,
+                                     clientOrderId=payload["PreviewOrderRequest"]["clientOrderId"],
+                                     previewId=(preview.get("PreviewOrderResponse") or {}).get("previewId"))
+            phase = PHASE_PLACE
+            plc = await api.place_change(account_id_key, order.order_id, self.build_place_payload(preview, payload))
+            self.log.info("Changed order %s → %s/%s (resp keys: %s)",
+                          order.order_id, session, duration, list(plc.keys()))
+            result.update(ok=True, status="placed")
+            await self._record_async(run_id, PLACED, order.order_id)
+        except Exception as e:
+            _fail(result, e, phase)
+            self.log.error("Order %s %s failed (%s): %s", order.order_id, phase, result["failure"], e)
+            await self._record_async(run_id, FAILED, order.order_id, failure=result["failure"], phase=phase,
+                                     error=result["error"])
+        finally:
+            result["elapsed"] = time.monotonic() - t0
+            result["finished"] = self.trigger.now()
+        return result
+
+    async def _run_batch_async(self, fn, items, limit: int, progress: Optional[Callable[[int,int],None]]=None,
+                               cancel: Optional[threading.Event]=None) -> List[Dict[str,Any]]:
+        """`_run_batch` on the event loop: at most `limit` items in flight, same tail retry rounds."""
+        if not items:
+            return []
+        total = len(items)
+        done = 0
+        gate = asyncio.Semaphore(limit)
+
+        async def run(idx, attempt):
+            nonlocal done
+            async with gate:
+                result = await fn(items[idx])
+            result["attempts"] = attempt + 1
+            if progress is not None and (result.get("failure") not in RETRYABLE_FAILURES or attempt >= self.max_retries):
+                done += 1
+                progress(done, total)
+            return result
+
+        results = list(await asyncio.gather(*(run(i, 0) for i in range(total))))
+        for attempt in range(1, self.max_retries + 1):
+            retry = [i for i, r in enumerate(results) if r.get("failure") in RETRYABLE_FAILURES]
+            if not retry:
+                break
+            delay = self._retry_delay(attempt)
+            self.log.warning("Retrying %d orders (%s) in %.1fs, round %d/%d.", len(retry),
+                             ", ".join(sorted({results[i]["failure"] for i in retry})), delay, attempt, self.max_retries)
+            with tracing.span("retry backoff", "phase", orders=len(retry), round=attempt):
+                if cancel is not None:
+                    if await asyncio.to_thread(cancel.wait, delay):
+                        break
+                else:
+                    await asyncio.sleep(delay)
+            for i in retry:
+                metrics.ORDER_RETRIES.inc(failure=results[i]["failure"])
+            for i, r in zip(retry, await asyncio.gather(*(run(i, attempt) for i in retry))):
+                results[i] = r
+        return results
+
+    async def rotate_async(self, account_id_key: str, orders: List[Order], session: str, duration: str,
+                           progress: Optional[Callable[[int,int],None]]=None, cancel: Optional[threading.Event]=None,
+                           run_id: Optional[str]=None, client_ids: Optional[Dict[Any,int]]=None,
+                           api: Optional[AsyncETradeAPI]=None) -> List[Dict[str,Any]]:
+        """
+        `rotate` as a coroutine: every order's preview → place runs on the event loop, with up to
+        api.max_in_flight orders in flight instead of one thread each. `api` is an AsyncETradeAPI;
+        without one, a client sharing self.api's token, limiters and cache is opened for the call.
+        Results, journaling, retries and cancellation behave exactly as in `rotate`.
+        """
+        if not orders:
+            return []
+        t0 = time.monotonic()
+        run_id, ids = await asyncio.to_thread(self._begin_run, account_id_key, session, duration, orders,
+                                              run_id, client_ids)
+        owned = api is None and not self.dry_run
+        if owned:
+            api = AsyncETradeAPI.from_api(self.api)
+        limit = api.max_in_flight if api is not None else DEFAULT_MAX_IN_FLIGHT
+
+        async def one(od):
+            if cancel is not None and cancel.is_set():
+                return self._cancelled_result(od)
+            return await self._rotate_one_async(api, account_id_key, od, session, duration, run_id,
+                                                ids[od.order_id])
+
+        try:
+            with tracing.recording(f"rotate-async {session}/{duration}"), \
+                    tracing.span("rotate", "phase", orders=len(orders)):
+                results = await self._run_batch_async(one, orders, limit, progress, cancel)
+        finally:
+            if owned:
+                await api.close()
+        if cancel is None or not cancel.is_set():
+            await asyncio.to_thread(self._finish_run, run_id, results)
+        await asyncio.to_thread(self._store_outcomes, account_id_key, session, duration, results, run_id)
+        self._observe_batch("rotate", results, time.monotonic() - t0)
+        report = outcome_report(results)
+        self.log.info("Rotation %s/%s (async): %d/%d ok in %.2fs (in flight ≤%d, retried %d, recovered %d, "
+                      "failures %s).", session, duration, report["ok"], report["total"], time.monotonic() - t0,
+                      min(limit, len(orders)), report["retried"], report["recovered"], report["by_failure"])
+        return results
+
+    # --- Pre-staged (two-phase) rotations ---
+    def stage(self, account_id_key: str, orders: List[Order], session: str, duration: str) -> "StagedRotation":
+        """Builds every change payload and previews it now so that `fire` only has to place."""
+        t0 = time.monotonic()
+        run_id, ids = self._begin_run(account_id_key, session, duration, orders)
+        with tracing.span("stage", "phase", orders=len(orders)):
+            changes = self._run_pool(lambda od: self._stage_one(account_id_key, od, session, duration,
+                                                                run_id, ids[od.order_id]), orders, "stage")
+        self._flush_journal()
+        errors = sum(1 for ch in changes if ch.error is not None)
+        self.log.info("Staged %d changes to %s/%s (%d preview errors) in %.2fs.",
+                      len(changes), session, duration, errors, time.monotonic() - t0)
+        staged = StagedRotation(account_id_key, session, duration, changes)
+        staged.run_id = run_id
+        return staged
+
+    def restage(self, staged: "StagedRotation", current: List[Order]) -> int:
+        """
+        Reconciles a staged rotation with a fresh plan or listing: orders no longer in it are dropped,
+        orders new to it are staged, and only orders whose listed state changed (or whose preview
+        failed) are previewed again. Returns the number of (re-)previews.
+        """
+        by_id = {od.order_id: od for od in current}
+        staged_ids = {ch.order.order_id for ch in staged.changes}
+        keep, redo = [], [od for od in current if od.order_id not in staged_ids]
+        for ch in staged.changes:
+            cur = by_id.get(ch.order.order_id)
+            if cur is None:
+                self.log.info("Order %s is no longer open or to be changed; dropped from staged rotation.",
+                              ch.order.order_id)
+            elif ch.error is not None or _fingerprint(cur) != _fingerprint(ch.order):
+                redo.append(cur)
+            else:
+                keep.append(ch)
+        known = {ch.order.order_id: ch.client_id for ch in staged.changes}
+        staged.run_id, ids = self._begin_run(staged.account_id_key, staged.session, staged.duration, redo,
+                                             staged.run_id, known)
+        with tracing.span("restage", "phase", orders=len(redo)):
+            redone = self._run_pool(lambda od: self._stage_one(staged.account_id_key, od, staged.session,
+                                                               staged.duration, staged.run_id, ids[od.order_id]),
+                                    redo, "restage")
+        staged.changes = keep + redone
+        self._flush_journal()
+        self.log.info("Re-check: %d staged, %d re-previewed.", len(staged.changes), len(redone))
+        return len(redone)
+
+    def fire(self, staged: "StagedRotation", progress: Optional[Callable[[int,int],None]]=None,
+             cancel: Optional[threading.Event]=None) -> List[Dict[str,Any]]:
+        """
+        Places every staged change; changes whose preview failed get one more preview first.
+        Changes not yet started when `cancel` is set come back "cancelled"; the run is closed either way.
+        Times from the trigger (staged.fire_at on the server clock; the call itself when fired by
+        hand) to the first and last successful place go to metrics.
+        """
+        t0 = time.monotonic()
+        triggered = staged.fire_at if staged.fire_at is not None else self.trigger.now()
+        placed_at: List[float] = []
+
+        def one(ch):
+            if cancel is not None and cancel.is_set():
+                return self._cancelled_result(ch.order)
+            result = self._place_one(staged.account_id_key, ch, staged.session, staged.duration,
+                                     restage=True, run_id=staged.run_id)
+            if result["status"] == "placed":
+                placed_at.append(result["finished"] - triggered)
+            return result
+
+        with tracing.span("fire", "phase", orders=len(staged.changes)):
+            results = self._run_batch(one, staged.changes, "fire", progress, cancel)
+        self._finish_run(staged.run_id, results)
+        self._store_outcomes(staged.account_id_key, staged.session, staged.duration, results, staged.run_id,
+                             staged.fire_at)
+        self._observe_batch("fire", results, time.monotonic() - t0)
+        if placed_at:
+            metrics.TRIGGER_TO_FIRST_PLACE.observe(max(0.0, min(placed_at)))
+            metrics.TRIGGER_TO_LAST_PLACE.observe(max(0.0, max(placed_at)))
+        report = outcome_report(results)
+        self.log.info("Fired %s/%s: %d/%d ok in %.2fs (retried %d, recovered %d, failures %s).",
+                      staged.session, staged.duration, report["ok"], report["total"], time.monotonic() - t0,
+                      report["retried"], report["recovered"], report["by_failure"])
+        return results
+
+    @tracing.traced_run("staged {session}/{duration}")
+    def run_staged(self, account_id_key: str, rules: Optional["SelectionRules"], session: str, duration: str,
+                   fire_at: float, progress: Optional[Callable[[int,int],None]]=None,
+                   cancel: Optional[threading.Event]=None) -> List[Dict[str,Any]]:
+        """
+        Two-phase scheduled rotation, called some lead time before `fire_at` (epoch seconds on the
+        E*TRADE server clock, see PrecisionTrigger).
+        Plans from a listing (a cached one is fine), builds and previews immediately; re-plans from a
+        fresh listing just early enough before the trigger to re-preview anything that changed; then
+        at `fire_at` issues only the place calls. Only orders matching `rules` and not already at
+        session/duration are touched; empty rules are refused (see require_selection).
+        Setting `cancel` up to CANCEL_CUTOFF before the trigger stops the run with nothing placed
+        (every change "cancelled", the journaled run closed); later, it stops changes not yet placed.
+        """
+        rules = require_selection(rules)
+
+        def listing(fresh=False):
+            t0 = time.monotonic()
+            plan = self.plan(account_id_key, session, duration, rules, fresh=fresh)
+            return plan.orders, time.monotonic() - t0
+
+        def cancelled():
+            self.log.info("Staged %s/%s run cancelled before its trigger.", session, duration)
+            results = [self._cancelled_result(ch.order) for ch in staged.changes]
+            self._finish_run(staged.run_id, results)
+            return results
+
+        orders, list_elapsed = listing()
+        staged = self.stage(account_id_key, orders, session, duration)
+        # leave room for the re-check listing itself to finish before the trigger
+        recheck_at = fire_at - (list_elapsed * 1.5 + RECHECK_MARGIN)
+        if self.trigger.now() < recheck_at:
+            with tracing.span("sleep until re-check", "phase"):
+                if not self.trigger.sleep_until(recheck_at, cancel):
+                    return cancelled()
+            # the re-check exists to catch changes made elsewhere, so it must not be served from cache
+            current, _ = listing(fresh=True)
+            self.restage(staged, current)
+        else:
+            self.log.warning("No time left to re-check staged orders before the trigger.")
+        if staged.changes and hasattr(self.api, "warm_up") and self.trigger.now() < fire_at - RECHECK_MARGIN / 2:
+            # the lead time may have let keep-alive connections drop; reopen them so the places skip TCP/TLS setup
+            with tracing.span("warm up", "phase"):
+                self.api.warm_up(min(self.max_workers, len(staged.changes)))
+        with tracing.span("wait for trigger", "phase") as span:
+            if not self.trigger.sleep_until(fire_at - CANCEL_CUTOFF, cancel):
+                return cancelled()
+            record = self.trigger.wait_until(fire_at, f"{session}/{duration}")
+            span["jitter_ms"] = record["jitter_ms"]
+        metrics.TRIGGER_JITTER.observe(max(0.0, record["jitter_ms"] / 1000))
+        staged.fire_at = fire_at
+        if not record["fired"]:
+            results = [{"orderId": ch.order.order_id, "symbol": ch.order.symbol, "ok": False, "status": "skipped",
+                        "error": f"trigger missed by {record['jitter_ms'] / 1000:.0f}s", "failure": None, "elapsed": 0.0}
+                       for ch in staged.changes]
+            self._finish_run(staged.run_id, results)
+            self._store_outcomes(account_id_key, session, duration, results, staged.run_id, fire_at)
+            return results
+        self.log.info("Firing %d staged changes.", len(staged.changes))
+        return self.fire(staged, progress, cancel)
+
+    @tracing.traced_run("resume")
+    def resume(self, run_id: Optional[str]=None, progress: Optional[Callable[[int,int],None]]=None,
+               cancel: Optional[threading.Event]=None) -> List[Dict[str,Any]]:
+        """
+        Continues an interrupted journaled run (the given one, else the latest unfinished run with
+        this rotator's dry-run setting). Orders the journal shows as placed are not touched again;
+        the rest are re-listed fresh, so any that reached the target before the interruption are
+        skipped by the planner, and are rotated under their original clientOrderIds.
+        """
+        if self.journal is None:
+            raise RuntimeError("resume needs an OrderRotator created with a journal")
+        runs = self.journal.incomplete_runs(dry_run=self.dry_run)
+        run = next((r for r in runs if r.run_id == run_id), None) if run_id else (runs[-1] if runs else None)
+        if run is None:
+            self.log.info("No interrupted run to resume%s.", f" with id {run_id}" if run_id else "")
+            return []
+        pending = run.pending()
+        self.log.info("Resuming run %s (%s/%s): %d of %d orders not yet placed.", run.run_id, run.session,
+                      run.duration, len(pending), len(run.orders))
+        plan = self.plan(run.account_id_key, run.session, run.duration, SelectionRules(order_ids=pending),
+                         fresh=True)
+        if not plan.orders:
+            self._finish_run(run.run_id, [])
+            return []
+        return self.rotate(run.account_id_key, plan.orders, run.session, run.duration, progress, cancel,
+                           run_id=run.run_id, client_ids=run.client_ids())
+
+    # --- Multi-account ---
+    def for_account(self, account_id_key: Optional[str]=None) -> "OrderRotator":
+        """
+        A rotator for one account of a multi-account run, with its own worker pool and connection
+        pool (its failure domain) but this rotator's journal, store, clientOrderId sequence, trigger
+        and rate budget, which the accounts share fairly (see ETradeAPI.isolated).
+        """
+        api = self.api.isolated(account_id_key) if hasattr(self.api, "isolated") else self.api
+        rot = OrderRotator(api, dry_run=self.dry_run, max_workers=self.max_workers, max_retries=self.max_retries,
+                           retry_backoff=self.retry_backoff)
+        rot.journal = self.journal
+        rot.store = self.store
+        rot.client_ids = self.client_ids
+        rot.trigger = self.trigger
+        return rot
+
+    @tracing.traced_run("accounts {session}/{duration}")
+    def rotate_accounts(self, accounts: List[str], rules: Optional["SelectionRules"], session: str, duration: str,
+                        fire_at: Optional[float]=None, progress: Optional[Callable[[int,int],None]]=None,
+                        cancel: Optional[threading.Event]=None) -> Dict[str,"AccountOutcome"]:
+        """
+        Rotates several accounts in parallel, one thread and one `for_account` rotator each. Without
+        `fire_at`, every account plans fresh and rotates now; with it, every account runs `run_staged`
+        against the same trigger. An account whose listing or rotation fails records the error in its
+        outcome without affecting the others. progress(done, total) is summed over all accounts.
+        Returns accountIdKey → AccountOutcome in the order given; each result also carries "account".
+        Raises ValueError before touching any account when `rules` are empty (see require_selection).
+        """
+        rules = require_selection(rules)
+        accounts = list(dict.fromkeys(a for a in accounts if a))
+        if not accounts:
+            return {}
+        outcomes = {acct: AccountOutcome(acct) for acct in accounts}
+        counts = {acct: (0, 0) for acct in accounts}
+        lock = threading.Lock()
+
+        def account_progress(acct):
+            def report(done, total):
+                with lock:
+                    counts[acct] = (done, total)
+                    done_all = sum(d for d, _ in counts.values())
+                    total_all = sum(t for _, t in counts.values())
+                if progress is not None:
+                    progress(done_all, total_all)
+            return report
+
+        def run(acct):
+            out = outcomes[acct]
+            rot = self.for_account(acct)
+            t0 = time.monotonic()
+            try:
+                with tracing.span("account", "phase", account=acct):
+                    if fire_at is None:
+                        plan = rot.plan(acct, session, duration, rules, fresh=True)
+                        out.results = rot.rotate(acct, plan.orders, session, duration, account_progress(acct), cancel)
+                    else:
+                        out.results = rot.run_staged(acct, rules, session, duration, fire_at, account_progress(acct),
+                                                     cancel)
+            except Exception as e:
+                self.log.exception("Account %s failed", acct)
+                out.error = str(e)
+            finally:
+                out.elapsed = time.monotonic() - t0
+                metrics.ACCOUNT_SECONDS.observe(out.elapsed, account=acct)
+            for r in out.results:
+                r["account"] = acct
+
+        t0 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix="account") as pool:
+            list(pool.map(tracing.bind(run), accounts))
+        slowest = max(outcomes.values(), key=lambda o: o.elapsed)
+        self.log.info("Rotated %d accounts to %s/%s in %.2fs (slowest %s %.2fs, sum %.2fs).", len(accounts),
+                      session, duration, time.monotonic() - t0, slowest.account_id_key, slowest.elapsed,
+                      sum(o.elapsed for o in outcomes.values()))
+        for out in outcomes.values():
+            self.log.info("  %s", out.summary())
+        return outcomes
+
+
+def require_selection(rules: Optional["SelectionRules"]) -> "SelectionRules":
+    """
+    Checks rules for a run that selects by rules alone (scheduled and multi-account runs): raises
+    ValueError when they would match every open order and match_all was not set.
+    """
+    rules = rules or SelectionRules()
+    if not rules.restricts() and not rules.match_all:
+        raise ValueError("selection rules are empty and would rotate every open order; set a symbol, side, "
+                         "type, quantity or price rule, or opt in with match_all")
+    return rules
+
+
+def _needs_change(od: Order, session: str, duration: str) -> bool:
+    return (od.session or "").upper() != session.upper() or (od.duration or "").upper() != duration.upper()
+
+
+def _fingerprint(od: Order) -> tuple:
+    return (od.symbol, od.side, od.qty, od.price, od.price_type, od.session, od.duration)
+
+
+class StagedChange:
+    """A built (and, outside dry-run, previewed) change for one order, waiting to be placed."""
+    __slots__ = ("order", "payload", "preview", "error", "client_id")
+
+    def __init__(self, order: Order, payload: Optional[Dict[str,Any]]=None, preview: Optional[Dict[str,Any]]=None,
+                 error: Optional[Exception]=None, client_id: Optional[int]=None):
+        self.order = order
+        self.payload = payload
+        self.preview = preview
+        self.error = error
+        self.client_id = client_id
+
+
+class StagedRotation:
+    def __init__(self, account_id_key: str, session: str, duration: str, changes: List[StagedChange]):
+        self.account_id_key = account_id_key
+        self.session = session
+        self.duration = duration
+        self.changes = changes
+        self.run_id: Optional[str] = None  # journal run, when the rotator has a journal
+        self.fire_at: Optional[float] = None  # trigger time, set by run_staged
+
+
+class AccountOutcome:
+    """One account's part of a multi-account rotation: its per-order results, wall time and any account-level error."""
+    __slots__ = ("account_id_key", "results", "elapsed", "error")
+
+    def __init__(self, account_id_key: str):
+        self.account_id_key = account_id_key
+        self.results: List[Dict[str,Any]] = []
+        self.elapsed = 0.0
+        self.error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and all(r["ok"] for r in self.results)
+
+    def report(self) -> Dict[str,Any]:
+        return outcome_report(self.results)
+
+    def summary(self) -> str:
+        report = self.report()
+        text = f"{self.account_id_key}: {report['ok']}/{report['total']} ok in {self.elapsed:.2f}s"
+        if report["by_failure"]:
+            text += f", failures {report['by_failure']}"
+        return text + (f", error: {self.error}" if self.error else "")
+
+    def as_dict(self) -> Dict[str,Any]:
+        return {"account": self.account_id_key, "elapsed": round(self.elapsed, 3), "error": self.error,
+                "outcome": self.report()}
+
+
+class SelectionRules:
+    """
+    Declarative order selection for planned and scheduled rotations — the same criteria as the GUI
+    column filters, applied to a listing instead of to checked rows. Empty/None criteria match anything;
+    text criteria compare case-insensitively and exactly, bounds are inclusive.
+    Rules with no criterion at all select every open order, so runs driven by rules alone refuse
+    them (see require_selection) unless `match_all` opts in explicitly.
+    """
+    __slots__ = ("symbols", "side", "price_type", "qty_min", "qty_max", "price_min", "price_max", "order_ids",
+                 "match_all")
+
+    def __init__(self, symbols=None, side: str="BOTH", price_type: Optional[str]=None,
+                 qty_min: Optional[float]=None, qty_max: Optional[float]=None,
+                 price_min: Optional[float]=None, price_max: Optional[float]=None, order_ids=None,
+                 match_all: bool=False):
+        if symbols is not None and not isinstance(symbols, str):
+            symbols = ",".join(symbols)
+        self.symbols = parse_symbols(symbols)
+        self.side = (side or "BOTH").upper()
+        self.price_type = (price_type or "").strip().upper() or None
+        self.qty_min, self.qty_max = qty_min, qty_max
+        self.price_min, self.price_max = price_min, price_max
+        self.order_ids = set(order_ids) if order_ids is not None else None
+        self.match_all = bool(match_all)
+
+    def restricts(self) -> bool:
+        """True when at least one criterion narrows the selection."""
+        return bool(self.symbols or self.side != "BOTH" or self.price_type or self.order_ids is not None
+                    or any(v is not None for v in (self.qty_min, self.qty_max, self.price_min, self.price_max)))
+
+    def matches(self, od: Order) -> bool:
+        if self.order_ids is not None and od.order_id not in self.order_ids:
+            return False
+        if self.symbols and (od.symbol or "").upper() not in self.symbols:
+            return False
+        if self.side != "BOTH" and (od.side or "").upper() != self.side:
+            return False
+        if self.price_type and (od.price_type or "").upper() != self.price_type:
+            return False
+        for value, lo, hi in ((od.qty, self.qty_min, self.qty_max), (od.price, self.price_min, self.price_max)):
+            if lo is None and hi is None:
+                continue
+            if value is None or (lo is not None and value < lo) or (hi is not None and value > hi):
+                return False
+        return True
+
+    def as_dict(self) -> Dict[str,Any]:
+        out = {k: getattr(self, k) for k in self.__slots__}
+        if self.order_ids is not None:
+            out["order_ids"] = sorted(self.order_ids, key=str)
+        return out
+
+
+class RotationPlan:
+    """The orders a rotation will actually change, with what was left out and the calls it will cost."""
+
+    def __init__(self, account_id_key: str, session: str, duration: str, orders: List[Order],
+                 unchanged: int=0, excluded: int=0, dry_run: bool=False, preview_requests: int=2):
+        self.account_id_key = account_id_key
+        self.session = session
+        self.duration = duration
+        self.orders = orders
+        self.unchanged = unchanged  # matched, but already at session/duration
+        self.excluded = excluded    # listed, but not matching the rules
+        self.dry_run = dry_run
+        # HTTP requests per preview: 1 when the server takes PUT, 2 when it answers 404/405 and the
+        # POST fallback follows (assumed until the API has seen a PUT preview succeed)
+        self.preview_requests = preview_requests
+
+    @property
+    def expected_calls(self) -> Dict[str,int]:
+        n = 0 if self.dry_run else len(self.orders)
+        previews = n * self.preview_requests
+        return {"preview": previews, "place": n, "total": previews + n}
+
+    def summary(self) -> str:
+        calls = self.expected_calls
+        return (f"{self.session}/{self.duration}: {len(self.orders)} to change, {self.unchanged} already there, "
+                f"{self.excluded} not selected; {calls['preview']} preview requests + {calls['place']} places"
+                f"{' (dry run)' if self.dry_run else ''}.")
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, time as dtime
+from typing import Any, Callable, Dict, List, Tuple
+
+MISFIRE_GRACE_SECONDS = 300
+DEFAULT_LEAD_SECONDS = 30
+
+# (slot name, target session, target duration) for the three daily rotations
+ROTATION_SLOTS = (
+    ("gtce_1", "EXTENDED", "GOOD_FOR_DAY"),
+    ("gtce_2", "EXTENDED", "GOOD_FOR_DAY"),
+    ("extgtc", "REGULAR", "GOOD_UNTIL_CANCEL"),
+)
+DEFAULT_TIMES = {"gtce_1": "04:01:00", "gtce_2": "16:00:00", "extgtc": "19:59:00"}
+
+
+def parse_hms(s: str) -> Tuple[int,int,int]:
+    h, m, sec = s.strip().split(":")
+    h, m, sec = int(h), int(m), int(sec)
+    if not (0 <= h < 24 and 0 <= m < 60 and 0 <= sec < 60):
+        raise ValueError(f"not a time of day: {s!r}")
+    return h, m, sec
+
+
+def next_occurrence(h, m, s, tz) -> datetime:
+    """Today's h:m:s in `tz`, or tomorrow's when the time-of-day already passed more than 12h ago."""
+    now = datetime.now(tz)
+    naive = datetime.combine(now.date(), dtime(h, m, s))
+    target = tz.localize(naive) if hasattr(tz, "localize") else naive.replace(tzinfo=tz)
+    if (now - target).total_seconds() > 12 * 3600:
+        target = target + timedelta(days=1)
+    return target
+
+
+def local_timezone():
+    import pytz
+    from tzlocal import get_localzone
+
+    tz = get_localzone().key if hasattr(get_localzone(), "key") else "America/Phoenix"
+    return pytz.timezone(tz)
+
+
+class RotationScheduler:
+    """
+    Daily cron jobs for the rotation slots, shared by the GUI and the daemon.
+
+    Each job starts `lead_s` before its slot's time and calls job(session, duration, (h, m, s));
+    the job itself stages and fires at h:m:s. APScheduler is imported on first use.
+    """
+
+    def __init__(self, job: Callable[[str,str,Tuple[int,int,int]],Any], misfire_grace: int=MISFIRE_GRACE_SECONDS):
+        self.job = job
+        self.misfire_grace = misfire_grace
+        self.scheduler = None
+        self.times: Dict[str,str] = {}
+        self.lead_s = 0
+
+    @property
+    def timezone(self):
+        return self.scheduler.timezone
+
+    def start(self, tz=None):
+        if self.scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+            self.scheduler = BackgroundScheduler(timezone=tz or local_timezone())
+            self.scheduler.start()
+
+    def apply(self, times: Dict[str,str], lead_s: int):
+        """Replaces all jobs with one per slot in ROTATION_SLOTS whose time is set (blank = off)."""
+        from apscheduler.triggers.cron import CronTrigger
+
+        self.start()
+        parsed = {name: parse_hms(times[name]) for name, _, _ in ROTATION_SLOTS if (times.get(name) or "").strip()}
+        self.scheduler.remove_all_jobs()
+        for name, session, duration in ROTATION_SLOTS:
+            if name not in parsed:
+                continue
+            h, m, s = parsed[name]
+            # the job starts `lead_s` early to list and preview, then places exactly at h:m:s
+            lead = (h*3600 + m*60 + s - lead_s) % 86400
+            lh, rem = divmod(lead, 3600)
+            lm, ls = divmod(rem, 60)
+            # a job woken up late (sleep/suspend) still starts within the grace window; how late the
+            # trigger itself ends up is handled by the rotator's PrecisionTrigger misfire policy
+            self.scheduler.add_job(lambda session=session, duration=duration, hms=(h, m, s):
+                                   self.job(session, duration, hms),
+                                   CronTrigger(hour=lh, minute=lm, second=ls, timezone=self.scheduler.timezone),
+                                   id=name, name=f"{name} {session}/{duration}",
+                                   misfire_grace_time=self.misfire_grace, coalesce=True, max_instances=1)
+        self.times = {name: times.get(name, "") for name, _, _ in ROTATION_SLOTS}
+        self.lead_s = lead_s
+
+    def fire_at(self, hms: Tuple[int,int,int]) -> float:
+        """Epoch seconds of the next h:m:s in the scheduler's timezone."""
+        return next_occurrence(*hms, self.timezone).timestamp()
+
+    def jobs(self) -> List[Dict[str,Any]]:
+        if self.scheduler is None:
+            return []
+        return [{"id": j.id, "name": j.name,
+                 "next_start": j.next_run_time.isoformat() if j.next_run_time else None}
+                for j in self.scheduler.get_jobs()]
+
+    def shutdown(self):
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
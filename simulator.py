@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Offline E*TRADE stand-in for load and latency testing.
+
+Implements the endpoints used by etrade_api.py — OAuth request/access/renew token, accounts list,
+paged open orders with `marker`, and order change preview/place (PUT preview answers 405 by
+default so the POST fallback is exercised) — with configurable latency, page size, 429/503
+injection and order-count scale. Signatures are not checked.
+
+    python simulator.py --orders 5000 --latency-ms 80 --throttle-rate 0.02
+
+then point the client at it:
+
+    from etrade_api import ETradeAPI, SIM, use_simulator
+    use_simulator("http://127.0.0.1:5055")
+    api = ETradeAPI("key", "secret", env=SIM)
+"""
+import argparse
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from flask import Flask, Response, jsonify, request
+
+DEFAULT_CONFIG = {
+    "accounts": 2,
+    "orders": 500,            # open orders per account
+    "symbols": ["AAPL", "MSFT", "TSLA", "NVDA", "AMZN", "GOOG", "META", "AMD", "SPY", "QQQ"],
+    "page_size": 100,         # server-side cap on `count`
+    "latency_ms": 50.0,       # mean per-request latency
+    "latency_jitter_ms": 10.0,
+    "throttle_rate": 0.0,     # fraction of requests answered 429 (with Retry-After)
+    "unavailable_rate": 0.0,  # fraction of requests answered 503
+    "retry_after": 1,
+    "put_preview_405": True,
+    "seed": 7,
+}
+
+
+def raw_order(order_id: int, rnd: random.Random, symbols) -> Dict[str,Any]:
+    gtc = rnd.random() < 0.5
+    return {
+        "orderId": order_id,
+        "orderType": "EQ",
+        "OrderDetail": [{
+            "placedTime": int(time.time() * 1000) - rnd.randint(0, 86_400_000),
+            "status": "OPEN",
+            "orderTerm": "GOOD_UNTIL_CANCEL" if gtc else "GOOD_FOR_DAY",
+            "marketSession": "REGULAR" if gtc else "EXTENDED",
+            "priceType": "LIMIT",
+            "limitPrice": round(rnd.uniform(5, 500), 2),
+            "Instrument": [{
+                "Product": {"symbol": rnd.choice(symbols), "securityType": "EQ"},
+                "orderAction": rnd.choice(("BUY", "SELL")),
+                "quantityType": "QUANTITY",
+                "orderedQuantity": rnd.randint(1, 500),
+            }],
+        }],
+    }
+
+
+class SimState:
+    def __init__(self, config: Dict[str,Any]):
+        self.config = dict(config)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        cfg = self.config
+        rnd = random.Random(cfg["seed"])
+        self.rnd = random.Random(cfg["seed"] + 1)
+        ids = itertools.count(100_000)
+        self.accounts = []
+        self.orders: Dict[str,Dict[int,Dict[str,Any]]] = {}
+        for i in range(cfg["accounts"]):
+            key = f"SIMKEY{i}"
+            self.accounts.append({"accountId": str(8_000_000 + i), "accountIdKey": key,
+                                  "accountName": f"Sim {i}", "accountDesc": "SIMULATED", "accountType": "INDIVIDUAL"})
+            self.orders[key] = {oid: raw_order(oid, rnd, cfg["symbols"])
+                                for oid in itertools.islice(ids, cfg["orders"])}
+        self.previews: Dict[int,Dict[str,Any]] = {}
+        self.preview_ids = itertools.count(1)
+        self.requests = 0
+
+
+def create_app(config: Optional[Dict[str,Any]]=None) -> Flask:
+    cfg = dict(DEFAULT_CONFIG)
+    cfg.update(config or {})
+    state = SimState(cfg)
+    app = Flask("etrade_simulator")
+    app.config["SIM_STATE"] = state
+
+    @app.before_request
+    def _latency_and_faults():
+        if request.path.startswith("/sim/"):
+            return None
+        c = state.config
+        with state.lock:
+            state.requests += 1
+            roll = state.rnd.random()
+            delay = max(0.0, state.rnd.gauss(c["latency_ms"], c["latency_jitter_ms"])) / 1000
+        time.sleep(delay)
+        if roll < c["throttle_rate"]:
+            return Response("throttled", status=429, headers={"Retry-After": str(c["retry_after"])})
+        if roll < c["throttle_rate"] + c["unavailable_rate"]:
+            return Response("unavailable", status=503)
+        return None
+
+    # --- OAuth (PIN flow) ---
+    @app.route("/oauth/request_token", methods=["GET", "POST"])
+    def request_token():
+        return Response("oauth_token=simreq&oauth_token_secret=simreqsecret&oauth_callback_confirmed=true",
+                        mimetype="application/x-www-form-urlencoded")
+
+    @app.route("/e/t/etws/authorize")
+    def authorize():
+        return "Simulator PIN: 12345"
+
+    @app.route("/oauth/access_token", methods=["GET", "POST"])
+    def access_token():
+        return Response("oauth_token=simaccess&oauth_token_secret=simaccesssecret",
+                        mimetype="application/x-www-form-urlencoded")
+
+    @app.route("/oauth/renew_access_token")
+    def renew_access_token():
+        return Response("Access Token has been renewed", mimetype="text/plain")
+
+    # --- Accounts / orders ---
+    @app.route("/v1/accounts/list.json")
+    def accounts_list():
+        return jsonify({"AccountListResponse": {"Accounts": {"Account": state.accounts}}})
+
+    @app.route("/v1/accounts/<key>/orders.json")
+    def orders(key):
+        book = state.orders.get(key)
+        if book is None:
+            return Response("unknown account", status=404)
+        count = min(int(request.args.get("count", 25)), state.config["page_size"])
+        start = int(request.args.get("marker") or 0)
+        symbols = {s.strip().upper() for s in (request.args.get("symbol") or "").split(",") if s.strip()}
+        with state.lock:
+            rows = list(book.values())
+        if symbols:
+            rows = [o for o in rows if o["OrderDetail"][0]["Instrument"][0]["Product"]["symbol"] in symbols]
+        page = rows[start:start + count]
+        if not page:
+            return Response(status=204)
+        body = {"OrdersResponse": {"Order": page}}
+        if start + count < len(rows):
+            body["OrdersResponse"]["marker"] = str(start + count)
+        return jsonify(body)
+
+    def _order_or_404(key, order_id):
+        return state.orders.get(key, {}).get(int(order_id))
+
+    @app.route("/v1/accounts/<key>/orders/<order_id>/change/preview.json", methods=["PUT", "POST"])
+    def change_preview(key, order_id):
+        if request.method == "PUT" and state.config["put_preview_405"]:
+            return Response("method not allowed", status=405)
+        if _order_or_404(key, order_id) is None:
+            return Response("order not found", status=404)
+        body = request.get_json(silent=True) or {}
+        req = body.get("PreviewOrderRequest") or {}
+        order = (req.get("Order") or [None])[0]
+        if not order or not (order.get("Instrument") or [{}])[0].get("quantity"):
+            return jsonify({"Error": {"code": 1015, "message": "Invalid order"}}), 400
+        with state.lock:
+            pid = next(state.preview_ids)
+            state.previews[pid] = {"key": key, "orderId": int(order_id), "Order": order}
+        return jsonify({"PreviewOrderResponse": {"orderType": "EQ", "previewId": pid,
+                                                 "clientOrderId": req.get("clientOrderId"), "Order": [order]}})
+
+    @app.route("/v1/accounts/<key>/orders/<order_id>/change/place.json", methods=["POST"])
+    def change_place(key, order_id):
+        raw = _order_or_404(key, order_id)
+        if raw is None:
+            return Response("order not found", status=404)
+        req = (request.get_json(silent=True) or {}).get("PlaceOrderRequest") or {}
+        with state.lock:
+            prev = state.previews.pop(req.get("previewId"), None)
+        if prev is None or prev["orderId"] != int(order_id):
+            return jsonify({"Error": {"code": 1033, "message": "Preview not found"}}), 400
+        detail = raw["OrderDetail"][0]
+        with state.lock:
+            detail["marketSession"] = prev["Order"].get("marketSession", detail["marketSession"])
+            detail["orderTerm"] = prev["Order"].get("orderTerm", detail["orderTerm"])
+        return jsonify({"PlaceOrderResponse": {"orderType": "EQ", "OrderIds": [{"orderId": int(order_id)}],
+                                               "Order": [prev["Order"]]}})
+
+    # --- Simulator control ---
+    @app.route("/sim/config", methods=["GET", "POST"])
+    def sim_config():
+        if request.method == "POST":
+            updates = request.get_json(silent=True) or {}
+            rebuild = any(k in updates for k in ("accounts", "orders", "symbols", "seed"))
+            with state.lock:
+                state.config.update(updates)
+            if rebuild:
+                state.reset()
+        return jsonify(state.config)
+
+    @app.route("/sim/stats")
+    def sim_stats():
+        return jsonify({"requests": state.requests, "open_previews": len(state.previews),
+                        "orders": {k: len(v) for k, v in state.orders.items()}})
+
+    return app
+
+
+def start_in_thread(host: str="127.0.0.1", port: int=0, **config):
+    """Runs the simulator on a background thread; returns (server, base_url). Call server.shutdown() to stop."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class _QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server(host, port, create_app(config), threaded=True, request_handler=_QuietHandler)
+    threading.Thread(target=server.serve_forever, name="etrade-sim", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline E*TRADE stand-in server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5055)
+    ap.add_argument("--accounts", type=int, default=DEFAULT_CONFIG["accounts"])
+    ap.add_argument("--orders", type=int, default=DEFAULT_CONFIG["orders"], help="open orders per account")
+    ap.add_argument("--page-size", type=int, default=DEFAULT_CONFIG["page_size"])
+    ap.add_argument("--latency-ms", type=float, default=DEFAULT_CONFIG["latency_ms"])
+    ap.add_argument("--jitter-ms", type=float, default=DEFAULT_CONFIG["latency_jitter_ms"])
+    ap.add_argument("--throttle-rate", type=float, default=DEFAULT_CONFIG["throttle_rate"])
+    ap.add_argument("--unavailable-rate", type=float, default=DEFAULT_CONFIG["unavailable_rate"])
+    ap.add_argument("--allow-put-preview", action="store_true", help="accept PUT previews instead of answering 405")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    app = create_app({
+        "accounts": args.accounts, "orders": args.orders, "page_size": args.page_size,
+        "latency_ms": args.latency_ms, "latency_jitter_ms": args.jitter_ms,
+        "throttle_rate": args.throttle_rate, "unavailable_rate": args.unavailable_rate,
+        "put_preview_405": not args.allow_put_preview,
+    })
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulator  # noqa: E402
+from etrade_api import SIM, ETradeAPI, use_simulator  # noqa: E402
+
+FAST_LIMITS = {name: (200.0, 20) for name in ("accounts", "orders", "change", "oauth")}
+
+
+@pytest.fixture
+def sim():
+    """A simulator on a free port with 2 accounts of 30 orders; yields its base URL."""
+    server, url = simulator.start_in_thread(accounts=2, orders=30, latency_ms=0)
+    use_simulator(url)
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def api(sim):
+    """An ETradeAPI signed in to the simulator, with rate limits loose enough not to slow tests."""
+    api = ETradeAPI("key", "secret", env=SIM, rate_limits=FAST_LIMITS)
+    token, secret, _ = api.get_request_token()
+    api.get_access_token(token, secret, "0")
+    return api
+
+
+@pytest.fixture
+def account(api):
+    return api.get_accounts()[0]["idKey"]
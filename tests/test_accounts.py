@@ -0,0 +1,23 @@
+from rotator import OrderRotator
+
+
+def test_isolated_views_share_the_budget_but_not_the_session(api):
+    a, b = api.isolated("A"), api.isolated("B")
+    assert a.limiters is api.limiters and b.limiters is api.limiters
+    assert a.limiter_key == "A" and b.limiter_key == "B"
+    assert a.session is not api.session and a.session is not b.session
+    assert a.session.get_adapter("https://x") is not api.session.get_adapter("https://x")
+
+
+def test_view_traffic_is_seen_by_the_base_client(api, account):
+    api.last_used = 0.0
+    view = api.isolated(account)
+    view.get_accounts(fresh=True)
+    assert api.last_used > 0 and api.last_used == view.last_used
+
+
+def test_preview_method_learned_by_a_view_reaches_the_base_client(api, account):
+    rot = OrderRotator(api, dry_run=False).for_account(account)
+    plan = rot.plan(account, "EXTENDED", "GOOD_UNTIL_CANCEL")
+    rot.rotate(account, plan.orders[:1], "EXTENDED", "GOOD_UNTIL_CANCEL")
+    assert api.preview_put_ok is False
@@ -0,0 +1,30 @@
+import asyncio
+
+from async_api import AsyncETradeAPI
+from rotator import OrderRotator
+
+
+def test_async_traffic_and_preview_method_reach_the_sync_client(api, account):
+    orders = OrderRotator(api).plan(account, "EXTENDED", "GOOD_FOR_DAY").orders
+    assert len(orders) >= 2
+    api.last_used = 0.0
+    rot = OrderRotator(api, dry_run=False)
+    sent = []
+
+    async def run():
+        async with AsyncETradeAPI.from_api(api) as aapi:
+            real = aapi._request
+
+            async def spy(method, url, endpoint, **kwargs):
+                sent.append(method)
+                return await real(method, url, endpoint, **kwargs)
+
+            aapi._request = spy
+            await rot.rotate_async(account, orders[:1], "EXTENDED", "GOOD_FOR_DAY", api=aapi)
+            assert api.preview_put_ok is False and api.last_used > 0
+            sent.clear()
+            await rot.rotate_async(account, orders[1:2], "EXTENDED", "GOOD_FOR_DAY", api=aapi)
+
+    asyncio.run(run())
+    # PUT is refused by the simulator; once learned, previews go straight to POST (preview, then place)
+    assert sent == ["POST", "POST"]
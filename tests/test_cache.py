@@ -0,0 +1,39 @@
+from rotator import OrderRotator
+
+
+def test_second_plan_is_served_from_cache(api, account):
+    rot = OrderRotator(api)
+    first = rot.plan(account, "EXTENDED", "GOOD_FOR_DAY")
+    misses = api.cache_stats()["misses"]
+    hits = api.cache_stats()["hits"]
+
+    second = rot.plan(account, "EXTENDED", "GOOD_FOR_DAY")
+
+    assert [od.order_id for od in second.orders] == [od.order_id for od in first.orders]
+    assert api.cache_stats()["misses"] == misses
+    assert api.cache_stats()["hits"] > hits
+
+
+def test_fresh_plan_bypasses_cache(api, account):
+    rot = OrderRotator(api)
+    rot.plan(account, "EXTENDED", "GOOD_FOR_DAY")
+    stats = api.cache_stats()
+
+    rot.plan(account, "EXTENDED", "GOOD_FOR_DAY", fresh=True)
+
+    assert api.cache_stats()["hits"] == stats["hits"]
+
+
+def test_symbol_listing_passes_fresh_flag_through(api, account, monkeypatch):
+    seen = []
+    real = api.iter_open_orders
+
+    def spy(*args, **kwargs):
+        seen.append(kwargs.get("fresh"))
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(api, "iter_open_orders", spy)
+    rot = OrderRotator(api)
+    rot.preview_open_orders(account, "AAPL", "BOTH")
+    rot.preview_open_orders(account, "AAPL", "BOTH", fresh=True)
+    assert seen == [False, True]
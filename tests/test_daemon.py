@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+
+from daemon import RotatorService, create_app
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    svc = RotatorService({}, str(tmp_path / "daemon.json"))
+    yield svc
+    svc.shutdown()
+
+
+@pytest.fixture
+def client(service):
+    client = create_app(service).test_client()
+    client.environ_base["HTTP_X_CONTROL_TOKEN"] = service.config["control_token"]
+    return client
+
+
+@pytest.mark.parametrize("body", [
+    {"max_workers": "abc"},
+    {"max_workers": 0},
+    {"lead_s": "90"},
+    {"lead_s": True},
+    {"dry_run": "false"},
+    {"times": "04:00:00"},
+    {"times": {"gtce_1": 400}},
+    {"times": {"nightly": "04:00:00"}},
+    {"times": {"gtce_1": "25:00:00"}},
+    {"accounts": "SIMKEY0"},
+    {"rules": ["AAPL"]},
+    {"rules": {"qty_min": "5"}},
+    {"rules": {"price_max": "abc"}},
+    {"rules": {"side": 5}},
+    {"rules": {"symbols": ["AAPL", 5]}},
+    {"rules": {"match_all": "yes"}},
+    {"colour": "blue"},
+])
+def test_bad_schedule_is_refused_before_anything_is_saved(service, client, body):
+    os.remove(service.config_path)  # written when the control token was generated
+    before = dict(service.config)
+
+    resp = client.put("/schedule", json=body)
+
+    assert resp.status_code == 400, resp.get_json()
+    assert service.config == before
+    assert not os.path.exists(service.config_path)
+
+
+def test_good_schedule_is_applied_and_saved(service, client):
+    resp = client.put("/schedule", json={"times": {"gtce_1": "04:05:00"}, "lead_s": 60, "max_workers": 4,
+                                         "dry_run": False})
+
+    assert resp.status_code == 200
+    saved = json.load(open(service.config_path))
+    assert saved["times"]["gtce_1"] == "04:05:00" and saved["max_workers"] == 4 and saved["dry_run"] is False
+
+
+def test_control_token_is_generated_once_and_saved(service):
+    token = service.control_token()
+    assert token and service.control_token() == token
+    assert json.load(open(service.config_path))["control_token"] == token
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Control-Token": "wrong"}, {"X-Control-Token": "wröng"}])
+def test_requests_without_the_token_are_refused(service, headers):
+    client = create_app(service).test_client()
+    assert client.get("/status", headers=headers).status_code == 401
+    assert client.post("/cancel", json={}, headers=headers).status_code == 401
+    assert client.get("/metrics").status_code == 200
+
+
+def test_form_posts_are_refused(client):
+    # what a cross-site <form> can send without a CORS preflight
+    assert client.post("/cancel", data={"x": "1"}).status_code == 415
+    assert client.post("/resume", data="{}", content_type="text/plain").status_code == 415
+    assert client.post("/cancel").status_code == 415
+    assert client.post("/cancel", json={}).status_code == 200
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/preview", {"limit": "x"}),
+    ("/preview", {"limit": -1}),
+    ("/preview", {"rules": {"qty_min": "5"}}),
+    ("/run-now", {"session": "EXTENDED", "duration": "GOOD_FOR_DAY", "accounts": "ABC"}),
+    ("/run-now", {"session": "EXTENDED", "duration": "GOOD_FOR_DAY", "account": 5}),
+])
+def test_bad_run_bodies_get_a_400(client, path, body):
+    resp = client.post(path, json=body)
+    assert resp.status_code == 400, resp.get_json()
+
+
+def test_env_override_is_not_saved(service):
+    service.env = "SIM"
+    service.control_token()
+    assert json.load(open(service.config_path))["env"] == "PROD"
+    assert service.status()["env"] == "SIM"
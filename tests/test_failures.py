@@ -0,0 +1,117 @@
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from orders import Order
+from rotator import (FAILURE_THROTTLE, FAILURE_TRANSIENT, FAILURE_UNKNOWN, FAILURE_VALIDATION, PHASE_PLACE,
+                     PHASE_PREVIEW, OrderRotator, StagedChange, StagedRotation, classify_failure)
+
+
+def http_error(code):
+    resp = requests.Response()
+    resp.status_code = code
+    return requests.HTTPError(f"{code} error", response=resp)
+
+
+def refused():
+    return requests.ConnectionError(MaxRetryError(None, "/place", NewConnectionError(None, "refused")))
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (http_error(429), FAILURE_THROTTLE),
+    (http_error(503), FAILURE_TRANSIENT),
+    (http_error(500), FAILURE_TRANSIENT),
+    (http_error(400), FAILURE_VALIDATION),
+    (requests.ReadTimeout("read"), FAILURE_TRANSIENT),
+    (requests.ConnectionError("reset"), FAILURE_TRANSIENT),
+])
+def test_preview_failures(exc, expected):
+    assert classify_failure(exc, PHASE_PREVIEW) == expected
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (http_error(429), FAILURE_THROTTLE),
+    (http_error(503), FAILURE_TRANSIENT),
+    (requests.ConnectTimeout("connect"), FAILURE_TRANSIENT),
+    (refused(), FAILURE_TRANSIENT),
+    (http_error(500), FAILURE_UNKNOWN),
+    (http_error(504), FAILURE_UNKNOWN),
+    (requests.ReadTimeout("read"), FAILURE_UNKNOWN),
+    (requests.ConnectionError("connection reset by peer"), FAILURE_UNKNOWN),
+    (http_error(400), FAILURE_VALIDATION),
+])
+def test_place_failures_retry_only_when_nothing_was_sent(exc, expected):
+    assert classify_failure(exc, PHASE_PLACE) == expected
+
+
+class FlakyAPI:
+    """Previews always work; place raises the queued exceptions in turn, then succeeds."""
+
+    def __init__(self, *place_errors, preview_errors=()):
+        self.place_errors = list(place_errors)
+        self.preview_errors = list(preview_errors)
+        self.previews = 0
+        self.places = 0
+
+    def preview_change(self, account, order_id, payload):
+        self.previews += 1
+        if self.preview_errors:
+            raise self.preview_errors.pop(0)
+        return {"PreviewOrderResponse": {"previewId": self.previews}}
+
+    def place_change(self, account, order_id, payload):
+        self.places += 1
+        if self.place_errors:
+            raise self.place_errors.pop(0)
+        return {"PlaceOrderResponse": {}}
+
+
+def order():
+    return Order(order_id=1, symbol="AAPL", side="BUY", qty=10, price=1.0, price_type="LIMIT",
+                 session="REGULAR", duration="GOOD_FOR_DAY")
+
+
+def rotate(api):
+    rot = OrderRotator(api, dry_run=False, retry_backoff=0)
+    return rot.rotate("acct", [order()], "EXTENDED", "GOOD_FOR_DAY")[0]
+
+
+@pytest.mark.parametrize("exc", [http_error(429), http_error(503), refused()])
+def test_refused_place_is_sent_again(exc):
+    api = FlakyAPI(exc)
+    result = rotate(api)
+    assert result["ok"] and result["attempts"] == 2
+    assert api.places == 2
+
+
+@pytest.mark.parametrize("exc", [requests.ReadTimeout("read"), http_error(502), requests.ConnectionError("reset")])
+def test_ambiguous_place_is_never_sent_again(exc):
+    api = FlakyAPI(exc)
+    result = rotate(api)
+    assert api.places == 1
+    assert result["status"] == FAILURE_UNKNOWN and result["phase"] == PHASE_PLACE
+    assert "verify" in result["error"]
+
+
+def test_preview_timeout_is_retried_and_tagged():
+    api = FlakyAPI(preview_errors=[requests.ReadTimeout("read")])
+    result = rotate(api)
+    assert result["ok"] and result["attempts"] == 2
+    assert api.places == 1
+
+
+def test_failed_preview_result_names_its_phase():
+    api = FlakyAPI(preview_errors=[http_error(400)])
+    result = rotate(api)
+    assert result["failure"] == FAILURE_VALIDATION and result["phase"] == PHASE_PREVIEW
+    assert api.places == 0
+
+
+def test_fire_does_not_resend_an_ambiguous_place():
+    api = FlakyAPI(requests.ReadTimeout("read"))
+    rot = OrderRotator(api, dry_run=False, retry_backoff=0)
+    change = StagedChange(order(), preview={"PreviewOrderResponse": {"previewId": 1}},
+                          payload=rot.build_change_payload(order(), "EXTENDED", "GOOD_FOR_DAY"))
+    staged = StagedRotation("acct", "EXTENDED", "GOOD_FOR_DAY", [change])
+    result = rot.fire(staged)[0]
+    assert api.places == 1 and result["status"] == FAILURE_UNKNOWN
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+
+import journal as journal_mod
+from journal import FAILED, PLACED, PREVIEWED, RotationJournal
+from rotator import OrderRotator, SelectionRules
+
+
+def test_replay_keeps_latest_state_and_skips_a_torn_line(tmp_path):
+    j = RotationJournal(str(tmp_path / "rotations.jsonl"))
+    run_id = j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {1: 101, 2: 102, 3: 103})
+    j.record(run_id, PREVIEWED, 1, sync=False, previewId=9)
+    j.record(run_id, PLACED, 1)
+    j.record(run_id, FAILED, 2, failure="unknown")
+    with open(j.path, "a", encoding="utf-8") as f:
+        f.write('{"run": "' + run_id + '", "event": "placed", "orderId": 3')  # crash mid-write
+
+    run = RotationJournal(j.path).load()[run_id]
+    assert not run.finished
+    assert run.orders[1]["state"] == PLACED and run.orders[1]["previewId"] == 9
+    assert run.pending() == [2, 3]
+    assert run.client_ids() == {1: 101, 2: 102, 3: 103}
+
+
+def test_unsynced_events_ride_along_with_the_next_write(tmp_path):
+    j = RotationJournal(str(tmp_path / "rotations.jsonl"))
+    run_id = j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {1: 101})
+    size = os.path.getsize(j.path)
+    j.record(run_id, PREVIEWED, 1, sync=False)
+    assert os.path.getsize(j.path) == size
+    j.record(run_id, PLACED, 1)
+    events = [json.loads(ln)["event"] for ln in open(j.path, encoding="utf-8")]
+    assert events[-2:] == [PREVIEWED, PLACED]
+
+
+def test_concurrent_records_share_fsyncs(tmp_path, monkeypatch):
+    j = RotationJournal(str(tmp_path / "rotations.jsonl"))
+    run_id = j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {})
+    syncs = []
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        syncs.append(fd)
+        time.sleep(0.01)
+        real_fsync(fd)
+
+    monkeypatch.setattr(journal_mod.os, "fsync", slow_fsync)
+    threads = [threading.Thread(target=j.record, args=(run_id, PLACED, i)) for i in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(j.load()[run_id].orders) == 40
+    assert len(syncs) < 40
+
+
+def test_client_id_high_water_mark_is_read_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "rotations.jsonl")
+    RotationJournal(path).start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {1: 500})
+    j = RotationJournal(path)
+    assert j.last_client_id() == 500
+
+    monkeypatch.setattr(j, "load", lambda: (_ for _ in ()).throw(AssertionError("full replay")))
+    j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {2: 600})
+    assert j.last_client_id() == 600
+    # another process appending is picked up from where the last scan stopped
+    RotationJournal(path).start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {3: 700})
+    assert j.last_client_id() == 700
+
+
+def test_compact_drops_old_runs_but_keeps_the_high_water_mark(tmp_path, monkeypatch):
+    j = RotationJournal(str(tmp_path / "rotations.jsonl"))
+    two_days_ago = time.time() - 2 * 86400
+    with monkeypatch.context() as m:
+        m.setattr(journal_mod.time, "time", lambda: two_days_ago)
+        done = j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {1: 900})
+        j.finish_run(done)
+        j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {2: 901})  # interrupted, never resumed
+    fresh = j.start_run("acct", "REGULAR", "GOOD_UNTIL_CANCEL", False, {3: 50})
+
+    assert j.compact(keep_finished=86400) == 2
+
+    after = RotationJournal(j.path)
+    assert list(after.load()) == [fresh]
+    assert after.last_client_id() == 901
+    assert j.last_client_id() == 901
+    assert j.compact(keep_finished=86400) == 0
+
+
+def test_resume_places_only_what_the_journal_has_not(tmp_path, api, account):
+    j = RotationJournal(str(tmp_path / "rotations.jsonl"))
+    rot = OrderRotator(api, dry_run=False, journal=j)
+    plan = rot.plan(account, "EXTENDED", "GOOD_UNTIL_CANCEL", SelectionRules(symbols="AAPL"))
+    assert len(plan.orders) >= 2
+    done, rest = plan.orders[0], plan.orders[1:]
+
+    # interrupted run: the first order was placed, the process died before the others
+    rot.rotate(account, [done], "EXTENDED", "GOOD_UNTIL_CANCEL")
+    run_id = j.start_run(account, "EXTENDED", "GOOD_UNTIL_CANCEL", False,
+                         {od.order_id: 1000 + n for n, od in enumerate(plan.orders)})
+    j.record(run_id, PLACED, done.order_id)
+
+    placed = []
+    real = api.place_change
+    api.place_change = lambda acct, oid, payload: placed.append((oid, payload)) or real(acct, oid, payload)
+    previews = []
+    real_preview = api.preview_change
+    api.preview_change = lambda acct, oid, payload: previews.append(payload) or real_preview(acct, oid, payload)
+
+    results = OrderRotator(api, dry_run=False, journal=RotationJournal(j.path)).resume()
+
+    assert sorted(r["orderId"] for r in results) == sorted(od.order_id for od in rest)
+    assert all(r["ok"] for r in results)
+    assert done.order_id not in [oid for oid, _ in placed]
+    ids = {od.order_id: 1000 + n for n, od in enumerate(plan.orders)}
+    assert sorted(p["PreviewOrderRequest"]["clientOrderId"] for p in previews) == sorted(ids[od.order_id] for od in rest)
+    assert RotationJournal(j.path).load()[run_id].finished
+
+
+def test_rotators_sharing_a_journal_never_reuse_a_client_id(tmp_path, api):
+    j = RotationJournal(str(tmp_path / "rotations.jsonl"))
+    j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {1: int(time.time() * 1000) + 10_000})
+    rotators = [OrderRotator(api, journal=j), OrderRotator(api, journal=j), OrderRotator(api, journal=j)]
+    ids = []
+
+    def draw(rot):
+        ids.extend(rot.client_ids.next() for _ in range(1000))
+
+    threads = [threading.Thread(target=draw, args=(rot,)) for rot in rotators]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(ids)) == len(ids) == 3000
+    assert min(ids) > j.last_client_id() - 3000
+
+
+def test_compact_while_appending_does_not_deadlock(tmp_path, monkeypatch):
+    j = RotationJournal(str(tmp_path / "rotations.jsonl"))
+    ten_days_ago = time.time() - 10 * 86400
+    with monkeypatch.context() as m:
+        m.setattr(journal_mod.time, "time", lambda: ten_days_ago)
+        j.finish_run(j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {1: 1}))
+    stop = threading.Event()
+
+    def append():
+        run_id = j.start_run("acct", "EXTENDED", "GOOD_FOR_DAY", False, {2: 2})
+        while not stop.is_set():
+            j.record(run_id, PREVIEWED, 2)
+
+    writer = threading.Thread(target=append, daemon=True)
+    compactor = threading.Thread(target=lambda: [j.compact() for _ in range(50)], daemon=True)
+    writer.start()
+    compactor.start()
+    compactor.join(10)
+    stop.set()
+    writer.join(10)
+    assert not compactor.is_alive() and not writer.is_alive()
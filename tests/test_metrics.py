@@ -0,0 +1,34 @@
+import metrics
+from rotator import OrderRotator, SelectionRules
+
+
+def count(hist):
+    return (hist.snapshot().get(()) or ([], 0.0, 0))[2]
+
+
+def test_trigger_to_place_is_measured_from_fire_at(api, account):
+    rot = OrderRotator(api, dry_run=False)
+    plan = rot.plan(account, "EXTENDED", "GOOD_UNTIL_CANCEL", SelectionRules(symbols="AAPL"))
+    staged = rot.stage(account, plan.orders[:2], "EXTENDED", "GOOD_UNTIL_CANCEL")
+    staged.fire_at = rot.trigger.now() - 1.5  # the trigger went off 1.5s before fire() was reached
+    before = metrics.TRIGGER_TO_FIRST_PLACE.snapshot().get(()) or ([], 0.0, 0)
+
+    rot.fire(staged)
+
+    _, total, n = metrics.TRIGGER_TO_FIRST_PLACE.snapshot()[()]
+    assert n == before[2] + 1
+    assert total - before[1] >= 1.5
+
+
+def test_dry_run_batches_stay_out_of_place_timings(api, account):
+    metrics.ORDERS_PER_SECOND.set(-1.0, kind="fire")
+    fires = count(metrics.TRIGGER_TO_FIRST_PLACE)
+    rot = OrderRotator(api, dry_run=True)
+    plan = rot.plan(account, "EXTENDED", "GOOD_UNTIL_CANCEL", SelectionRules(symbols="AAPL"))
+    staged = rot.stage(account, plan.orders, "EXTENDED", "GOOD_UNTIL_CANCEL")
+
+    results = rot.fire(staged)
+
+    assert results and all(r["status"] == "dry-run" for r in results)
+    assert metrics.ORDERS_PER_SECOND.values()[("fire",)] == -1.0
+    assert count(metrics.TRIGGER_TO_FIRST_PLACE) == fires
@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from orderstore import OrderStore
+from rotator import OrderRotator
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OrderStore(str(tmp_path / "orders.db"))
+    yield store
+    store.close()
+
+
+def test_cached_listings_do_not_overwrite_the_snapshot(api, account, store):
+    rot = OrderRotator(api, store=store)
+    rot.preview_open_orders(account, None, "BOTH")
+    _, taken_at, orders = store.load_snapshot(account)
+
+    rot.preview_open_orders(account, None, "BOTH")
+    assert store.load_snapshot(account)[1] == taken_at
+
+    rot.preview_open_orders(account, None, "BOTH", fresh=True)
+    _, again, fresh = store.load_snapshot(account)
+    assert again > taken_at and len(fresh) == len(orders)
+
+
+def test_symbol_queries_save_only_what_was_fetched(api, account, store):
+    rot = OrderRotator(api, store=store)
+    rot.preview_open_orders(account, "AAPL", "BOTH")
+    store.save_snapshot(account, [], complete=True)
+
+    rot.preview_open_orders(account, "AAPL,MSFT", "BOTH")
+    saved = {od.order_id for od in store.load_snapshot(account)[2]}
+    assert saved == {od.order_id for od in api.list_open_orders(account, "MSFT", count=100, fresh=True)}
+
+
+def test_server_clock_rotations_are_found_by_local_time_queries(store):
+    offset = 3600.0  # server clock an hour ahead of the local one
+    fire_at = time.time() + offset - 5
+    store.record_rotation("A", "EXTENDED", "GOOD_FOR_DAY",
+                          [{"orderId": 1, "status": "placed", "ok": True, "finished": fire_at + 2.5}],
+                          fire_at=fire_at, clock_offset=offset)
+
+    rows = store.rotations(time.time() - 60)
+    assert len(rows) == 1 and rows[0]["finished"] <= time.time()
+    assert [r["late_s"] for r in store.late_rotations(time.time() - 60)] == [2.5]
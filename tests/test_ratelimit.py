@@ -0,0 +1,34 @@
+import threading
+import time
+
+from ratelimit import TokenBucket
+
+
+def hammer(bucket, key, counts, stop):
+    while not stop.is_set():
+        bucket.acquire(key)
+        counts[key] += 1
+
+
+def test_keys_share_the_budget_fairly():
+    bucket = TokenBucket(100.0, burst=1)
+    counts = {"busy": 0, "quiet": 0}
+    stop = threading.Event()
+    threads = [threading.Thread(target=hammer, args=(bucket, "busy", counts, stop)) for _ in range(8)]
+    threads.append(threading.Thread(target=hammer, args=(bucket, "quiet", counts, stop)))
+    for t in threads:
+        t.start()
+    time.sleep(1.0)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    total = counts["busy"] + counts["quiet"]
+    assert total <= 100 * 1.0 + 10  # one budget, not one per key
+    assert counts["quiet"] >= total * 0.35  # about half, not 1/9
+
+
+def test_keyless_callers_are_not_held_back():
+    bucket = TokenBucket(1000.0, burst=5)
+    for _ in range(5):
+        assert bucket.acquire() < 0.01
@@ -0,0 +1,53 @@
+import pytest
+import requests
+
+from rotator import OrderRotator, SelectionRules, require_selection
+
+
+@pytest.mark.parametrize("rules", [None, SelectionRules(), SelectionRules(symbols="", side="both")])
+def test_empty_rules_are_refused(rules):
+    with pytest.raises(ValueError):
+        require_selection(rules)
+
+
+@pytest.mark.parametrize("rules", [SelectionRules(symbols="AAPL"), SelectionRules(side="SELL"),
+                                   SelectionRules(price_type="LIMIT"), SelectionRules(qty_min=1),
+                                   SelectionRules(order_ids=[1]), SelectionRules(match_all=True)])
+def test_restricting_or_opted_in_rules_pass(rules):
+    assert require_selection(rules) is rules
+
+
+def test_match_all_round_trips_through_as_dict():
+    assert SelectionRules(**SelectionRules(match_all=True).as_dict()).match_all
+
+
+def test_rotate_accounts_with_empty_rules_touches_nothing(api, account):
+    rot = OrderRotator(api, dry_run=False)
+    with pytest.raises(ValueError):
+        rot.rotate_accounts([account], SelectionRules(), "EXTENDED", "GOOD_FOR_DAY")
+    with pytest.raises(ValueError):
+        rot.run_staged(account, None, "EXTENDED", "GOOD_FOR_DAY", fire_at=0)
+    assert api.preview_put_ok is None
+
+
+def test_expected_calls_count_the_post_fallback(api, account):
+    # the simulator answers 405 to PUT previews by default, like some E*TRADE tenants
+    rot = OrderRotator(api, dry_run=False)
+    plan = rot.plan(account, "EXTENDED", "GOOD_FOR_DAY", SelectionRules(symbols="AAPL"))
+    n = len(plan.orders)
+    assert plan.expected_calls == {"preview": 2 * n, "place": n, "total": 3 * n}
+
+    rot.rotate(account, plan.orders[:1], "EXTENDED", "GOOD_FOR_DAY")
+    assert api.preview_put_ok is False
+
+
+def test_expected_calls_once_put_is_known_to_work(sim, api, account):
+    requests.post(f"{sim}/sim/config", json={"put_preview_405": False})
+    rot = OrderRotator(api, dry_run=False)
+    plan = rot.plan(account, "EXTENDED", "GOOD_FOR_DAY", SelectionRules(symbols="AAPL"))
+    rot.rotate(account, plan.orders[:1], "EXTENDED", "GOOD_FOR_DAY")
+    assert api.preview_put_ok is True
+
+    plan = rot.plan(account, "REGULAR", "GOOD_UNTIL_CANCEL", SelectionRules(symbols="AAPL"))
+    n = len(plan.orders)
+    assert plan.expected_calls == {"preview": n, "place": n, "total": 2 * n}
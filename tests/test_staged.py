@@ -0,0 +1,34 @@
+import threading
+import time
+
+from journal import RotationJournal
+from rotator import OrderRotator, SelectionRules
+
+
+def test_cancel_before_the_trigger_places_nothing(tmp_path, api, account, monkeypatch):
+    placed = []
+    monkeypatch.setattr(api, "place_change", lambda *a: placed.append(a))
+    journal = RotationJournal(str(tmp_path / "rotations.jsonl"))
+    rot = OrderRotator(api, dry_run=False, journal=journal)
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    t0 = time.monotonic()
+
+    results = rot.run_staged(account, SelectionRules(symbols="AAPL"), "EXTENDED", "GOOD_UNTIL_CANCEL",
+                             fire_at=rot.trigger.now() + 30, cancel=cancel)
+
+    assert time.monotonic() - t0 < 5
+    assert results and all(r["status"] == "cancelled" for r in results)
+    assert not placed
+    assert not journal.incomplete_runs()
+
+
+def test_rotate_accounts_passes_cancel_to_staged_runs(api, monkeypatch):
+    seen = []
+    monkeypatch.setattr(OrderRotator, "run_staged",
+                        lambda self, *args, **kwargs: seen.append(args[-1] if len(args) > 5 else kwargs.get("cancel"))
+                        or [])
+    cancel = threading.Event()
+    OrderRotator(api).rotate_accounts(["A", "B"], SelectionRules(symbols="AAPL"), "EXTENDED", "GOOD_FOR_DAY",
+                                      fire_at=time.time() + 60, cancel=cancel)
+    assert seen == [cancel, cancel]
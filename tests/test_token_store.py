@@ -0,0 +1,74 @@
+import json
+import os
+import stat
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from token_store import FORMAT_VERSION, TokenKeyMissing, TokenStore
+
+
+@pytest.fixture(autouse=True)
+def no_key_env(monkeypatch):
+    monkeypatch.delenv("ETRADE_TOKEN_PASSPHRASE", raising=False)
+    monkeypatch.delenv("ETRADE_TOKEN_KEY_FILE", raising=False)
+
+
+def signed_in(env="SIM"):
+    return SimpleNamespace(env=env, consumer_key="ck", consumer_secret="cs", access_token="at",
+                           access_token_secret="ats", token_issued_at=time.time())
+
+
+def test_save_refuses_without_a_key(tmp_path):
+    store = TokenStore(str(tmp_path / "tokens.json"), use_keyring=False)
+    with pytest.raises(TokenKeyMissing):
+        store.save(signed_in())
+    assert not os.path.exists(store.path)
+
+
+def test_passphrase_round_trip_needs_no_consumer_secret(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    TokenStore(path, passphrase="hunter2", use_keyring=False).save(signed_in())
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert "at" not in json.load(open(path)).values()
+
+    tokens = TokenStore(path, passphrase="hunter2", use_keyring=False).load("ck", "SIM")
+    assert tokens["access_token"] == "at" and tokens["access_token_secret"] == "ats"
+    assert TokenStore(path, passphrase="wrong", use_keyring=False).load("ck", "SIM") is None
+    assert TokenStore(path, use_keyring=False).load("ck", "SIM") is None
+
+
+def test_an_edited_header_is_rejected(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    store = TokenStore(path, passphrase="hunter2", use_keyring=False)
+    store.save(signed_in(env="SIM"))
+    box = json.load(open(path))
+    box["env"] = "PROD"
+    json.dump(box, open(path, "w"))
+    assert store.load("ck", "PROD") is None
+
+
+def test_key_file_is_created_private_and_reused(tmp_path):
+    path, key_file = str(tmp_path / "tokens.json"), str(tmp_path / "keys" / "token.key")
+    os.mkdir(tmp_path / "keys")
+    TokenStore(path, key_file=key_file, use_keyring=False).save(signed_in())
+    assert stat.S_IMODE(os.stat(key_file).st_mode) == 0o600
+    assert json.load(open(path))["key"] == "key file"
+    assert TokenStore(path, key_file=key_file, use_keyring=False).load("ck", "SIM")["access_token"] == "at"
+
+
+def test_older_format_is_ignored(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    json.dump({"version": FORMAT_VERSION - 1, "env": "SIM", "consumer_key": "ck"}, open(path, "w"))
+    assert TokenStore(path, passphrase="hunter2", use_keyring=False).load("ck", "SIM") is None
+
+
+def test_ready_needs_a_matching_token_and_its_key(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    store = TokenStore(path, passphrase="hunter2", use_keyring=False)
+    assert not store.ready("ck", "SIM")
+    store.save(signed_in())
+    assert store.ready("ck", "SIM")
+    assert not store.ready("other", "SIM") and not store.ready("ck", "PROD")
+    assert not TokenStore(path, use_keyring=False).ready("ck", "SIM")
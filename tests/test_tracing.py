@@ -0,0 +1,64 @@
+import json
+import pstats
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def trace_dir(tmp_path):
+    tracing.configure(enabled=True, profile=True, directory=str(tmp_path))
+    yield tmp_path
+    tracing.configure(enabled=False, profile=False, directory=".")
+
+
+def busy(n):
+    with tracing.span("work", "test", n=n):
+        return sum(i * i for i in range(20000))
+
+
+def names(path):
+    return [ev["name"] for ev in json.load(open(path))["traceEvents"] if ev["ph"] == "X"]
+
+
+def test_pool_work_is_recorded_and_every_profiler_is_stopped(trace_dir):
+    with tracing.recording("pool") as rec:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(tracing.bind(busy), range(8)))
+
+    trace = next(trace_dir.glob("trace-*.json"))
+    assert names(trace).count("work") == 8
+    assert not rec._profiling and sys.getprofile() is None
+    if tracing.PER_THREAD_PROFILES:
+        assert len(rec._profiles) > 1
+    stats = pstats.Stats(str(next(trace_dir.glob("trace-*.prof"))))
+    assert any(fn[2] == "busy" for fn in stats.stats)
+
+
+def test_spans_from_unrelated_threads_are_left_out(trace_dir):
+    started, release = threading.Event(), threading.Event()
+
+    def other():
+        started.wait()
+        with tracing.span("unrelated", "test"):
+            pass
+        release.set()
+
+    t = threading.Thread(target=other)
+    t.start()
+    with tracing.recording("scoped"):
+        with tracing.span("mine", "test"):
+            started.set()
+            release.wait(5)
+    t.join()
+
+    recorded = names(next(trace_dir.glob("trace-*.json")))
+    assert "mine" in recorded and "unrelated" not in recorded
+
+
+def test_bind_is_a_no_op_outside_a_run():
+    assert tracing.bind(busy) is busy
@@ -0,0 +1,304 @@
+"""
+Encrypted-at-rest storage for E*TRADE access tokens, and a keep-alive that keeps a signed-in
+ETradeAPI usable between PIN logins.
+
+E*TRADE access tokens expire at midnight US Eastern and go inactive after two hours without a
+request. An inactive token is revived by /oauth/renew_access_token; an expired one needs a new PIN.
+
+The store encrypts with Fernet (cryptography) under a key kept apart from daemon.json and the GUI
+inputs, taken from the first of:
+
+    ETRADE_TOKEN_PASSPHRASE   a passphrase, stretched with PBKDF2 (per-file salt)
+    ETRADE_TOKEN_KEY_FILE     a file holding a Fernet key; created (mode 600) on first save
+    the OS keyring            a Fernet key in the keyring, when the `keyring` package has a backend
+
+With none of them, save() refuses (TokenKeyMissing) rather than write a file anyone with the
+config could open.
+"""
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+
+TOKEN_FILE = "tokens.json"
+IDLE_TIMEOUT = 2 * 3600    # seconds without a request before E*TRADE deactivates the token
+RENEW_AFTER = 90 * 60      # the keeper renews once the token has been idle this long
+CHECK_EVERY = 60.0
+EXPIRY_TZ = "America/New_York"
+KDF_ITERATIONS = 200_000
+FORMAT_VERSION = 2
+KEYRING_SERVICE, KEYRING_USER = "etrade-bot", "token-store"
+HEADER_KEYS = ("version", "env", "consumer_key")
+
+
+class TokenExpired(RuntimeError):
+    """The access token is (or will be, by the time it is needed) past its midnight-ET expiry."""
+
+
+class TokenKeyMissing(RuntimeError):
+    """No passphrase, key file or keyring to encrypt the token store with."""
+
+
+def token_expiry(issued_at: float) -> float:
+    """Epoch seconds of the first midnight US Eastern after `issued_at`, when the token stops working."""
+    import pytz
+
+    tz = pytz.timezone(EXPIRY_TZ)
+    day = datetime.fromtimestamp(issued_at, tz).date() + timedelta(days=1)
+    return tz.localize(datetime(day.year, day.month, day.day)).timestamp()
+
+
+def _b64(b: bytes) -> str:
+    return base64.b64encode(b).decode()
+
+
+def _derive(passphrase: str, salt: bytes) -> bytes:
+    """Fernet key from a passphrase."""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+    return base64.urlsafe_b64encode(kdf.derive(passphrase.encode()))
+
+
+def _file_key(path: str, create: bool) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        if not create:
+            return None
+    from cryptography.fernet import Fernet
+
+    key = Fernet.generate_key()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    logging.getLogger("token_store").info("Created token store key file %s.", path)
+    return key
+
+
+def _keyring_key(create: bool) -> Optional[bytes]:
+    try:
+        import keyring
+        from keyring.errors import KeyringError
+    except ImportError:
+        return None
+    try:
+        key = keyring.get_password(KEYRING_SERVICE, KEYRING_USER)
+        if not key and create:
+            from cryptography.fernet import Fernet
+
+            key = Fernet.generate_key().decode()
+            keyring.set_password(KEYRING_SERVICE, KEYRING_USER, key)
+    except KeyringError as e:
+        logging.getLogger("token_store").debug("OS keyring unavailable: %s", e)
+        return None
+    return key.encode() if key else None
+
+
+class TokenStore:
+    """One saved access token (per file) for a consumer key and environment."""
+
+    def __init__(self, path: str=TOKEN_FILE, passphrase: Optional[str]=None, key_file: Optional[str]=None,
+                 use_keyring: bool=True):
+        self.path = path
+        self.passphrase = passphrase if passphrase is not None else os.environ.get("ETRADE_TOKEN_PASSPHRASE", "")
+        self.key_file = key_file if key_file is not None else os.environ.get("ETRADE_TOKEN_KEY_FILE", "")
+        self.use_keyring = use_keyring
+        self.log = logging.getLogger("token_store")
+
+    def _key(self, salt: bytes, create: bool) -> Optional[Tuple[str,bytes]]:
+        """(source, Fernet key) from the passphrase, key file or OS keyring, in that order; None without any."""
+        if self.passphrase:
+            return "passphrase", _derive(self.passphrase, salt)
+        if self.key_file:
+            key = _file_key(self.key_file, create)
+            return ("key file", key) if key else None
+        key = _keyring_key(create) if self.use_keyring else None
+        return ("keyring", key) if key else None
+
+    def _read(self) -> Optional[Dict[str,Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            self.log.warning("Ignoring unreadable token store %s.", self.path)
+            return None
+
+    def consumer_key(self) -> Optional[str]:
+        """The consumer key of the saved token (stored in the clear) — handy to pre-fill a login form."""
+        box = self._read()
+        return box.get("consumer_key") if box else None
+
+    def ready(self, consumer_key: str, env: str) -> bool:
+        """True when a token for this consumer key/env is saved and the key it was encrypted with is at hand."""
+        box = self._read()
+        if not box or box.get("version") != FORMAT_VERSION:
+            return False
+        if box.get("consumer_key") != consumer_key.strip() or box.get("env") != env:
+            return False
+        try:
+            return self._key(base64.b64decode(box["salt"]), create=False) is not None
+        except (KeyError, ValueError):
+            return False
+
+    def save(self, api):
+        """Encrypts and writes api's access token; raises TokenKeyMissing when there is no key to use."""
+        from cryptography.fernet import Fernet
+
+        salt = os.urandom(16)
+        found = self._key(salt, create=True)
+        if found is None:
+            raise TokenKeyMissing("not saving the access token: set ETRADE_TOKEN_PASSPHRASE or "
+                                  "ETRADE_TOKEN_KEY_FILE, or install keyring")
+        source, key = found
+        header = {"version": FORMAT_VERSION, "env": api.env, "consumer_key": api.consumer_key}
+        # Fernet has no associated data: the header is repeated inside, and checked on load
+        plain = json.dumps(dict(header, access_token=api.access_token, access_token_secret=api.access_token_secret,
+                                issued_at=api.token_issued_at)).encode()
+        box = dict(header, key=source, salt=_b64(salt), token=Fernet(key).encrypt(plain).decode())
+        tmp = self.path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(box, f)
+        os.replace(tmp, self.path)
+        self.log.info("Access token saved to %s, encrypted with the %s (expires %s).", self.path, source,
+                      time.strftime("%Y-%m-%d %H:%M %Z", time.localtime(token_expiry(api.token_issued_at))))
+
+    def load(self, consumer_key: str, env: str) -> Optional[Dict[str,Any]]:
+        """The saved token for this consumer key/env, or None (missing, other key/env, undecryptable, expired)."""
+        from cryptography.fernet import Fernet, InvalidToken
+
+        box = self._read()
+        if not box:
+            return None
+        if box.get("version") != FORMAT_VERSION:
+            self.log.info("Saved token is in an older format; sign in with a PIN once to replace it.")
+            return None
+        if box.get("consumer_key") != consumer_key.strip() or box.get("env") != env:
+            return None
+        try:
+            found = self._key(base64.b64decode(box["salt"]), create=False)
+            if found is None:
+                self.log.warning("Saved token is encrypted with the %s, which is not available.", box.get("key"))
+                return None
+            tokens = json.loads(Fernet(found[1]).decrypt(box["token"].encode()))
+        except (InvalidToken, ValueError, KeyError) as e:
+            self.log.warning("Saved token not usable (wrong passphrase/key, or tampered file): %s",
+                             type(e).__name__)
+            return None
+        if any(tokens.get(k) != box.get(k) for k in HEADER_KEYS):
+            self.log.warning("Saved token not usable: its header was altered.")
+            return None
+        if time.time() >= token_expiry(tokens["issued_at"]):
+            self.log.info("Saved token expired at midnight ET; a new PIN is needed.")
+            return None
+        return tokens
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def restore(self, api) -> bool:
+        """
+        Signs `api` in with the saved token and renews it (which also proves it still works).
+        Returns False, leaving `api` signed out, when there is no usable token.
+        """
+        tokens = self.load(api.consumer_key, api.env)
+        if tokens is None:
+            return False
+        api.restore_access_token(tokens["access_token"], tokens["access_token_secret"], tokens["issued_at"])
+        try:
+            api.renew_access_token()
+        except requests.RequestException as e:
+            self.log.warning("Saved token rejected (%s); a new PIN is needed.", e)
+            api.session = None
+            if isinstance(e, requests.HTTPError):
+                self.clear()
+            return False
+        self.log.info("Signed in with the saved access token.")
+        return True
+
+
+class TokenKeeper:
+    """
+    Background keep-alive for a signed-in ETradeAPI: renews the token once it has been idle for
+    RENEW_AFTER seconds so it never reaches the idle timeout, and calls on_expired(api) once when
+    midnight ET passes. Checks once a minute on a daemon thread.
+    """
+
+    def __init__(self, api, on_expired: Optional[Callable[[Any],None]]=None, check_every: float=CHECK_EVERY):
+        self.api = api
+        self.on_expired = on_expired
+        self.check_every = check_every
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._expired_reported = False
+        self._lock = threading.Lock()
+        self.log = logging.getLogger("token_store")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="token-keeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def expires_at(self) -> Optional[float]:
+        issued = self.api.token_issued_at
+        return token_expiry(issued) if issued else None
+
+    def status(self) -> Dict[str,Any]:
+        expires = self.expires_at()
+        return {"issued_at": self.api.token_issued_at, "expires_at": expires, "last_used": self.api.last_used,
+                "idle_s": round(time.time() - self.api.last_used, 1) if self.api.last_used else None,
+                "expired": expires is not None and time.time() >= expires}
+
+    def _renew(self):
+        with self._lock:
+            self.api.renew_access_token()
+
+    def ensure_valid(self, until: Optional[float]=None):
+        """
+        Call before a run that must work until `until` (epoch seconds, default now): raises
+        TokenExpired if the token will have expired by then, and renews it if it has been idle a while.
+        """
+        expires = self.expires_at()
+        if self.api.session is None or expires is None:
+            raise TokenExpired("not signed in")
+        if max(time.time(), until or 0) >= expires:
+            raise TokenExpired("access token expires at midnight ET (%s); sign in with a new PIN"
+                               % time.strftime("%Y-%m-%d %H:%M %Z", time.localtime(expires)))
+        if time.time() - self.api.last_used >= RENEW_AFTER:
+            self._renew()
+
+    def _loop(self):
+        while not self._stop.wait(self.check_every):
+            if self.api.session is None:
+                continue
+            expires = self.expires_at()
+            if expires is not None and time.time() >= expires:
+                if not self._expired_reported:
+                    self._expired_reported = True
+                    self.log.warning("Access token expired at midnight ET; scheduled runs need a new PIN.")
+                    if self.on_expired is not None:
+                        self.on_expired(self.api)
+                continue
+            self._expired_reported = False
+            if time.time() - self.api.last_used >= RENEW_AFTER:
+                try:
+                    self._renew()
+                except requests.RequestException as e:
+                    self.log.warning("Token renew failed: %s", e)
@@ -0,0 +1,248 @@
+"""
+Opt-in flight recorder: spans for rotation phases and HTTP calls, written per run as Chrome trace
+JSON (open in chrome://tracing or https://ui.perfetto.dev), with an optional cProfile capture.
+
+    ETRADE_TRACE=1          record a trace-*.json per run
+    ETRADE_TRACE_PROFILE=1  also write a trace-*.prof (pstats) covering every thread of the run
+
+A run's recorder lives in a context variable, so only the run's own thread, its asyncio tasks and
+`to_thread` calls, and pool work submitted through `bind()` record into it; other threads' spans
+are not mixed in. When no run is being recorded, `span()` does nothing beyond that one lookup.
+"""
+import contextvars
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+_config = {
+    "enabled": os.environ.get("ETRADE_TRACE") == "1",
+    "profile": os.environ.get("ETRADE_TRACE_PROFILE") == "1",
+    "directory": ".",
+}
+_active: Optional["TraceRecorder"] = None  # at most one run is recorded at a time
+_active_lock = threading.Lock()
+_current: contextvars.ContextVar[Optional["TraceRecorder"]] = contextvars.ContextVar("trace_recorder", default=None)
+# Before 3.12 a cProfile profiler sees only the thread that enabled it, so each of the run's
+# threads gets its own; from 3.12 it hooks sys.monitoring, which allows one profiler per process
+# and sees every thread.
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+log = logging.getLogger("tracing")
+
+
+def configure(enabled: Optional[bool]=None, profile: Optional[bool]=None, directory: Optional[str]=None):
+    """Turns recording on/off, cProfile capture on/off, and sets where trace files go."""
+    for key, value in (("enabled", enabled), ("profile", profile), ("directory", directory)):
+        if value is not None:
+            _config[key] = value
+
+
+def enabled() -> bool:
+    return _config["enabled"]
+
+
+class TraceRecorder:
+    """Collects Chrome trace events ("X" spans, "i" instants, thread-name metadata) for one run."""
+
+    def __init__(self, label: str, profile: bool=False):
+        self.label = label
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._threads: Dict[int,str] = {}
+        self.events: List[Dict[str,Any]] = []
+        self.profile = profile
+        self._profiles: Dict[int,cProfile.Profile] = {}  # thread id → that thread's profiler
+        self._profiling = set()  # thread ids whose profiler is enabled right now
+        self._run_profile: Optional[cProfile.Profile] = None
+
+    def _us(self, t: float) -> float:
+        return round((t - self._t0) * 1e6, 1)
+
+    def _tid(self) -> int:
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            name = threading.current_thread().name
+            with self._lock:
+                self._threads[tid] = name
+                self.events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                                    "args": {"name": name}})
+        return tid
+
+    def complete(self, name: str, cat: str, start: float, end: float, args: Dict[str,Any]):
+        ev = {"name": name, "cat": cat, "ph": "X", "ts": self._us(start), "dur": self._us(end) - self._us(start),
+              "pid": self._pid, "tid": self._tid()}
+        if args:
+            ev["args"] = args
+        with self._lock:
+            self.events.append(ev)
+
+    def instant(self, name: str, cat: str, args: Dict[str,Any]):
+        ev = {"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self._us(time.perf_counter()),
+              "pid": self._pid, "tid": self._tid()}
+        if args:
+            ev["args"] = args
+        with self._lock:
+            self.events.append(ev)
+
+    # --- cProfile across the run's threads ---
+    def _enter_profile(self) -> Optional[cProfile.Profile]:
+        """Enables the calling thread's profiler; returns it if this call enabled it (pass it to _exit_profile)."""
+        tid = threading.get_ident()
+        with self._lock:
+            if tid in self._profiling:
+                return None
+            prof = self._profiles.setdefault(tid, cProfile.Profile())
+            self._profiling.add(tid)
+        try:
+            prof.enable()
+        except ValueError as e:
+            # 3.12+: another profiler or tool (debugger, coverage) already holds sys.monitoring
+            log.warning("Not profiling %s: %s", self.label, e)
+            with self._lock:
+                self._profiling.discard(tid)
+            return None
+        return prof
+
+    def _exit_profile(self, prof: cProfile.Profile):
+        # a profiler must be disabled on the thread that enabled it
+        prof.disable()
+        with self._lock:
+            self._profiling.discard(threading.get_ident())
+
+    def start_profile(self):
+        self._run_profile = self._enter_profile()
+
+    def stop_profile(self):
+        if self._run_profile is not None:
+            self._exit_profile(self._run_profile)
+            self._run_profile = None
+
+    def write(self, directory: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.label).strip("_") or "run"
+        base = os.path.join(directory, f"trace-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}-{slug}")
+        with self._lock:
+            events = list(self.events)
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"label": self.label, "started": self.started}}, f, default=str)
+        profiles = list(self._profiles.values())
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for prof in profiles[1:]:
+                try:
+                    stats.add(prof)
+                except TypeError:
+                    pass  # a thread that never ran Python code under the profiler
+            stats.dump_stats(base + ".prof")
+        return base + ".json"
+
+
+@contextmanager
+def recording(label: str):
+    """
+    Records everything traced until the block exits, then writes the trace (and profile) files.
+    A no-op when tracing is off or another run is already being recorded: nested inside that run
+    (same thread, or work handed on via `bind`), its trace takes the spans; elsewhere they are dropped.
+    """
+    global _active
+    with _active_lock:
+        if not _config["enabled"] or _active is not None:
+            rec = None
+        else:
+            rec = _active = TraceRecorder(label, _config["profile"])
+    if rec is None:
+        yield None
+        return
+    token = _current.set(rec)
+    if rec.profile:
+        rec.start_profile()
+    try:
+        with span(label, "run"):
+            yield rec
+    finally:
+        if rec.profile:
+            rec.stop_profile()
+        _current.reset(token)
+        with _active_lock:
+            _active = None
+        try:
+            path = rec.write(_config["directory"])
+            log.info("Trace written to %s (%d events).", path, len(rec.events))
+        except OSError:
+            log.exception("Writing the trace for %s failed", label)
+
+
+def bind(fn):
+    """
+    Returns fn wrapped so that, run on a pool thread, it records into the calling thread's run
+    (and, before 3.12, is profiled on that thread). Returns fn itself when no run is recorded.
+    """
+    rec = _current.get()
+    if rec is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _current.set(rec)
+        prof = rec._enter_profile() if rec.profile and PER_THREAD_PROFILES else None
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if prof is not None:
+                rec._exit_profile(prof)
+            _current.reset(token)
+    return run
+
+
+def traced_run(label: str):
+    """
+    Decorator: records each call as one run (see `recording`). `label` is formatted with the call's
+    bound arguments, e.g. @traced_run("rotate {session}/{duration}").
+    """
+    def wrap(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            if not _config["enabled"]:
+                return fn(*args, **kwargs)
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            with recording(label.format(**bound.arguments)):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+
+@contextmanager
+def span(name: str, cat: str="app", **args):
+    """
+    Times the block as one span on the current thread. Yields the args dict so the block can
+    attach results (e.g. the HTTP status) before the span is recorded.
+    """
+    rec = _current.get()
+    if rec is None:
+        yield args
+        return
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        rec.complete(name, cat, start, time.perf_counter(), args)
+
+
+def instant(name: str, cat: str="app", **args):
+    rec = _current.get()
+    if rec is not None:
+        rec.instant(name, cat, args)
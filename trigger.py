@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+# What to do when a trigger is reached later than `misfire_grace` seconds (e.g. the machine slept).
+MISFIRE_FIRE = "fire"
+MISFIRE_SKIP = "skip"
+
+
+class ServerClock:
+    """
+    Estimates the offset between the local wall clock and E*TRADE's clock from HTTP `Date` headers.
+
+    A Date header is truncated to the second, so each response only bounds the server time to
+    [Date, Date + 1) somewhere between send and receive. Each sample therefore yields an interval
+    for the offset, [Date - recv, Date + 1 - sent]; intersecting recent intervals narrows it well
+    below one second, and the midpoint is the estimate.
+    """
+
+    def __init__(self, window: float=900.0, max_samples: int=256):
+        self.window = window
+        self._samples = deque(maxlen=max_samples)  # (lower, upper, observed_at)
+        self._lock = threading.Lock()
+
+    def observe(self, date_header: Optional[str], sent: float, received: float):
+        if not date_header:
+            return
+        try:
+            server = parsedate_to_datetime(date_header).timestamp()
+        except Exception:
+            return
+        with self._lock:
+            self._samples.append((server - received, server + 1.0 - sent, received))
+
+    def _bounds(self):
+        now = time.time()
+        lower, upper = float("-inf"), float("inf")
+        with self._lock:
+            samples = [s for s in self._samples if now - s[2] <= self.window]
+        # newest first, so an inconsistent (drifted) older sample is the one that gets ignored
+        for lo, hi, _ in reversed(samples):
+            if max(lower, lo) > min(upper, hi):
+                continue
+            lower, upper = max(lower, lo), min(upper, hi)
+        return lower, upper, len(samples)
+
+    @property
+    def offset(self) -> float:
+        """Seconds to add to local time to get server time (0.0 until a sample is seen)."""
+        lower, upper, n = self._bounds()
+        return 0.0 if n == 0 else (lower + upper) / 2
+
+    def stats(self) -> Dict[str,Any]:
+        lower, upper, n = self._bounds()
+        if n == 0:
+            return {"samples": 0, "offset_ms": 0.0, "uncertainty_ms": None}
+        return {"samples": n, "offset_ms": round((lower + upper) / 2 * 1000, 1),
+                "uncertainty_ms": round((upper - lower) / 2 * 1000, 1)}
+
+    def now(self) -> float:
+        return time.time() + self.offset
+
+
+class PrecisionTrigger:
+    """
+    Waits for an instant on the server clock with sub-100ms precision: coarse sleeps against the
+    wall clock (so a suspend/resume is noticed as lateness), then a short monotonic spin for the
+    last `spin_window` seconds. Every fire is recorded with its intended-vs-actual jitter.
+    """
+
+    def __init__(self, clock: Optional[ServerClock]=None, spin_window: float=0.02,
+                 misfire_grace: float=300.0, misfire_policy: str=MISFIRE_FIRE, history: int=100):
+        if misfire_policy not in (MISFIRE_FIRE, MISFIRE_SKIP):
+            raise ValueError(f"Unknown misfire policy: {misfire_policy}")
+        self.clock = clock
+        self.spin_window = spin_window
+        self.misfire_grace = misfire_grace
+        self.misfire_policy = misfire_policy
+        self.history = deque(maxlen=history)
+        self.log = logging.getLogger("trigger")
+
+    def _offset(self) -> float:
+        return self.clock.offset if self.clock is not None else 0.0
+
+    def now(self) -> float:
+        """Current time on the server clock."""
+        return time.time() + self._offset()
+
+    def sleep_until(self, server_ts: float, cancel: Optional[threading.Event]=None) -> bool:
+        """Coarse wait (no spin, no record) for non-critical waypoints; False if `cancel` was set first."""
+        while True:
+            if cancel is not None and cancel.is_set():
+                return False
+            remaining = server_ts - self._offset() - time.time()
+            if remaining <= 0:
+                return True
+            if cancel is not None:
+                cancel.wait(min(remaining, 1.0))
+            else:
+                time.sleep(min(remaining, 1.0))
+
+    def wait_until(self, server_ts: float, label: str="") -> Dict[str,Any]:
+        """
+        Blocks until `server_ts` (epoch seconds on the server clock) and returns the fire record.
+        record["fired"] is False when the trigger was missed by more than `misfire_grace` and the
+        policy is MISFIRE_SKIP.
+        """
+        offset = self._offset()
+        local_target = server_ts - offset
+        late = time.time() - local_target
+        if late <= 0:
+            # coarse phase: re-read the wall clock every chunk so a suspend shows up as lateness
+            while True:
+                remaining = local_target - time.time()
+                if remaining <= self.spin_window:
+                    break
+                time.sleep(min(remaining - self.spin_window, 0.5))
+            deadline = time.monotonic() + (local_target - time.time())
+            while time.monotonic() < deadline:
+                pass
+        actual = time.time()
+        jitter = actual - local_target
+        misfire = jitter > self.misfire_grace
+        fired = not (misfire and self.misfire_policy == MISFIRE_SKIP)
+        record = {
+            "label": label,
+            "intended": server_ts,
+            "actual": actual + offset,
+            "jitter_ms": round(jitter * 1000, 2),
+            "offset_ms": round(offset * 1000, 1),
+            "misfire": misfire,
+            "fired": fired,
+        }
+        self.history.append(record)
+        if misfire:
+            self.log.error("Trigger %s missed by %.1fs (grace %.0fs); policy=%s → %s.", label, jitter,
+                           self.misfire_grace, self.misfire_policy, "firing late" if fired else "skipped")
+        else:
+            self.log.info("Trigger %s fired %+.1f ms from target (server offset %+.0f ms).",
+                          label, jitter * 1000, offset * 1000)
+        return record